@@ -0,0 +1,4026 @@
+# ---
+#   tcmd - test a commands output against a regular expression
+#   (the implementation of bin/tcmd.py, imported by it after its --server hand-off)
+# ---
+#   Usage: tcmd [Options] cmd regEx
+#
+#            ====================================================================
+#            cmd      ........... cmd to execute and test stdout, stderr, exit status
+#            regEx    ........... regular expression to test the expected stdout of
+#                                 the command
+#            ====================================================================
+# ---
+#   Examples:
+#
+#     tcmd date 2018          ... same as: date | grep -i 2018
+#
+#     tcmd -c "date test" date 2018
+#                             ... date | grep -i 2018 with a comment added to Pass/Fail lines
+#
+#     date | tcmd -s -c "cmd=date via --stdin" : 2018
+#                             ... same as line above only using stdin and not testing return_code and stderr
+#
+#     tcmd --file huge.log : "Server started"
+#                             ... same as: grep -i "Server started" huge.log searching the memory mapped bytes of
+#                             ... huge.log without running a cmd or reading huge.log into memory
+#
+#     tcmd -n date 2016       ... date | grep -v 2016 (negate regEx test=Pass)
+#
+#     tcmd -d 'cat /etc/hosts' '#|localhost'
+#                             ... cat /etc/hosts | egrep -i "#|localhost"
+#
+#     tcmd -d -v date 2018    ... turn on debug and verbose output and check date cmd against regex 2018
+#
+#     tcmd -v --report_kb 16 "make test" "0 failed"
+#                             ... the verbose output of make test only prints its first and last 16KB and the 16KB
+#                             ... around the match (--report_kb 0 prints all of it)
+#
+#     tcmd -v "touch myfile; test -f myfile && rm -f myfile"  ""
+#                             ... sting multiple commands together with ';' or && or ||
+#
+#     OUT=$(cat /etc/hosts)
+#     echo "$OUT" | tcmd --stdin -v -c "bash variable test" : localhost
+#                             ... echo "$OUT" | grep -i localhost (uses a bash variable w/--stdin)
+#
+#     OUT=$(tcmd ping -c 2 localhost); RET=$?
+#     if [ $RET -eq 0 ] && echo "tcmd returned 0" || echo "tcmd did not return 0"
+#                             ... how to run tcmd and capturing just PASS (0) or FAil (1) return code without
+#                             ... printing tcmd output to stdout
+#
+#     tcmd --suite checks.txt ... run every "[Options] cmd regEx" line of checks.txt in one tcmd process
+#
+#     tcmd --suite checks.txt --jobs 8
+#                             ... same as above running up to 8 check cmds at the same time
+#
+#     tcmd --suite checks.txt --incremental ~/.cache/tcmd/checks.state --input config.yaml
+#                             ... skip the checks that passed in an earlier run unless their spec line, the
+#                             ... programs they run, or config.yaml changed (--force to run them all)
+#
+#     tcmd --suite checks.txt --shard 2/4 --timings .tcmd.timings > shard2.out
+#     tcmd --merge shard1.out --merge shard2.out --merge shard3.out --merge shard4.out
+#                             ... run the second quarter of the checks on this CI worker balanced by the seconds
+#                             ... the checks took in earlier runs and print the Pass/Fail totals of all 4 workers
+#                             ... (--merge fails if the workers did not run every check once, add --timings
+#                             ... .tcmd.timings --merge_timings <a worker's .tcmd.timings> for the next runs)
+#
+#     tcmd --stream "cat huge.log" "Server started"
+#                             ... same as: cat huge.log | grep -i "Server started" without reading all of huge.log
+#                             ... into memory (regEx can match across the lines of the last 64KB searched)
+#
+#     tcmd --until_match "tail -f app.log" "Server started"
+#                             ... Pass as soon as "Server started" is in app.log and then kill tail -f
+#                             ... (the return code of the killed cmd is not tested)
+#
+#     tcmd --timeout 10 "curl -s localhost:8080/health" ok
+#                             ... kill curl and print "Timeout:" with exit status 124 if it runs over 10 seconds
+#
+#     tcmd --also Tue --also UTC date 2026
+#                             ... run date once and test its stdout matches all of 2026, Tue, and UTC
+#                             ... in one scan of the output (--match any or none for the other tests)
+#
+#     export TCMD_CACHE=~/.cache/tcmd/cmd.cache
+#     tcmd --cache_watch /etc/hosts "cat /etc/hosts" localhost
+#     tcmd --cache_watch /etc/hosts "cat /etc/hosts" 127.0.0.1
+#                             ... the second tcmd reuses the output of the first cat for 60 seconds
+#                             ... (--cache_ttl) unless /etc/hosts changed (--no-cache to run cat again)
+#
+#     tcmd --bytes "gzip -c big.log" "^\x1f\x8b"
+#                             ... search the bytes of a binary output without decoding it (only the bytes
+#                             ... around the match are decoded to print them)
+#
+#     tcmd --max_cpu 10 --max_as 512 --max_output 1000000 --usage "max_rss_kb=\d{1,5} " "make test" Passed
+#                             ... Fail if make test uses over 10 cpu seconds or writes over 1MB of output,
+#                             ... cap its address space at 512MB, and test its max RSS is under 100MB
+#
+#     tcmd --repeat 100 --warmup 5 --max_p95 0.05 "curl -s localhost:8080/health" ok
+#                             ... run curl 105 times, test every one of the last 100 runs, print the min, median,
+#                             ... p90, p95, p99, max wall and user/sys cpu times and Fail if the p95 is over 50ms
+#
+#     tcmd --retry_until 60 --timeout 5 "curl -s localhost:8080/health" ok
+#                             ... wait up to 60 seconds for the service to be healthy running curl again 0.1, 0.2,
+#                             ... 0.4, ... (max 5) seconds after every Fail and report the attempts and time to pass
+#
+#     tcmd --phases --profile cprofile "find /usr -name '*.h'" stdio.h
+#                             ... print the seconds find took to spawn, capture (drain its pipes), decode, search,
+#                             ... and report and the cProfile of tcmd to stderr (--format jsonl for a phases record)
+#
+#     tcmd --hooks metrics.py --suite checks.txt
+#                             ... call the tcmd_pre_spawn(cmd), tcmd_post_capture(cmd, cmd_output), and
+#                             ... tcmd_post_match(result) functions of metrics.py for every check
+#
+#     tcmd --suite checks.txt --format jsonl > results.jsonl
+#                             ... one JSON line per check as it finishes with its verdict, failed channel, cmd,
+#                             ... regexes, exit code, wall and cpu time, and bytes of output
+#
+#     tcmd --suite checks.txt --format junit > results.xml
+#                             ... same as above as a JUnit XML <testsuite> for CI servers
+#
+#     PYTHONPATH=bin python -c 'import tcmd; print(tcmd.run_check("date", "2026").verdict)'
+#                             ... run a check in-process from python: run_check() and run_spec() return a
+#                             ... CheckResult (verdict, failed, stdout, stderr, record()) and do not print or exit
+#
+#     PYTHONPATH=bin python -m pytest -p tcmd tests/
+#                             ... run every spec line of the tests/*.tcmd files as a pytest test in-process
+#                             ... (add -n 8 with pytest-xdist to run them in parallel)
+#
+#     tcmd --server /tmp/tcmd.sock &
+#     export TCMD_SERVER=/tmp/tcmd.sock
+#                             ... every tcmd run after this is served by the warm tcmd server process
+#                             ... (tcmd runs by itself again if the server is not running)
+#
+#     tcmd -h                 ... this help message
+#
+# ---
+#   Notes:
+#
+#     1. You can specify regEx as "", "^$", or "\A\z" for the empty string
+#     2. regex matches re.MULTILINE and re.DOTALL (matches across multilines with ".")
+#     3. This program only tested on python 2.7
+#     4. This program requires textwrap and click python modules to be installed
+#        Run: 'pip install -r inc/requirements.txt' to install these two modules
+#     5. See tests/test_tcmd.sh for more examples of syntax
+#     6. A cmd without shell metachars (| ; & < > ( ) $ ` \ * ? [ ] # ~ { }) or shell builtins is exec'd
+#        directly without forking /bin/sh (--shell to always use /bin/sh)
+#     7. The output is first scanned for the longest literal a regex requires (like "timeout" in
+#        "error:.*timeout") and the regex is only searched if the literal is there
+#     8. The max_rss_kb of --usage includes the memory tcmd had when it started the cmd (the kernel
+#        counts the fork before it exec'd the cmd) so it only measures a cmd using more than tcmd (~20MB)
+#     9. The --cache, --incremental, and --regex_cache files are saved only readable by you (in a new
+#        0700 dir) and not loaded if someone else owns them or they are writable by others
+#
+#   Warning:
+#     1. You have to backslash regular expression meta chars on command line if you want them
+#        to be interpreted as literal characters in the regex
+#        (tcmd does not escape the metachars for you unless you use the --backslash option)
+#        For example, use:
+#          tcmd -v 'echo "add x+y"' "add x\+y"
+#                                        (^ backslashed the '+' regex metachar)
+#            instead of
+#          tcmd -v 'echo "add x+y"' "add x+y"
+#        Python regex metachars:
+#          \       Escape special char or start a sequence.
+#          .       Match any char except newline, see re.DOTALL
+#          ^       Match start of the string, see re.MULTILINE
+#          $       Match end of the string, see re.MULTILINE
+#          []      Enclose a set of matchable chars
+#          R|S     Match either regex R or regex S.
+#          ()      Create capture group, & indicate precedence
+#          *       0 or more. Same as {,}
+#          +       1 or more. Same as {1,}
+#          ?       0 or 1. Same as {,1}
+#
+# Options:
+#   -d, --dbg                 Turn debug output on
+#   -e, --error <text>        Stderr compared to regex
+#   -n, --negate              Opposite (negate) regex operator like grep -v
+#   -c, --comment <text>      Add a comment to Pass/Fail lines
+#   -s, --stdin               Pipe stdin as cmd substitute with : (searched as
+#                             it arrives, --until_match stops reading it)
+#   --file <path>             Search the memory mapped bytes of <path> as cmd
+#                             substitute with :
+#   -r, --return_code <text>  The return status compared to regex
+#   --usage <text>            The cmd resource usage "max_rss_kb=<n> user=<secs>
+#                             sys=<secs> nvcsw=<n> nivcsw=<n>" compared to regex
+#   --max_cpu <int>           Fail if cmd uses more than <int> cpu seconds
+#                             (setrlimit RLIMIT_CPU)
+#   --max_as <int>            Limit the address space of cmd to <int> MB
+#                             (setrlimit RLIMIT_AS)
+#   --max_output <int>        Fail if cmd writes more than <int> bytes of output
+#                             (setrlimit RLIMIT_FSIZE for files)
+#   -v, --verbose             Turn verbose output on
+#   --report_kb <int>         Print only the first and last <int> KB of the cmd
+#                             output and <int> KB around the match with -v or -d
+#                             (default 4, 0 prints all of it)
+#   -p, --pydoc               Generate pydoc
+#   -t, --timer               Report Execution time in seconds
+#   --phases                  Report the seconds of every phase of the check
+#                             (spawn, capture, decode, search, report)
+#   --profile [cprofile|tracemalloc]
+#                             Print the cProfile functions or tracemalloc lines
+#                             of the check to stderr
+#   --hooks <module>          Python module or .py file whose tcmd_pre_spawn,
+#                             tcmd_post_capture, tcmd_post_match functions are
+#                             called for every check (or export TCMD_HOOKS,
+#                             repeat for more)
+#   -b, --backslash           Backslash all regex meta chars
+#   -m, --min                 Print only minimum one line Pass or Fail except if
+#                             --dbg
+#   --suite <file>            Run every check spec line of a file (- for stdin)
+#                             in one process
+#   --jobs <int>              Run up to <int> --suite check cmds at the same time
+#   --serial                  Run this --suite check alone even with --jobs
+#   --incremental <file>      Skip the --suite checks that passed with the same
+#                             spec, programs, and --input files saved in <file>
+#   --force                   Run every --suite check even with --incremental
+#   --shard <i/N>             Run only the i-th of N --suite shards balanced by
+#                             the --timings of the checks
+#   --timings <file>          Load and save the seconds every --suite check took
+#                             in <file> to balance the --shard runs (or export
+#                             TCMD_TIMINGS)
+#   --merge <file>            Print the Pass/Fail totals of the output files of
+#                             the --shard runs (repeat for more)
+#   --merge_timings <file>    Combine the --timings <file> of a --shard run into
+#                             --timings with --merge (repeat for more)
+#   --input <file>            File the check depends on, --incremental runs it
+#                             again if it changed (repeat for more)
+#   --stream                  Search the cmd output as it arrives keeping only a
+#                             window of it in memory
+#   --until_match             Pass as soon as stdout matches regEx and kill cmd
+#                             (implies --stream)
+#   --timeout <seconds>       Kill cmd and report Timeout after <seconds> (with
+#                             --suite: for all the checks)
+#   --also <regex>            One more regex stdout is compared to (repeat for
+#                             more)
+#   --also_error <regex>      One more regex stderr is compared to (repeat for
+#                             more)
+#   --match [all|any|none]    All, any, or none of the stdout regexes have to
+#                             match
+#   --error_match [all|any|none]
+#                             All, any, or none of the stderr regexes have to
+#                             match
+#   --bytes                   Search the stdout and stderr bytes without decoding
+#                             them from utf-8
+#   --shell                   Always run cmd with /bin/sh even if it needs no shell
+#   --cache <file>            Reuse the output of the same cmd run in the last
+#                             --cache_ttl seconds saved in <file> (or export
+#                             TCMD_CACHE)
+#   --cache_ttl <seconds>     Seconds a --cache cmd output is reused for (default
+#                             60)
+#   --cache_env <var>         Env var whose value has to be the same to reuse a
+#                             --cache cmd output (repeat for more)
+#   --cache_watch <file>      File whose mtime and size have to be the same to
+#                             reuse a --cache cmd output (repeat for more)
+#   --no_cache, --no-cache    Always run cmd even with --cache or TCMD_CACHE
+#   --repeat <int>            Run cmd <int> times testing every run and report wall
+#                             and cpu time statistics
+#   --warmup <int>            Run cmd <int> times before the --repeat runs without
+#                             measuring them
+#   --max_p95 <seconds>       Fail if the p95 wall time of the --repeat runs is
+#                             over <seconds>
+#   --retry_until <seconds>   Run cmd again until it passes or <seconds> passed
+#                             waiting longer between the runs (--timeout to
+#                             kill a run)
+#   --retry_delay <seconds>   Seconds to wait before the first retry (default
+#                             0.1)
+#   --retry_backoff <float>   Multiply the --retry_until wait by <float> after
+#                             every run (default 2, max 5 seconds)
+#   --retry_jitter <float>    Randomize every --retry_until wait by +/- <float>
+#                             of it (default 0.1)
+#   --format [text|jsonl|junit]
+#                             Print Pass/Fail lines (text) or one result record
+#                             per check (jsonl, junit)
+#   --server <socket>         Serve the tcmd runs of export TCMD_SERVER=<socket>
+#                             from this one process
+#   --regex_cache <file>      Save compiled regexes in <file> for the next tcmd
+#                             run (or export TCMD_REGEX_CACHE)
+#   -h, --help                This usage message
+#
+# Author:
+#   Joe Orzehoski
+#
+# License:
+#   See readme.md file using Apache 2.0 License
+# ---
+# Todo:
+#   1. Add stdin error with negate option
+#   2. Add a return of 1 or 0 inside tests/t*.sh
+#   3. Make tcmd into a module so it can be installed (use setup.py)
+# ---
+
+import sys
+from sys import exit
+import os
+import functools
+import subprocess
+import collections
+import atexit
+import selectors
+import codecs
+import signal
+import threading
+# Do not use re because of known issues.  Have to pip install regex.
+# See: https://stackoverflow.com/questions/7063420/perl-compatible-regular-expression-pcre-in-python
+# import re
+import regex as re
+from time import time as timetime
+from time import monotonic
+from time import sleep
+# Note: click, pydoc, traceback, datetime, pickle, marshal, shlex, and concurrent.futures are only imported
+#       inside the functions of the options that need them to keep the tcmd startup fast
+
+# ---
+# Define the DBG flag (can turn on via -d option or export DBG=true
+DBG=0
+
+
+def create_pydocs():
+    """
+    create_pydocs() - generate the pydoc of tcmd (pydoc/tcmd.html) inside a directory pydoc in the current directory
+    :return: None
+    """
+    import pydoc
+
+    pydoc_dir = 'pydoc'
+    module = sys.modules[__name__] # tcmd_lib.py is the tcmd module (see tcmd.py)
+    if not os.path.exists(pydoc_dir):
+        os.mkdir(pydoc_dir)
+
+    # ---
+    # Write out the pydoc of this module to the pydoc/tcmd.html file
+    page = pydoc.html.page(pydoc.describe(module), pydoc.html.document(module, 'tcmd'))
+    with open(os.path.join(pydoc_dir, 'tcmd.html'), 'w', encoding='utf-8') as f:
+        f.write(page)
+    print("Wrote tcmd.html")
+
+
+def indent(text, nspaces, ch=' '):
+    """
+    Indent every line of the text string nspaces
+
+    :param text:    Text string to be indented nspaces amount
+    :param nspaces: Amount spaces to indent
+    :param ch:      The space char or another char to prepend to the indent
+    :return:        The new indented string
+    """
+    padding = nspaces * ch
+    padded_lines_list = [padding+line for line in text.splitlines(True)]
+    return ''.join(padded_lines_list)
+
+
+def pindent(msg, nspaces=6, line_width=180):
+    """
+    Prints every line of the text msg indented nspaces
+
+    :param msg:        The text string to be indented nspaces amount
+    :param nspaces:    Amount of spaces to indent
+    :param line_width: Not used anymore
+    """
+    msg = str(msg)
+    print(indent(msg, nspaces))
+    return
+
+    # body = '\n'.join(['\n'.join(textwrap.wrap(line, 120,
+    #                               break_long_words=False, replace_whitespace=False))
+    #                   for line in msg.splitlines() if line.strip() != ''])
+    # newmsg = textwrap.fill(msg, replace_whitespace=False, width=line_width, initial_indent=' '*nspaces, subsequent_indent=' '*nspaces)
+    # print body
+    # click.echo(newmsg)
+
+
+# ---
+# tcmd exit status of a check whose cmd was killed by --timeout (same as the timeout command)
+TIMEOUT_RETURN = 124
+
+
+# ---
+# Functions called at the points of every check run in this process: pre_spawn(cmd) before a cmd is started
+# (also in the --jobs worker threads), post_capture(cmd, cmd_output) once the CmdOutput of the cmd is captured,
+# and post_match(result) with the CheckResult once its regexes are tested (see add_hook() and --hooks)
+HOOKS = {'pre_spawn': [], 'post_capture': [], 'post_match': []}
+
+
+def add_hook(event, hook):
+    """
+    Call hook at the event point of every check like to export metrics of the checks
+
+    Ex: tcmd.add_hook('post_match', lambda result: statsd.timing('tcmd.check', result.phases['check']))
+
+    :param event: 'pre_spawn', 'post_capture', or 'post_match' (see HOOKS)
+    :param hook:  The function to call with the args of the event
+    """
+    if event not in HOOKS:
+        raise ValueError("unknown hook event [%s], not one of: %s" % (event, ", ".join(HOOKS)))
+    HOOKS[event].append(hook)
+
+
+def load_hooks(module_name):
+    """
+    Import a python module (or .py file) and add its tcmd_pre_spawn, tcmd_post_capture, and tcmd_post_match
+    functions as hooks (--hooks)
+
+    :param module_name: The module name (found in the current dir or sys.path) or the path of a .py file
+    :return:            The imported module
+    """
+    import importlib
+    import importlib.util
+
+    # ---
+    # The module gets this tcmd (and not a second copy of it) if it imports tcmd
+    sys.modules.setdefault('tcmd', sys.modules[__name__])
+    if module_name.endswith('.py'):
+        spec = importlib.util.spec_from_file_location(os.path.basename(module_name)[:-3], module_name)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    else:
+        if os.getcwd() not in sys.path:
+            sys.path.insert(0, os.getcwd())
+        module = importlib.import_module(module_name)
+    for event in HOOKS:
+        hook = getattr(module, 'tcmd_' + event, None)
+        if hook is not None:
+            add_hook(event, hook)
+    return module
+
+
+class CmdTimeout(subprocess.TimeoutExpired):
+    """
+    The cmd did not finish in timeout seconds and was killed
+
+    cmd_output is the tuple (cmd_stdout, cmd_stderr, cmd_return) of the output captured before the kill
+    """
+
+    def __init__(self, cmd, timeout, cmd_output):
+        subprocess.TimeoutExpired.__init__(self, cmd, timeout, output=cmd_output[0], stderr=cmd_output[1])
+        self.cmd_output = cmd_output
+
+
+class CmdOutput(tuple):
+    """
+    The tuple (cmd_stdout, cmd_stderr, cmd_return) of a cmd run with the measurements of the run
+
+    wall_time: seconds from starting the cmd until it exited (monotonic clock)
+    cpu_time:  user + system cpu seconds of the cmd and the children it waited for (None if unknown)
+    nbytes:    bytes of stdout and stderr read from the cmd
+    rusage:    resource.struct_rusage of the cmd from os.wait4() (None if unknown)
+    limit:     'cpu' or 'output' if the cmd was stopped for going over its --max_cpu or --max_output
+    phases:    dict of the seconds of every phase of getting the output like 'spawn', 'capture', and 'decode'
+               (see --phases)
+    heads:     tuple of the stdout and stderr StreamSearch.head_report() of a --stream output (None if not
+               streamed)
+    """
+    limit = None  # Also for the outputs of a --cache saved before there were limits
+    phases = None # ... or phases
+    heads = None
+
+    def __new__(cls, cmd_stdout, cmd_stderr, cmd_return, wall_time=0.0, cpu_time=None, nbytes=0, rusage=None,
+                limit=None, phases=None, heads=None):
+        cmd_output = tuple.__new__(cls, (cmd_stdout, cmd_stderr, cmd_return))
+        cmd_output.wall_time = wall_time
+        cmd_output.cpu_time = cpu_time
+        cmd_output.nbytes = nbytes
+        cmd_output.rusage = rusage
+        cmd_output.limit = limit
+        cmd_output.phases = phases
+        cmd_output.heads = heads
+        return cmd_output
+
+    def usage(self):
+        """
+        The resource usage of the cmd tested by --usage (empty if it is unknown)
+
+        Ex: "max_rss_kb=3712 user=0.001000 sys=0.002000 nvcsw=1 nivcsw=0" with " limit=cpu" added
+            if the cmd went over its --max_cpu (max_rss_kb is in bytes on macOS)
+
+        Note: The kernel counts the memory the forked tcmd process had before it exec'd the cmd in
+              max_rss_kb, so it is never under the RSS of tcmd (about 20MB, more for a big --suite or
+              run_check() caller) and only measures the cmd above that.
+        """
+        if self.rusage is None:
+            return ""
+        usage = "max_rss_kb=%d user=%.6f sys=%.6f nvcsw=%d nivcsw=%d" % (self.rusage.ru_maxrss,
+                self.rusage.ru_utime, self.rusage.ru_stime, self.rusage.ru_nvcsw, self.rusage.ru_nivcsw)
+        if self.limit:
+            usage += " limit=%s" % self.limit
+        return usage
+
+    def state(self):
+        """ The plain data of the cmd output and its measurements saved by --cache (see from_state()) """
+        rusage = None if self.rusage is None else tuple(self.rusage)
+        return (tuple(self), self.wall_time, self.cpu_time, self.nbytes, rusage, self.limit)
+
+    @classmethod
+    def from_state(cls, state):
+        """ The CmdOutput of the state() saved by --cache """
+        output, wall_time, cpu_time, nbytes, rusage, limit = state
+        if rusage is not None:
+            import resource
+            rusage = resource.struct_rusage(rusage)
+        return cls(*output, wall_time=wall_time, cpu_time=cpu_time, nbytes=nbytes, rusage=rusage, limit=limit)
+
+
+class RusagePopen(subprocess.Popen):
+    """
+    subprocess.Popen whose wait() and poll() (also used by communicate() and send_signal()) reap the cmd
+    with os.wait4() to keep its resource usage in self.rusage
+    """
+    rusage = None
+
+    def poll(self):
+        """ The return code of the cmd if it exited else None """
+        if self.returncode is None:
+            self._wait4(os.WNOHANG)
+        return self.returncode
+
+    def wait(self, timeout=None):
+        """ Wait for the cmd to exit and return its return code, raise subprocess.TimeoutExpired after timeout seconds """
+        if timeout is None:
+            while self.returncode is None:
+                self._wait4(0)
+            return self.returncode
+
+        # Poll with a growing delay like subprocess.Popen does for a timeout
+        deadline = monotonic() + timeout
+        delay = 0.0005
+        while self.poll() is None:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(self.args, timeout)
+            sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.05)
+        return self.returncode
+
+    def _wait4(self, wait_flags):
+        """ Reap the cmd with os.wait4() if it exited and set its returncode and rusage """
+        try:
+            pid, sts, rusage = os.wait4(self.pid, wait_flags)
+        except ChildProcessError:
+            # Same as subprocess.Popen: the SIGCLD handler reaped the cmd so its status is unknown
+            self.returncode = 0
+            return
+        if pid == self.pid:
+            self.rusage = rusage
+            self.returncode = os.waitstatus_to_exitcode(sts)
+
+    def cpu_time(self):
+        """ user + system cpu seconds of the reaped cmd or None """
+        if self.rusage is None:
+            return None
+        return self.rusage.ru_utime + self.rusage.ru_stime
+
+    def over_cpu(self, limits):
+        """ 'cpu' if the reaped cmd got SIGXCPU or used all of its --max_cpu seconds else None """
+        if not limits or not limits.get('cpu') or self.rusage is None:
+            return None
+        if self.returncode in (-signal.SIGXCPU, 128 + signal.SIGXCPU) or self.cpu_time() >= limits['cpu']:
+            return 'cpu'
+        return None
+
+
+def _rlimits(limits):
+    """
+    The setrlimit() args of the --max_cpu, --max_as, and --max_output limits of a cmd
+
+    The cpu limit sends SIGXCPU at limits['cpu'] seconds and SIGKILL one second later.  The address
+    space limit makes the allocations of the cmd fail.  The output limit keeps the cmd from writing
+    files bigger than limits['output'] bytes (SIGXFSZ), its stdout and stderr are cut by _readcmd().
+    A hard limit lower than the limit asked for is kept.
+
+    :param limits: dict of the 'cpu' seconds, 'as' bytes, and 'output' bytes (None for no limit)
+    :return:       list of tuple = (resource, (soft, hard))
+    """
+    import resource
+
+    rlimits = []
+    for name, rlimit, extra in (('cpu', resource.RLIMIT_CPU, 1), ('as', resource.RLIMIT_AS, 0),
+                                ('output', resource.RLIMIT_FSIZE, 0)):
+        if limits.get(name) is None:
+            continue
+        soft, hard = resource.getrlimit(rlimit)
+        if hard == resource.RLIM_INFINITY or hard > limits[name] + extra:
+            hard = limits[name] + extra
+        rlimits.append((rlimit, (min(limits[name], hard), hard)))
+    return rlimits
+
+
+def _cmdlimits(max_cpu=None, max_as=None, max_output=None):
+    """
+    The limits dict of the --max_cpu, --max_as, and --max_output options (see _rlimits())
+
+    :param max_cpu:    cpu seconds
+    :param max_as:     address space MB
+    :param max_output: bytes of stdout and stderr (and of any file the cmd writes)
+    :return:           dict of the 'cpu' seconds, 'as' bytes, and 'output' bytes or None if no limit is set
+    """
+    if max_cpu is None and max_as is None and max_output is None:
+        return None
+    return {'cpu': max_cpu, 'as': None if max_as is None else max_as * 1024 * 1024, 'output': max_output}
+
+
+# ---
+# A cmd with one of these chars needs /bin/sh: pipes, lists, redirects, subshells, expansions, globs,
+# comments, and escapes
+SHELL_METACHARS = re.compile(r'[|&;<>()$`\\*?\[\]#~{}\n]')
+# ---
+# Shell builtins are run by /bin/sh even when a program of the same name is on the PATH (echo, test, ...)
+SHELL_BUILTINS = frozenset((
+    '.', ':', '[', 'alias', 'bg', 'break', 'cd', 'command', 'continue', 'echo', 'eval', 'exec', 'exit',
+    'export', 'false', 'fc', 'fg', 'getopts', 'hash', 'jobs', 'kill', 'local', 'printf', 'pwd', 'read',
+    'readonly', 'return', 'set', 'shift', 'source', 'test', 'times', 'trap', 'true', 'type', 'ulimit',
+    'umask', 'unalias', 'unset', 'wait',
+))
+
+
+@functools.lru_cache(maxsize=256)
+def _which(program, path):
+    """
+    Find the executable file of program in the dirs of path like the shell does
+
+    :param program: The program name (or path if it has a '/')
+    :param path:    The PATH env var
+    :return:        The path of the executable file or None
+    """
+    if '/' in program:
+        dirnames = ['']
+    else:
+        dirnames = [dirname or '.' for dirname in path.split(os.pathsep)]
+    for dirname in dirnames:
+        program_path = os.path.join(dirname, program)
+        if os.path.isfile(program_path) and os.access(program_path, os.X_OK):
+            return program_path
+    return None
+
+
+def _direct_argv(cmd):
+    """
+    Split a cmd that needs no shell into the argv of the program to exec directly (see SHELL_METACHARS)
+
+    Ex: _direct_argv("ping -c 2 localhost") -> (['ping', '-c', '2', 'localhost'], '/usr/bin/ping')
+        _direct_argv("date | grep 2018")    -> None
+
+    :param cmd: shell command to run
+    :return:    tuple = (argv, program path) or None if cmd needs /bin/sh
+    """
+    if SHELL_METACHARS.search(cmd):
+        return None
+    if '"' in cmd or "'" in cmd:
+        import shlex
+        try:
+            argv = shlex.split(cmd)
+        except ValueError:
+            return None
+    else:
+        argv = cmd.split()
+
+    # ---
+    # Let /bin/sh run the builtins, FOO=bar cmd, and report the programs it cannot find
+    if not argv or argv[0] in SHELL_BUILTINS or '=' in argv[0]:
+        return None
+    program_path = _which(argv[0], os.environ.get('PATH', os.defpath))
+    if program_path is None:
+        return None
+    return (argv, program_path)
+
+
+def _popencmd(cmd, shell=None, limits=None, **popen_args):
+    """
+    Start cmd with RusagePopen exec'ing its program directly without forking /bin/sh if it needs no shell
+
+    :param cmd:        shell command to run
+    :param shell:      True to always run cmd with /bin/sh -c
+    :param limits:     dict of the 'cpu', 'as', and 'output' limits set in the cmd process with prlimit()
+                       (see _rlimits())
+    :param popen_args: more subprocess.Popen args (stdout, stderr, start_new_session, ...)
+    :return:           The RusagePopen of the cmd
+    """
+    for hook in HOOKS['pre_spawn']:
+        hook(cmd)
+    rlimits = None
+    if limits:
+        import resource
+        rlimits = _rlimits(limits)
+        if not hasattr(resource, 'prlimit'):
+            # No prlimit() (macOS): set the limits in the forked child before it execs the cmd
+            # (preexec_fn is not safe with the --jobs threads, so only without prlimit())
+            def setrlimits():
+                for rlimit, soft_hard in rlimits:
+                    resource.setrlimit(rlimit, soft_hard)
+            popen_args['preexec_fn'] = setrlimits
+            rlimits = None
+
+    direct = None if shell else _direct_argv(cmd)
+    if rlimits:
+        return _popenlimited(cmd, direct, rlimits, **popen_args)
+    if direct is not None:
+        argv, program_path = direct
+        try:
+            return RusagePopen(argv, executable=program_path, **popen_args)
+        except OSError:
+            # The program went away since _which() found it, let /bin/sh report it
+            pass
+    return RusagePopen(cmd, shell=True, **popen_args)
+
+
+def _popenlimited(cmd, direct, rlimits, **popen_args):
+    """
+    Start cmd with its limits set with prlimit() from this process before it runs
+
+    The cmd is started by /bin/sh waiting to read a gate pipe, so the limits are set before sh runs (or
+    execs) the cmd and every child of the cmd gets them too.  This is safe in the --jobs threads where
+    a preexec_fn is not.
+
+    :param cmd:        shell command to run
+    :param direct:     the _direct_argv() of cmd (sh execs cmd) or None
+    :param rlimits:    list of tuple = (resource, (soft, hard)) (see _rlimits())
+    :param popen_args: more subprocess.Popen args
+    :return:           The RusagePopen of the cmd
+    """
+    import resource
+
+    gate_read, gate_write = os.pipe()
+    script = "read _ <&%d; exec %d<&-; %s%s" % (gate_read, gate_read, "exec " if direct else "", cmd)
+    popen_args['pass_fds'] = tuple(popen_args.get('pass_fds', ())) + (gate_read,)
+    try:
+        proc = RusagePopen(['/bin/sh', '-c', script], **popen_args)
+    finally:
+        os.close(gate_read)
+    try:
+        for rlimit, soft_hard in rlimits:
+            resource.prlimit(proc.pid, rlimit, soft_hard)
+    finally:
+        # Open the gate: sh reads EOF and runs the cmd
+        os.close(gate_write)
+    return proc
+
+
+def _readcmd(proc, max_output=None, timeout=None):
+    """
+    Read the stdout and stderr of a cmd into one growing bytearray each and kill its process group as soon
+    as it wrote more than max_output bytes (--max_output) or ran over timeout seconds
+
+    The output is appended to its bytearray as it is read and not kept in chunks joined at the end, so a
+    --bytes check holds the output once while searching it (the bytearrays are searched as they are)
+
+    :param proc:       RusagePopen of the cmd (started with start_new_session=True for max_output or timeout)
+    :param max_output: max bytes of stdout and stderr or None for no limit
+    :param timeout:    seconds to wait for the cmd before killing it
+    :return:           tuple = (cmd_stdout, cmd_stderr, timed_out, over) of bytearrays where over is True
+                       if the cmd was killed for writing more than max_output bytes
+    """
+    outputs = {proc.stdout: bytearray(), proc.stderr: bytearray()}
+    deadline = None if timeout is None else monotonic() + timeout
+    timed_out = over = False
+    nbytes = 0
+
+    with selectors.DefaultSelector() as selector:
+        for pipe in outputs:
+            selector.register(pipe, selectors.EVENT_READ)
+        while selector.get_map() and not (timed_out or over):
+            remaining = None if deadline is None else deadline - monotonic()
+            if remaining is not None and remaining <= 0:
+                timed_out = True
+                break
+            for key, events in selector.select(remaining):
+                data = os.read(key.fd, STREAM_CHUNK)
+                if not data:
+                    selector.unregister(key.fileobj)
+                # Keep only the first max_output bytes of the output
+                outputs[key.fileobj] += data if max_output is None else data[:max(max_output - nbytes, 0)]
+                nbytes += len(data)
+            over = max_output is not None and nbytes > max_output
+
+    # ---
+    # The cmd can still be running after closing its stdout and stderr
+    if not (timed_out or over):
+        try:
+            proc.wait(None if deadline is None else max(deadline - monotonic(), 0))
+        except subprocess.TimeoutExpired:
+            timed_out = True
+    if timed_out or over:
+        _killcmd(proc)
+    proc.stdout.close()
+    proc.stderr.close()
+    proc.wait()
+    return (outputs[proc.stdout], outputs[proc.stderr], timed_out, over)
+
+
+def _runcmd(cmd, shell=None, dbg=True, timeout=None, decode=True, limits=None):
+    """
+    Executes a shell command in a subprocess and captures stdout, stederr, and return status
+
+    Src: https://stackoverflow.com/questions/7353054/running-a-command-line-containing-pipes-and-displaying-result-to-stdout
+
+    :param cmd:     shell command to run
+    :param shell:   True to always run cmd with /bin/sh, else only if it needs a shell (see _popencmd())
+    :param dbg:     print the DBG output of the cmd (False when run from a --jobs worker thread)
+    :param timeout: seconds to wait for the cmd before killing it and raising CmdTimeout (--timeout)
+    :param decode:  decode stdout and stderr from utf-8 or leave them the bytearrays read (--bytes)
+    :param limits:  dict of the 'cpu' seconds, 'as' bytes, and 'output' bytes limits of the cmd or None
+                    (--max_cpu, --max_as, --max_output, see _rlimits())
+    :return:        CmdOutput tuple = (cmd_stdout, cmd_stderr, cmd_return)
+    """
+    if timeout is not None and timeout <= 0:
+        raise CmdTimeout(cmd, timeout, CmdOutput("", "", "None"))
+
+    PIPE=subprocess.PIPE
+    start_time = monotonic()
+    max_output = limits.get('output') if limits else None
+    # ---
+    # Start the cmd in its own process group so a --timeout can kill it with all of its children
+    proc = _popencmd(cmd, shell=shell, limits=limits, stdout=PIPE, stderr=PIPE,
+                     start_new_session=timeout is not None or max_output is not None)
+    spawn_time = monotonic()
+    if DBG and dbg and proc.args is not cmd: pindent("DBG: exec without a shell: %s" % proc.args)
+    cmd_stdout, cmd_stderr, timed_out, over = _readcmd(proc, max_output, timeout=timeout)
+    if DBG and dbg and (timed_out or over):
+        pindent("DBG: %s, killed cmd process group [%s]" % ("timeout" if timed_out else "over --max_output", proc.pid))
+    capture_time = monotonic()
+    wall_time = capture_time - start_time
+    nbytes = len(cmd_stdout) + len(cmd_stderr)
+    if decode:
+        cmd_stdout = cmd_stdout.decode('utf-8', errors='replace')
+        cmd_stderr = cmd_stderr.decode('utf-8', errors='replace')
+    cmd_return = proc.returncode
+    phases = {'spawn': spawn_time - start_time, 'capture': capture_time - spawn_time,
+              'decode': monotonic() - capture_time}
+
+    # ---
+    # Note: Better to leave newlines in the stdout for debugging purposes
+    # ---
+    # Strip off the extra newline from the output if there is only one line of output
+    # newlines_cnt = cmd_stdout.count('\n')
+    # if newlines_cnt == 1:
+    #     if DBG: pindent("DBG: Got only 1 line in stdout, removing newline for printing.")
+    #     # todo: fix this problem: tcmd date "" is pass or fail depending on line below
+    #     #       tcmd date "^$" because ^$ matches a newline for some reason
+    #     # cmd_stdout = cmd_stdout.rstrip()
+    # cmd_stdout = cmd_stdout.rstrip('\n')
+    # cmd_stderr = cmd_stderr.rstrip('\n')
+    # cmd_return = str(cmd_return).rstrip('\n')
+    cmd_return = str(cmd_return)
+    cmd_output = CmdOutput(cmd_stdout, cmd_stderr, cmd_return, wall_time, proc.cpu_time(), nbytes, proc.rusage,
+                           'output' if over else proc.over_cpu(limits), phases)
+
+    if dbg:
+        _dbg_cmd_output(cmd_stdout, cmd_stderr, cmd_return)
+    if timed_out:
+        raise CmdTimeout(cmd, timeout, cmd_output)
+
+    return cmd_output
+
+
+# ---
+# Chars of a cmd output printed by the -v and -d reports: the first and last REPORT_SIZE chars and the
+# REPORT_SIZE chars around the match (--report_kb, 0 prints all of the output)
+# Note: A check captures all of the cmd output to search it and only its report is cut down, except with
+#       --stream where only the first REPORT_SIZE chars and the window searched are kept (see StreamSearch)
+REPORT_SIZE = 4096
+
+
+def _preview(output, searchObj=None, size=None, head=None):
+    """
+    Cut a cmd output down to the parts the -v and -d reports print so a report costs O(size) and not O(output):
+    the first size chars, size chars around the match, and the last size chars (only these parts of a --bytes
+    output are decoded)
+
+    :param output:    stdout or stderr of the cmd (str, bytes, or the mmap of a --file)
+    :param searchObj: The regex match in output to print the chars around
+    :param size:      Max number of chars of each part (default REPORT_SIZE, 0 for all of the output)
+    :param head:      tuple = (first chars, count of chars left out) of a --stream output whose window no longer
+                      starts at its first char (see StreamSearch.head_report()) to print in front of output
+    :return:          The str to print with "... <N chars> ..." in place of the chars left out
+    """
+    if size is None:
+        size = REPORT_SIZE
+    as_bytes = not isinstance(output, str)
+    length = len(output)
+    spans = [(0, length)]
+    if size and length > 3 * size:
+        spans = [(0, size), (length - size, length)]
+        if searchObj is not None and not isinstance(searchObj, bool):
+            start = max(min(searchObj.start() - size // 4, length - size), 0)
+            spans.insert(1, (start, start + size))
+
+    # ---
+    # Join the parts (the match part can overlap the first or last part) with a marker for every gap
+    text = ""
+    end = 0
+    if head is not None:
+        head_text, skipped = head
+        if size and len(head_text) > size:
+            head_text, skipped = head_text[:size], skipped + len(head_text) - size
+        text = bytes(head_text).decode('utf-8', errors='backslashreplace') if as_bytes else head_text
+        text += "... <%s %s> ..." % (skipped, "bytes" if as_bytes else "chars")
+    for start, stop in spans:
+        start = max(start, end)
+        if start >= stop:
+            continue
+        if start > end:
+            text += "... <%s %s> ..." % (start - end, "bytes" if as_bytes else "chars")
+        part = output[start:stop]
+        text += bytes(part).decode('utf-8', errors='backslashreplace') if as_bytes else part
+        end = stop
+    return text
+
+
+def _mapfile(file_path):
+    """
+    Memory map a --file to search it like the stdout of a cmd without running a cmd or reading it into memory
+
+    :param file_path: The file to search
+    :return:          CmdOutput tuple = (mmap of the file, b'', '0') where an empty file is b''
+    """
+    import mmap
+
+    start_time = monotonic()
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        file_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+    map_time = monotonic() - start_time
+    return CmdOutput(file_map, b'', '0', map_time, nbytes=size, phases={'map': map_time})
+
+
+def _dbg_cmd_output(cmd_stdout, cmd_stderr, cmd_return):
+    """
+    Print the DBG output of a cmd run by _runcmd()
+
+    :param cmd_stdout: stdout of the cmd
+    :param cmd_stderr: stderr of the cmd
+    :param cmd_return: return status of the cmd
+    """
+    if not DBG:
+        return
+    cmd_stdout = _preview(cmd_stdout)
+    cmd_stderr = _preview(cmd_stderr)
+
+    # ---
+    # Indent multilines properly
+    if DBG: pindent("DBG: cmd_return: [%s]" % cmd_return)
+    if DBG: # pindent("DBG: cmd_stderr: [%s]" % cmd_stderr)
+        if cmd_stderr.count('\n') == 1 or cmd_stderr.count('\n') == 0:
+            pindent("DBG: cmd_stderr: [%s]" % cmd_stderr)
+        else:
+            pindent("DBG: cmd_stderr:")
+            print (indent("["+cmd_stderr+"]", nspaces=11))
+    if DBG: # pindent("DBG: cmd_stdout: [%s]" % cmd_stdout)
+        if cmd_stdout.count('\n') == 1 or cmd_stdout.count('\n') == 0:
+            pindent("DBG: cmd_stdout: [%s]" % cmd_stdout)
+        else:
+            pindent("DBG: cmd_stdout:")
+            print (indent("["+cmd_stdout+"]", nspaces=11))
+    if DBG: pindent("---")
+
+
+# ---
+# The --cache, --regex_cache, and --incremental files (like ~/.cache/tcmd/cmd.cache), only readable by you
+STATE_VERSION = 1 # of the marshal format of the --cache and --incremental files
+
+
+def _readstate(state_file):
+    """
+    Read a --cache, --regex_cache, or --incremental file if it is safe to load
+
+    The file has to be owned by you and not writable by the group or others, so nobody else can plant
+    a file for tcmd to load (like in /tmp).
+
+    :param state_file: The file name
+    :return:           The bytes of the file
+    :raises OSError:   if the file cannot be read or is not safe to load
+    """
+    with open(state_file, 'rb') as f:
+        stat = os.fstat(f.fileno())
+        if stat.st_uid != os.getuid() or stat.st_mode & 0o022:
+            raise PermissionError("[%s] is not owned by you or is writable by others, not loaded" % state_file)
+        return f.read()
+
+
+def _writestate(state_file, data):
+    """
+    Save the bytes of a --cache, --regex_cache, or --incremental file only readable by you
+
+    The dir of the file is created (mode 0700) and the file is replaced atomically with a new temp file.
+
+    :param state_file: The file name
+    :param data:       The bytes to save
+    :raises OSError:   if the file cannot be saved
+    """
+    import tempfile
+
+    state_dir = os.path.dirname(state_file)
+    if state_dir:
+        os.makedirs(state_dir, mode=0o700, exist_ok=True)
+    fd, tmp_file = tempfile.mkstemp(dir=state_dir or '.', prefix=os.path.basename(state_file) + '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_file, state_file)
+    except OSError:
+        os.unlink(tmp_file)
+        raise
+
+
+# ---
+# Output cache of the cmds run by this and earlier tcmd runs (see --cache and _cachedcmd())
+CMD_CACHE_SIZE = 256 # cmd outputs kept, least recently used are evicted first
+CMD_CACHE_TTL = 60   # seconds a cmd output is reused for
+cmd_output_cache = collections.OrderedDict() # key -> (time saved, CmdOutput), least recently used first
+cmd_cache_stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evicted': 0, 'loaded': 0}
+cmd_cache_file = None
+cmd_cache_lock = threading.Lock()
+
+
+def load_cmd_cache(cache_file):
+    """
+    Load the cmd outputs saved in cache_file by earlier tcmd runs and save them back at exit (--cache)
+
+    :param cache_file: The file name of the cmd output cache (see _readstate() for the files loaded)
+    """
+    global cmd_cache_file
+    import marshal
+
+    cmd_cache_file = cache_file
+    try:
+        version, cached_outputs = marshal.loads(_readstate(cache_file))
+        if version != STATE_VERSION:
+            raise ValueError("version %s" % version)
+        cached_outputs = [(key, (saved, CmdOutput.from_state(state))) for key, (saved, state) in cached_outputs]
+    except (OSError, EOFError, ValueError, TypeError) as err:
+        if DBG: pindent("DBG: cmd cache: [%s] not loaded: %s" % (cache_file, err))
+        return
+    cmd_output_cache.update(cached_outputs)
+    cmd_cache_stats['loaded'] = len(cached_outputs)
+
+
+def save_cmd_cache():
+    """
+    Save the cmd output cache to cmd_cache_file if a cmd was run during this tcmd run
+    """
+    if not cmd_cache_file or not cmd_cache_stats['misses']:
+        return
+    import marshal
+
+    with cmd_cache_lock:
+        cached_outputs = [(key, (saved, cmd_output.state())) for key, (saved, cmd_output) in cmd_output_cache.items()]
+    try:
+        _writestate(cmd_cache_file, marshal.dumps((STATE_VERSION, cached_outputs)))
+    except (OSError, ValueError) as err:
+        if DBG: pindent("DBG: cmd cache: [%s] not saved: %s" % (cmd_cache_file, err))
+
+
+def _file_stamp(file_path):
+    """
+    The mtime and size of a file that tell if it changed (--cache_watch, --input)
+
+    :param file_path: The file name
+    :return:          tuple = (file_path, mtime_ns, size) with None's if the file does not exist
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return (file_path, None, None)
+    return (file_path, stat.st_mtime_ns, stat.st_size)
+
+
+def _cachedcmd(cmd, cmd_cache=None, shell=None, dbg=True, timeout=None, decode=True, limits=None):
+    """
+    Return the output of an earlier run of cmd from the --cache or run cmd with _runcmd() and cache its output
+
+    The cached output is reused when cmd, the cwd, the values of the cache env vars, the mtime and size
+    of the watched files, and how cmd is run (--shell, --bytes, and the limits) are all the same and it is
+    not older than the ttl seconds.  Cmds that timed out are not cached.
+
+    Ex: _cachedcmd("cat /etc/hosts", cmd_cache={'ttl': 60, 'env': ('HOME',), 'watch': ('/etc/hosts',)})
+
+    :param cmd:       shell command to run
+    :param cmd_cache: dict of the 'ttl' (seconds), 'env' vars, and 'watch' files of the cached output
+                      or None to always run cmd
+    :param shell:     True to always run cmd with /bin/sh, else only if it needs a shell (see _popencmd())
+    :param dbg:       print the DBG output of the cmd (False when run from a --jobs worker thread)
+    :param timeout:   seconds to wait for the cmd before killing it and raising CmdTimeout (--timeout)
+    :param decode:    decode stdout and stderr from utf-8 or leave them bytes (--bytes)
+    :param limits:    dict of the 'cpu', 'as', and 'output' limits of the cmd or None (see _rlimits())
+    :return:          CmdOutput tuple = (cmd_stdout, cmd_stderr, cmd_return)
+    """
+    if cmd_cache is None or cmd_cache_file is None:
+        return _runcmd(cmd, shell=shell, dbg=dbg, timeout=timeout, decode=decode, limits=limits)
+
+    watched = [_file_stamp(watch_file) for watch_file in cmd_cache['watch']]
+    key = (cmd, os.getcwd(), tuple((var, os.environ.get(var)) for var in sorted(cmd_cache['env'])), tuple(watched),
+           decode, tuple(sorted(limits.items())) if limits else None, bool(shell))
+
+    start_time = monotonic()
+    with cmd_cache_lock:
+        saved = cmd_output_cache.get(key)
+        if saved is not None and timetime() - saved[0] <= cmd_cache['ttl']:
+            cmd_output_cache.move_to_end(key)
+            cmd_cache_stats['hits'] += 1
+            # The phases of the run that saved the output are not the ones of this check
+            cmd_output = CmdOutput(*saved[1])
+            cmd_output.__dict__.update(saved[1].__dict__, phases={'cache': monotonic() - start_time})
+            if DBG and dbg:
+                pindent("DBG: cmd cache: hit, output saved %.1f seconds ago" % (timetime() - saved[0]))
+                _dbg_cmd_output(*cmd_output)
+            return cmd_output
+        cmd_cache_stats['misses'] += 1
+        if saved is not None:
+            cmd_cache_stats['expired'] += 1
+
+    cmd_output = _runcmd(cmd, shell=shell, dbg=dbg, timeout=timeout, decode=decode, limits=limits)
+
+    with cmd_cache_lock:
+        cmd_output_cache[key] = (timetime(), cmd_output)
+        cmd_output_cache.move_to_end(key)
+        while len(cmd_output_cache) > CMD_CACHE_SIZE:
+            cmd_output_cache.popitem(last=False)
+            cmd_cache_stats['evicted'] += 1
+    return cmd_output
+
+
+# ---
+# Fingerprints of the --suite checks that passed in earlier --incremental runs (see _check_fingerprint())
+SUITE_STATE_SIZE = 100000 # fingerprints kept, the oldest passes are dropped first
+suite_state = collections.OrderedDict() # fingerprint -> time the check passed, oldest first
+suite_specs = collections.OrderedDict() # spec line -> parsed spec of a check that passed (not parsed again)
+suite_state_stats = {'skipped': 0, 'ran': 0, 'changed': 0, 'loaded': 0}
+suite_state_file = None
+
+
+def load_suite_state(state_file):
+    """
+    Load the fingerprints of the checks that passed in earlier --incremental suite runs from state_file
+    and save them back at exit
+
+    :param state_file: The file name of the suite state (see _readstate() for the files loaded)
+    """
+    global suite_state_file
+    import marshal
+
+    suite_state_file = state_file
+    try:
+        version, passed_checks, passed_specs = marshal.loads(_readstate(state_file))
+        if version != STATE_VERSION:
+            raise ValueError("version %s" % version)
+    except (OSError, EOFError, ValueError, TypeError) as err:
+        if DBG: pindent("DBG: suite state: [%s] not loaded: %s" % (state_file, err))
+        return
+    suite_state.update(passed_checks)
+    suite_specs.update(passed_specs)
+    suite_state_stats['loaded'] = len(passed_checks)
+
+
+def save_suite_state():
+    """
+    Save the suite state to suite_state_file if a check passed or failed for the first time during this run
+    """
+    if not suite_state_file or not suite_state_stats['changed']:
+        return
+    import marshal
+
+    try:
+        _writestate(suite_state_file, marshal.dumps((STATE_VERSION, list(suite_state.items()), list(suite_specs.items()))))
+    except (OSError, ValueError) as err:
+        if DBG: pindent("DBG: suite state: [%s] not saved: %s" % (suite_state_file, err))
+
+
+def _cmd_programs(cmd):
+    """
+    The programs a cmd runs: the first word of every part of its pipelines and lists that is not a shell builtin
+
+    Ex: _cmd_programs("ping -c 2 localhost | grep -c icmp") -> ['/usr/bin/ping', '/usr/bin/grep']
+
+    :param cmd: shell command
+    :return:    list of the program paths (or names if they are not on the PATH)
+    """
+    programs = []
+    for part in re.split(r'[|&;()`\n]|\$\(', cmd):
+        words = part.split()
+        while words and '=' in words[0].lstrip('='): # FOO=bar cmd
+            words.pop(0)
+        if not words or words[0].strip('\'"') in SHELL_BUILTINS:
+            continue
+        program = words[0].strip('\'"')
+        programs.append(_which(program, os.environ.get('PATH', os.defpath)) or program)
+    return programs
+
+
+def _check_fingerprint(line, spec, suite_options=()):
+    """
+    Fingerprint of a --suite check that changes when the check could have a different verdict (--incremental)
+
+    The fingerprint is the sha256 of the spec line, the cwd, the suite options, the mtime and size of
+    the programs the cmd runs, of its --input, --cache_watch, and --file files, and the values of its
+    --cache_env vars.
+
+    :param line:          The check spec line
+    :param spec:          dict of the parsed options and arguments of line
+    :param suite_options: tuple of the suite options that change how every check runs (and its --input files)
+    :return:              The fingerprint hex string
+    """
+    import hashlib
+
+    input_files = spec['input'] + spec['cache_watch'] + ((spec['file'],) if spec['file'] else ())
+    fingerprint = (line, os.getcwd(), suite_options, tuple(_file_stamp(program) for program in _cmd_programs(spec['cmd'])),
+                   tuple(_file_stamp(input_file) for input_file in input_files),
+                   tuple((var, os.environ.get(var)) for var in sorted(spec['cache_env'])))
+    return hashlib.sha256(repr(fingerprint).encode('utf-8')).hexdigest()
+
+
+
+# ---
+# Seconds every --suite check took in earlier runs to balance the checks of the --shard runs (see _shardlines())
+suite_timings = {} # spec line -> seconds the check took the last time it ran
+suite_timings_ran = {} # spec line -> (seconds, time measured) of the checks of this run
+suite_timings_file = None
+
+
+def parse_shard(shard):
+    """
+    Parse the --shard of a suite run
+
+    Ex: parse_shard('2/4') -> (2, 4)
+
+    :param shard: "<i>/<N>" to run the i-th of N shards (1 <= i <= N)
+    :return:      tuple of i and N
+    :raises ValueError: if shard is not "<i>/<N>" with 1 <= i <= N
+    """
+    match = re.fullmatch(r'\s*(\d+)\s*/\s*(\d+)\s*', shard)
+    if not match or not 1 <= int(match.group(1)) <= int(match.group(2)):
+        raise ValueError("--shard [%s] is not <i>/<N> with 1 <= i <= N" % shard)
+    return int(match.group(1)), int(match.group(2))
+
+
+def _readtimings(timings_file):
+    """
+    Read the timings of a --timings file: one "<seconds><tab><time measured><tab><spec line>" line per check
+
+    The newest timing of a spec line is kept, so the timings files saved by the shards of a run are
+    combined in any order with --merge_timings or: cat shard*.timings > .tcmd.timings
+
+    :param timings_file: The file name of the timings
+    :return:             dict of the (seconds, time measured) of every spec line
+    """
+    timings = {}
+    with open(timings_file, encoding='utf-8', errors='replace') as f:
+        for timing in f:
+            fields = timing.rstrip('\n').split('\t', 2)
+            try:
+                seconds, measured, line = float(fields[0]), float(fields[1]), fields[2]
+            except (ValueError, IndexError):
+                continue
+            if line not in timings or timings[line][1] <= measured:
+                timings[line] = (seconds, measured)
+    return timings
+
+
+def load_suite_timings(timings_file):
+    """
+    Load the seconds every check took in earlier --suite runs from timings_file and save the
+    seconds of the checks of this run back at exit
+
+    :param timings_file: The file name of the timings (created if it does not exist)
+    """
+    global suite_timings_file
+
+    suite_timings_file = timings_file
+    try:
+        timings = _readtimings(timings_file)
+    except OSError:
+        if DBG: pindent("DBG: suite timings: [%s] not loaded" % timings_file)
+        return
+    suite_timings.update((line, seconds) for line, (seconds, _) in timings.items())
+
+
+def save_suite_timings():
+    """
+    Save the seconds of the checks that ran to suite_timings_file
+
+    The file is read again first so the timings another shard saved to the same file meanwhile are kept
+    (the newest timing of a check wins).
+    """
+    if not suite_timings_file or not suite_timings_ran:
+        return
+
+    try:
+        timings = _readtimings(suite_timings_file)
+    except OSError:
+        timings = {}
+    for line, timing in suite_timings_ran.items():
+        if line not in timings or timings[line][1] <= timing[1]:
+            timings[line] = timing
+    tmp_file = "%s.%s" % (suite_timings_file, os.getpid())
+    try:
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            for line, (seconds, measured) in timings.items():
+                f.write("%.3f\t%.3f\t%s\n" % (seconds, measured, line))
+        os.replace(tmp_file, suite_timings_file)
+    except OSError as err:
+        if DBG: pindent("DBG: suite timings: [%s] not saved: %s" % (suite_timings_file, err))
+
+
+def _shardlines(spec_lines, shard, timings=None):
+    """
+    The spec lines of one --shard of a suite balanced by the seconds the checks took in earlier runs
+
+    The lines with a timing are handed out slowest first (file order on a tie), each one to the shard with
+    the fewest seconds so far (the lowest shard on a tie), so the slow checks are spread over the shards.
+    The lines without a timing are dealt round robin in file order, so a new check lands in the same
+    shard whatever timings a shard has.  Every shard picks the same lines from the same suite and timings
+    (the shards of a run have to load the same --timings file, --merge fails if the shards missed or
+    repeated a check).
+
+    Ex: _shardlines([(1, 'sleep 3 ""'), (2, 'date 2026'), (3, 'sleep 2 ""')], (1, 2), {'sleep 3 ""': 3.0})
+        -> [(1, 'sleep 3 ""'), (2, 'date 2026')]
+
+    :param spec_lines: list of (line number, spec line) of the suite (blank and '#' lines are skipped)
+    :param shard:      tuple of i and N to pick the lines of the i-th of N shards (see parse_shard())
+    :param timings:    dict of the seconds of every spec line or None
+    :return:           list of (line number, spec line) of the shard in file order
+    """
+    import heapq
+
+    timings = timings or {}
+    shard_num, shard_count = shard
+    spec_lines = [(line_num, line) for line_num, line in spec_lines if line and not line.startswith('#')]
+    unseen = [(line_num, line) for line_num, line in spec_lines if line not in timings]
+    by_seconds = sorted((spec_line for spec_line in spec_lines if spec_line[1] in timings),
+                        key=lambda spec_line: (-timings[spec_line[1]], spec_line[0]))
+
+    shards = [(0.0, num) for num in range(1, shard_count + 1)] # heap of (seconds, shard num)
+    shard_lines = unseen[shard_num - 1::shard_count]
+    total = 0.0
+    for line_num, line in by_seconds:
+        seconds, num = heapq.heappop(shards)
+        if num == shard_num:
+            shard_lines.append((line_num, line))
+        seconds += timings[line]
+        total += timings[line]
+        heapq.heappush(shards, (seconds, num))
+    if DBG:
+        shard_seconds = dict((num, seconds) for seconds, num in shards)[shard_num]
+        pindent("DBG: shard %s/%s: [%s] of [%s] checks, [%.1f] of [%.1f] seconds, [%s] checks without a timing"
+                % (shard_num, shard_count, len(shard_lines), len(spec_lines), shard_seconds, total, len(unseen)))
+    return sorted(shard_lines)
+
+
+def escape_regex(regex):
+    """
+    Escape regex metachars so user does not have to backslash them on command line
+
+    :param regex: The regular expression to backslash metachars in
+
+    :return: Properly backslashed regular expression metachars in regex
+    """
+
+    # src: https://stackoverflow.com/questions/4202538/escape-regex-special-characters-in-a-python-string
+    regex = re.escape(regex)  ## This works better but regex is ugly in -v output
+    # regex = re.sub(r'([\.\\\+\*\?\[\^\]\$\(\)\{\}\!\<\>\|\:\-])', r'\\\1', regex)
+
+    return regex
+
+
+# ---
+# Compiled regex cache shared by every check of this tcmd process (see compile_regex())
+SEARCH_FLAGS = re.DOTALL|re.MULTILINE|re.IGNORECASE
+REGEX_CACHE_SIZE = 512
+regex_cache = collections.OrderedDict() # (regex, flags, backslash) -> compiled regex, least recently used first
+regex_cache_stats = {'hits': 0, 'misses': 0, 'loaded': 0}
+regex_cache_file = None
+REGEX_CACHE_VERSION = 1 # of the PrefilterRegex and required_literals() pickled in --regex_cache (bump on change)
+
+
+# ---
+# The literal prefilter (see required_literals() and PrefilterRegex) is only worth its extra scan
+# for literals of at least PREFILTER_MIN_LITERAL chars
+PREFILTER_MIN_LITERAL = 3
+QUANTIFIER_REGEX = r'\{(\d*),?(\d*)\}'
+VERBOSE_FLAG_REGEX = r'\(\?[a-zA-Z-]*x'
+ITEM_ESCAPES = 'dDwWsSbBAzZ' # \d, \b, ... match one char (or none) and take no argument
+
+
+def _skip_brackets(regex, i):
+    """
+    Index just past the [...] char class or the (...) group starting at regex[i] (-1 if it is not closed)
+
+    :param regex: The regular expression
+    :param i:     Index of the '[' or '(' in regex
+    """
+    if regex[i] == '[':
+        i += 1
+        if regex[i:i+1] == '^':
+            i += 1
+        if regex[i:i+1] == ']':
+            i += 1
+        while i < len(regex):
+            if regex[i] == '\\':
+                i += 2
+            elif regex[i] == ']':
+                return i + 1
+            else:
+                i += 1
+        return -1
+
+    depth = 0
+    while i < len(regex):
+        if regex[i] == '\\':
+            i += 2
+            continue
+        if regex[i] == '[':
+            i = _skip_brackets(regex, i)
+            if i == -1:
+                return -1
+            continue
+        if regex[i] == '(':
+            depth += 1
+        elif regex[i] == ')':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return -1
+
+
+def required_literals(regex):
+    """
+    Find the literal substrings that every match of regex has to contain
+
+    Only the top level of regex is analysed: groups, char classes, '.', anchors, and \\d like escapes split
+    the literals and a char with a '*', '?', or '{m,n}' quantifier is dropped from its literal.  Any top
+    level '|', verbose flag, or escape with an argument (\\x41, \\p{L}, ...) gives no literals at all.
+
+    Ex: required_literals(r"\d+ packets received") -> ([' packets received'], False)
+        required_literals("localhost")             -> (['localhost'], True)
+
+    :param regex: The regular expression (str)
+    :return:      tuple = (literals, pure) where pure is True when regex is just one plain literal
+    """
+    if re.search(VERBOSE_FLAG_REGEX, regex):
+        return ([], False)
+    literals = []
+    literal = ''
+    pure = True
+    i = 0
+    while i < len(regex):
+        ch = regex[i]
+        if ch == '\\':
+            escaped = regex[i+1:i+2]
+            if not escaped or (escaped.isalnum() and escaped not in ITEM_ESCAPES):
+                return ([], False)
+            i += 2
+            if not escaped.isalnum():
+                literal += escaped
+                continue
+        elif ch in '*?{':
+            if ch == '{':
+                quantifier = re.compile(QUANTIFIER_REGEX).match(regex, i)
+                if not quantifier or not (quantifier.group(1) or quantifier.group(2)):
+                    return ([], False)
+                i = quantifier.end()
+            else:
+                i += 1
+            literal = literal[:-1]
+        elif ch in '[(':
+            i = _skip_brackets(regex, i)
+            if i == -1:
+                return ([], False)
+        elif ch in '|)':
+            return ([], False)
+        elif ch in '+.^$':
+            i += 1
+        else:
+            literal += ch
+            i += 1
+            continue
+
+        # ---
+        # Anything but a plain char ends the current literal
+        pure = False
+        if literal:
+            literals.append(literal)
+        literal = ''
+
+    if literal:
+        literals.append(literal)
+    return (literals, pure and len(literals) == 1)
+
+
+class PrefilterRegex(object):
+    """
+    A compiled regex that first scans text for a literal every match has to contain and only runs the
+    full regex search when the literal is there (made by compile_regex())
+
+    A literal with no letters is found with a plain find() and when every match starts with it (prefix)
+    the find() position is where the regex search starts.  A literal with letters is searched with the
+    same flags as the regex (IGNORECASE) so the prefilter never rejects text the regex would match.
+
+    Ex: PrefilterRegex(re.compile("error:.*timeout", SEARCH_FLAGS), "timeout").search(cmd_stdout)
+    """
+
+    def __init__(self, compiled_regex, literal, prefix=False):
+        """
+        :param compiled_regex: The compiled regex
+        :param literal:        A literal (str or bytes) every match of compiled_regex contains
+        :param prefix:         Every match of compiled_regex starts with literal
+        """
+        self.compiled_regex = compiled_regex
+        self.pattern = compiled_regex.pattern
+        self.flags = compiled_regex.flags
+        self.literal = literal
+        self.prefix = prefix
+        caseless = literal.isascii() and literal.lower() == literal.upper()
+        self.literal_regex = None if caseless else re.compile(escape_regex(literal), compiled_regex.flags)
+
+    def search(self, text, pos=0):
+        """ The regex match object or None when text (from pos) does not have the literal """
+        if self.literal_regex is None:
+            literal_pos = text.find(self.literal, pos)
+            if literal_pos == -1:
+                return None
+            if self.prefix:
+                return self.compiled_regex.search(text, literal_pos)
+        elif not self.literal_regex.search(text, pos):
+            return None
+        return self.compiled_regex.search(text, pos)
+
+    def finditer(self, text):
+        """ Iterator of the regex match objects (empty when text does not have the literal) """
+        if self.search(text) is None:
+            return iter(())
+        return self.compiled_regex.finditer(text)
+
+
+def compile_regex(regex, flags=SEARCH_FLAGS, backslash=False, as_bytes=False):
+    """
+    Compile regex once and return the compiled regex from the LRU regex_cache after that
+
+    A regex that has a required literal of PREFILTER_MIN_LITERAL chars is returned as a PrefilterRegex
+    (except when the regex starts with a literal with letters which the regex module already scans for).
+
+    Ex: compile_regex("3 packets received").search(cmd_stdout)
+
+    :param regex:     The regular expression to compile
+    :param flags:     The re flags to compile regex with
+    :param backslash: Backslash all the regex metachars in regex before compiling (--backslash)
+    :param as_bytes:  Compile the utf-8 bytes of regex to search bytes output (--bytes)
+    :return:          The compiled regex (or PrefilterRegex)
+    """
+    key = (regex, flags, backslash, as_bytes)
+    try:
+        compiled_regex = regex_cache[key]
+        regex_cache.move_to_end(key)
+        regex_cache_stats['hits'] += 1
+    except KeyError:
+        regex_cache_stats['misses'] += 1
+        pattern = regex.encode('utf-8') if as_bytes else regex
+        compiled_regex = re.compile(escape_regex(pattern) if backslash else pattern, flags)
+
+        # ---
+        # A backslashed regex is a pure literal without looking at it
+        literals, pure = ([regex], True) if backslash else required_literals(regex)
+        literal = max(literals, key=len) if literals else ''
+        prefix = pure or (literal and literal == literals[0] and regex.startswith(literal))
+        caseless = literal.isascii() and literal.lower() == literal.upper()
+        if len(literal) >= PREFILTER_MIN_LITERAL and (caseless or not prefix):
+            compiled_regex = PrefilterRegex(compiled_regex, literal.encode('utf-8') if as_bytes else literal, prefix)
+        regex_cache[key] = compiled_regex
+        if len(regex_cache) > REGEX_CACHE_SIZE:
+            regex_cache.popitem(last=False)
+    return compiled_regex
+
+
+def load_regex_cache(cache_file):
+    """
+    Load the compiled regexes saved in cache_file by an earlier tcmd run and save them back at exit
+
+    Note: The regex module pickles the compiled regex code so a loaded regex is not compiled again.
+          The compiled regexes are not plain data so this is the one state file loaded with pickle,
+          and like the others only if it is owned by you and not writable by others (see _readstate()).
+          The cache is dropped if it was saved by another REGEX_CACHE_VERSION of tcmd or regex version.
+
+    :param cache_file: The file name of the compiled regex cache
+    """
+    global regex_cache_file
+    import pickle
+
+    regex_cache_file = cache_file
+    try:
+        cache_version, version, cached_regexes = pickle.loads(_readstate(cache_file))
+    except (OSError, EOFError, ValueError, TypeError, AttributeError, pickle.UnpicklingError) as err:
+        if DBG: pindent("DBG: regex cache: [%s] not loaded: %s" % (cache_file, err))
+        return
+
+    # ---
+    # The compiled regex code is only good for the regex module version that compiled it and the
+    # PrefilterRegex's for the tcmd that built them
+    if cache_version != REGEX_CACHE_VERSION or version != re.__version__:
+        if DBG: pindent("DBG: regex cache: [%s] is from tcmd cache version %s regex %s" % (cache_file, cache_version, version))
+        return
+    regex_cache.update(cached_regexes)
+    regex_cache_stats['loaded'] = len(cached_regexes)
+
+
+def save_regex_cache():
+    """
+    Save the compiled regex cache to regex_cache_file if a regex was compiled during this run
+    """
+    if not regex_cache_file or not regex_cache_stats['misses']:
+        return
+    import pickle
+
+    try:
+        _writestate(regex_cache_file, pickle.dumps((REGEX_CACHE_VERSION, re.__version__, regex_cache),
+                                                   pickle.HIGHEST_PROTOCOL))
+    except OSError as err:
+        if DBG: pindent("DBG: regex cache: [%s] not saved: %s" % (regex_cache_file, err))
+
+
+def _flush_state():
+    """
+    Save the --regex_cache, --cache, --incremental, and --timings files loaded by this run
+
+    Runs at exit and at the end of every --server run, whose fork ends with os._exit() without atexit.
+    """
+    save_regex_cache()
+    save_cmd_cache()
+    save_suite_state()
+    save_suite_timings()
+
+
+atexit.register(_flush_state)
+
+
+# ---
+# --stream reads the cmd pipes STREAM_CHUNK bytes at a time and searches a sliding window of
+# at most STREAM_WINDOW chars so a regex can match across the lines inside the window
+# (the new text is searched after every STREAM_WINDOW/4 chars or when the pipe is drained together with
+#  the last STREAM_OVERLAP chars searched before, so a match can span the chunks of that many chars)
+STREAM_CHUNK   = 64*1024
+STREAM_WINDOW  = 1024*1024
+STREAM_OVERLAP = 64*1024
+
+# ---
+# Seconds a killed cmd gets to exit after SIGTERM before its process group gets SIGKILL
+KILL_GRACE = 1
+
+
+class StreamSearch(object):
+    """
+    Search a regex over text fed in chunks while keeping only a bounded window of the text
+
+    Ex: stdout_search = StreamSearch("3 packets received")
+        stdout_search.feed(chunk) ... for every chunk of stdout
+        stdout_searchObj = stdout_search.result()
+    """
+
+    def __init__(self, regex, backslash=False, window=STREAM_WINDOW, as_bytes=False):
+        """
+        :param regex:     The regular expression to search for ("", "^$" or "\\A\\z" for blank text)
+        :param backslash: Backslash all the regex metachars in regex (--backslash)
+        :param window:    Max number of chars kept to search and report
+        :param as_bytes:  The text fed is bytes (--bytes)
+        """
+        self.blank_regex = not regex or (not backslash and regex in ('^$', '\\A\\z'))
+        self.compiled_regex = None if self.blank_regex else compile_regex(regex, backslash=backslash, as_bytes=as_bytes)
+        self.window = window
+        self.newline = b'\n' if as_bytes else '\n'
+        self.text = self.newline[:0] # The window of text searched (or the text around the match)
+        self.head = self.text  # The first chars fed, reported in front of the window once it slid past them
+        self.head_size = REPORT_SIZE or window
+        self.dropped = 0       # Count of the chars slid out of the window
+        self.blank = True      # No text other than whitespace has been fed
+        self.searchObj = None  # The regex match once found
+        self.nchars = 0        # Count of all the chars fed
+        self.unsearched = 0    # Count of the chars fed since the last search
+        self.pos = 0           # Where in text the next search starts (the overlap before the new text)
+
+    def feed(self, text, drained=True):
+        """
+        Add the new text to the window and search it once a quarter window of new text arrived
+        (or the pipe is drained) and then slide the window forward to the last window chars
+
+        Only the text from pos is searched: the new text and the lines of the last STREAM_OVERLAP chars
+        searched before it, so a match that spans two chunks is still found without searching the whole
+        window again.
+
+        :param text:    The next chunk of text
+        :param drained: The pipe had no more text to read right now so search the window now
+        """
+        self.nchars += len(text)
+        if len(self.head) < self.head_size:
+            self.head += text[:self.head_size - len(self.head)]
+        if self.blank and text.strip():
+            self.blank = False
+        if self.searchObj:
+            return
+
+        self.text += text
+        self.unsearched += len(text)
+        if not drained and self.unsearched < self.window // 4:
+            return
+        self.unsearched = 0
+        if self.compiled_regex:
+            self.searchObj = self.compiled_regex.search(self.text, self.pos)
+            if self.searchObj:
+                return
+            overlap = max(len(self.text) - STREAM_OVERLAP, self.pos)
+            self.pos = max(self.text.rfind(self.newline, self.pos, overlap) + 1, self.pos)
+
+        # ---
+        # Keep the window starting at a line boundary so ^ still matches at the start of a line
+        if len(self.text) > self.window:
+            start = len(self.text) - self.window
+            newline = self.text.find(self.newline, start)
+            start = newline + 1 if newline != -1 else start
+            self.text = self.text[start:]
+            self.pos = max(self.pos - start, 0)
+            self.dropped += start
+
+    def head_report(self):
+        """
+        The head of the text kept for the -v and -d reports once the window slid past it (see _preview())
+
+        :return: tuple = (first chars fed, count of chars between them and the window) or None if the window
+                 still starts at the first char fed
+        """
+        if not self.dropped:
+            return None
+        head = self.head[:self.dropped]
+        return (head, self.dropped - len(head))
+
+    def matched(self):
+        """ True once the regex has matched (never for a blank regex) """
+        return bool(self.searchObj)
+
+    def result(self):
+        """ The regex match object or None, True or False for a blank regex like isBlank() """
+        if self.blank_regex:
+            return self.blank
+        if self.searchObj is None and self.unsearched:
+            # All the text arrived: search the text fed since the last search
+            self.unsearched = 0
+            self.searchObj = self.compiled_regex.search(self.text, self.pos)
+        return self.searchObj
+
+
+def _streamstdin(stdout_search, cmd_stderr='', cmd_return='0', until_match=False, decode=True):
+    """
+    Feed stdin to the stdout StreamSearch as it arrives instead of reading all of it into memory (--stdin)
+
+    :param stdout_search: StreamSearch of the stdout regex
+    :param cmd_stderr:    stderr of the cmd substitute (':' has none)
+    :param cmd_return:    return status of the cmd substitute
+    :param until_match:   stop reading stdin as soon as stdout_search matched (--until_match)
+    :param decode:        decode stdin from utf-8 or feed its bytes to stdout_search (--bytes)
+    :return:              CmdOutput tuple = (cmd_stdout, cmd_stderr, cmd_return) where stdout is the last
+                          window of stdin (or the window around the match)
+
+    Note: The trailing newlines of stdin are not searched like tcmd always did with all of stdin read
+          (printf 'foo\n' | tcmd -s : 'foo\Z' passes) so they are only counted and fed once more text
+          follows them (a chunk at a time, so a stdin of only newlines is not held in memory).
+    """
+    start_time = monotonic()
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace') if decode else None
+    newline = '\n' if decode else b'\n'
+    held = 0 # count of the trailing newlines of the text read so far
+    stdin_fd = sys.stdin.fileno()
+    nbytes = 0
+    while True:
+        data = os.read(stdin_fd, STREAM_CHUNK)
+        nbytes += len(data)
+        text = decoder.decode(data, final=not data) if decoder else data
+        trimmed = text.rstrip(newline)
+        if trimmed:
+            while held:
+                count = min(held, STREAM_CHUNK)
+                stdout_search.feed(newline * count, drained=False)
+                held -= count
+        held += len(text) - len(trimmed)
+        stdout_search.feed(trimmed, drained=len(data) < STREAM_CHUNK)
+        if not data:
+            break
+        if until_match and stdout_search.matched():
+            if DBG: pindent("DBG: stdout matched, not reading the rest of stdin")
+            break
+
+    if DBG: pindent("DBG: stream: stdin chars [%s]" % stdout_search.nchars)
+    stream_time = monotonic() - start_time
+    return CmdOutput(stdout_search.text, cmd_stderr, cmd_return, stream_time, nbytes=nbytes,
+                     phases={'stream': stream_time}, heads=(stdout_search.head_report(), None))
+
+
+def _killcmd(proc, grace=KILL_GRACE):
+    """
+    Kill the process group of a cmd started with start_new_session=True
+
+    The process group gets a SIGTERM and then a SIGKILL for any process still left after
+    grace seconds (or after the cmd exited).
+
+    :param proc:  subprocess.Popen of the cmd
+    :param grace: seconds to wait for the cmd to exit after the SIGTERM
+    """
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(proc.pid, sig)
+        except ProcessLookupError:
+            break
+        try:
+            proc.wait(grace)
+        except subprocess.TimeoutExpired:
+            pass
+
+
+def _streamcmd(cmd, stdout_search, stderr_search, until_match=False, shell=None, timeout=None, decode=True,
+               limits=None):
+    """
+    Executes a shell command in a subprocess and feeds its stdout and stderr to the StreamSearch's
+    as the output arrives instead of reading all of it into memory
+
+    :param cmd:           shell command to run
+    :param stdout_search: StreamSearch of the stdout regex
+    :param stderr_search: StreamSearch of the stderr regex
+    :param until_match:   kill the cmd process group as soon as stdout_search matched (--until_match)
+    :param shell:         True to always run cmd with /bin/sh, else only if it needs a shell (see _popencmd())
+    :param timeout:       seconds to wait for the cmd before killing it and raising CmdTimeout (--timeout)
+    :param decode:        decode stdout and stderr from utf-8 or feed the bytes to the StreamSearch's (--bytes)
+    :param limits:        dict of the 'cpu', 'as', and 'output' limits of the cmd or None (see _rlimits())
+    :return:              CmdOutput tuple = (cmd_stdout, cmd_stderr, cmd_return) where stdout and stderr
+                          are the last window of the output (or the window around the match)
+    """
+    if timeout is not None and timeout <= 0:
+        raise CmdTimeout(cmd, timeout, CmdOutput("", "", "None"))
+
+    PIPE=subprocess.PIPE
+    start_time = monotonic()
+    max_output = limits.get('output') if limits else None
+    # ---
+    # Start the cmd in its own process group so it can be killed with all of its children
+    proc = _popencmd(cmd, shell=shell, limits=limits, stdout=PIPE, stderr=PIPE,
+                     start_new_session=until_match or timeout is not None or max_output is not None)
+    spawn_time = monotonic()
+    searches = {
+        proc.stdout: (stdout_search, codecs.getincrementaldecoder('utf-8')(errors='replace') if decode else None),
+        proc.stderr: (stderr_search, codecs.getincrementaldecoder('utf-8')(errors='replace') if decode else None),
+    }
+    deadline = None if timeout is None else monotonic() + timeout
+    timed_out = over = False
+    nbytes = 0
+
+    with selectors.DefaultSelector() as selector:
+        for pipe in searches:
+            selector.register(pipe, selectors.EVENT_READ)
+        while selector.get_map():
+            remaining = None if deadline is None else deadline - monotonic()
+            if remaining is not None and remaining <= 0:
+                timed_out = True
+                break
+            for key, events in selector.select(remaining):
+                search, decoder = searches[key.fileobj]
+                data = os.read(key.fd, STREAM_CHUNK)
+                nbytes += len(data)
+                search.feed(decoder.decode(data, final=not data) if decoder else data, drained=len(data) < STREAM_CHUNK)
+                if not data:
+                    selector.unregister(key.fileobj)
+            if until_match and stdout_search.matched():
+                if DBG: pindent("DBG: stdout matched, killing cmd process group [%s]" % proc.pid)
+                _killcmd(proc)
+                break
+            if max_output is not None and nbytes > max_output:
+                if DBG: pindent("DBG: over --max_output, killing cmd process group [%s]" % proc.pid)
+                over = True
+                _killcmd(proc)
+                break
+
+    # ---
+    # The cmd can still be running after closing its stdout and stderr
+    if not timed_out and deadline is not None:
+        try:
+            proc.wait(max(deadline - monotonic(), 0))
+        except subprocess.TimeoutExpired:
+            timed_out = True
+    if timed_out:
+        if DBG: pindent("DBG: timeout, killing cmd process group [%s]" % proc.pid)
+        _killcmd(proc)
+
+    proc.stdout.close()
+    proc.stderr.close()
+    cmd_return = str(proc.wait())
+    stream_time = monotonic()
+    cmd_output = CmdOutput(stdout_search.text, stderr_search.text, cmd_return, stream_time - start_time,
+                           proc.cpu_time(), nbytes, proc.rusage, 'output' if over else proc.over_cpu(limits),
+                           {'spawn': spawn_time - start_time, 'stream': stream_time - spawn_time},
+                           (stdout_search.head_report(), stderr_search.head_report()))
+
+    if DBG: pindent("DBG: stream: stdout chars [%s] stderr chars [%s]" % (stdout_search.nchars, stderr_search.nchars))
+    _dbg_cmd_output(stdout_search.text, stderr_search.text, cmd_return)
+    if timed_out:
+        raise CmdTimeout(cmd, timeout, cmd_output)
+
+    return cmd_output
+
+
+def isBlank (myString):
+    """
+    Check if myString is an empty string without using regular expressions
+    Src: https://stackoverflow.com/questions/9573244/most-elegant-way-to-check-if-the-string-is-empty-in-python
+
+    :param myString: cmd_stdout string to check if empty (or the mmap of a --file)
+    :return:         True or False
+    """
+    if myString is not None and not hasattr(myString, 'strip'):
+        # A --file mmap is checked a chunk at a time instead of copying all of it to strip() it
+        for start in range(0, len(myString), STREAM_CHUNK):
+            if myString[start:start+STREAM_CHUNK].strip():
+                return False
+        return True
+    if myString and myString.strip():
+        # myString is not None AND myString is not empty or blank
+        return False
+    # myString is None OR myString is empty or blank
+    return True
+
+
+def _format_record(format, record, cmd_stdout='', cmd_stderr=''):
+    """
+    Format the result record of one check as a JSON Lines line or a JUnit XML <testcase> element (--format)
+
+    The record keys are: verdict (Pass, Fail, Timeout), failed (the channel that did not match: stdout,
+    stderr, return_code, usage, limit, timeout), cmd, comment, patterns (the stdout, stderr, return_code,
+    and --usage regexes), negate, exit_code, wall_time and cpu_time (seconds), bytes (of stdout and stderr
+    captured), timeout, usage (see CmdOutput.usage()), limit (the --max_cpu or --max_output gone over), and
+    cached (True for a check skipped by --incremental)
+
+    :param format:     'jsonl' or 'junit'
+    :param record:     dict of the result of the check
+    :param cmd_stdout: stdout of the cmd added to the <testcase> of a Fail or Timeout
+    :param cmd_stderr: stderr of the cmd added to the <testcase> of a Fail or Timeout
+    :return:           The formatted record string
+    """
+    if format == 'jsonl':
+        import json
+        return json.dumps(record)
+
+    from xml.sax.saxutils import escape, quoteattr
+
+    def xml_text(text):
+        """ Remove the control chars XML does not allow """
+        return re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f]', '', str(text))
+
+    name = "cmd [%s]" % record['cmd']
+    if record['comment']:
+        name += " # " + record['comment']
+    lines = ['  <testcase classname="tcmd" name=%s time="%.6f">' % (quoteattr(xml_text(name)), record['wall_time'])]
+    lines.append('    <properties>')
+    for key in ('exit_code', 'cpu_time', 'bytes', 'usage', 'cached'):
+        if key in record:
+            lines.append('      <property name="%s" value=%s/>' % (key, quoteattr(xml_text(record[key]))))
+    for channel, pattern in (record['patterns'] or {}).items():
+        lines.append('      <property name="%s_regex" value=%s/>' % (channel, quoteattr(xml_text(pattern))))
+    lines.append('    </properties>')
+    if record['verdict'] == 'Fail':
+        if record['failed'] == 'limit':
+            message = "went over --max_%s" % record['limit']
+        else:
+            message = "%s does NOT match regEx" % record['failed']
+        lines.append('    <failure type="%s" message=%s/>' % (record['failed'], quoteattr(message)))
+    elif record['verdict'] == 'Timeout':
+        message = "did NOT finish in %g seconds" % record['timeout']
+        lines.append('    <error type="timeout" message=%s/>' % quoteattr(message))
+    if record['verdict'] != 'Pass':
+        lines.append('    <system-out>%s</system-out>' % escape(xml_text(cmd_stdout)))
+        lines.append('    <system-err>%s</system-err>' % escape(xml_text(cmd_stderr)))
+    lines.append('  </testcase>')
+    return '\n'.join(lines)
+
+
+# ---
+# Regexes that change meaning when they are combined into one alternation: backreferences and inline flags
+UNCOMBINABLE_REGEX = r'\\[1-9]|\\g<|\(\?P=|\(\?[aiLmsux-]+\)'
+
+
+def _search_patterns(text, patterns, match='all', backslash=False):
+    """
+    Search text for several regexes in one scan and test that all, any, or none of them matched
+
+    The regexes are combined into one alternation of named groups (tcmd_0|tcmd_1|...) so text is scanned
+    once.  A regex hidden by an earlier alternative matching at the same place is searched again by itself
+    and only if the scan found something.  The empty regexes "", "^$", "\\A\\z" are tested with isBlank().
+
+    Ex: _search_patterns(cmd_stdout, ['Server started', 'port 8080'], match='all')
+
+    :param text:      The cmd stdout or stderr to search
+    :param patterns:  list of regular expressions
+    :param match:     'all', 'any', or 'none' of the patterns have to match
+    :param backslash: Backslash all the regex metachars in the patterns (--backslash)
+    :return:          tuple = (passed, matched) where matched is the list of booleans of the patterns
+    """
+    as_bytes = not isinstance(text, str)
+    matched = [None] * len(patterns)
+    searches = []
+    for i, pattern in enumerate(patterns):
+        if not pattern or (not backslash and pattern in ('^$', '\\A\\z')):
+            matched[i] = isBlank(text)
+        else:
+            searches.append(i)
+
+    if len(searches) > 1 and not any(re.search(UNCOMBINABLE_REGEX, patterns[i]) for i in searches):
+        alternation = '|'.join('(?P<tcmd_%s>%s)' % (i, escape_regex(patterns[i]) if backslash else patterns[i])
+                               for i in searches)
+        found = set()
+        for searchObj in compile_regex(alternation, as_bytes=as_bytes).finditer(text):
+            found.update(i for i in searches if searchObj.group('tcmd_%s' % i) is not None)
+            if match == 'all' and len(found) == len(searches):
+                break
+        for i in searches:
+            matched[i] = i in found
+        if found:
+            searches = [i for i in searches if i not in found]
+        else:
+            searches = []
+
+    for i in searches:
+        matched[i] = compile_regex(patterns[i], backslash=backslash, as_bytes=as_bytes).search(text) is not None
+
+    if match == 'any':
+        passed = any(matched)
+    elif match == 'none':
+        passed = not any(matched)
+    else:
+        passed = all(matched)
+    return (passed, matched)
+
+
+def _search_output(cmd_output, regex, stderr_regex='^$', return_code_regex='0', stdout_regex=None, backslash=False,
+                   also=(), also_error=(), match='all', error_match='all', results=None):
+    """
+    Search the stdout, stderr, and return code of a cmd with their regexes
+
+    The empty regexes "", "^$", and "\\A\\z" are tested with isBlank() instead of a regex search.
+    With more stdout or stderr regexes (also, also_error) or any/none matching, all the regexes of
+    stdout (or stderr) are searched in one scan by _search_patterns() and the searchObj is a boolean.
+
+    :param cmd_output:        tuple = (cmd_stdout, cmd_stderr, cmd_return) of the cmd
+    :param regex:             regular expression to test the stdout of cmd (backslashed with --backslash)
+    :param stderr_regex:      regular expression to test the stderr of cmd
+    :param return_code_regex: regular expression to test the return code of cmd
+    :param stdout_regex:      regex before it was backslashed (None if the same as regex)
+    :param backslash:         stdout_regex needs all of its regex metachars backslashed
+    :param also:              more regular expressions to test the stdout of cmd (--also)
+    :param also_error:        more regular expressions to test the stderr of cmd (--also_error)
+    :param match:             'all', 'any', or 'none' of the stdout regexes have to match (--match)
+    :param error_match:       'all', 'any', or 'none' of the stderr regexes have to match (--error_match)
+    :param results:           dict filled with the 'stdout' and 'stderr' lists of (regex, matched) of
+                              every regex searched by _search_patterns()
+    :return:                  tuple = (stdout_searchObj, stderr_searchObj, return_code_searchObj) where
+                              each is a match object, None, or a boolean
+    """
+    cmd_stdout, cmd_stderr, cmd_return = cmd_output
+    as_bytes = not isinstance(cmd_stdout, str) # --bytes output is searched with bytes regexes
+    if stdout_regex is None:
+        stdout_regex = regex
+    if results is None:
+        results = {}
+
+    # ---
+    # Must set regex to empty string explicitly because tcmd date "" prints "Pass:"
+    # if not regex or regex == '^$':
+    #     src: https://stackoverflow.com/questions/19127384/what-is-a-regex-to-match-only-an-empty-string
+    #     regex = r'^$' # matches empty string AND newline
+    #     regex = '\A\z'
+    #     regex = '^$'
+    #     regex = '^$'; # this is matching a newline somehow (removing the newline makes it pass)
+
+    # ---
+    # Now check cmd_stdout against the regex and print Pass or Fail
+    # Src: https://www.thegeekstuff.com/2014/07/advanced-python-regex/ ## DOTALL allows "." across '\n' boundries
+    ##stdout_searchObj      = re.search(            regex, cmd_stdout, re.DOTALL|re.MULTILINE|re.IGNORECASE)
+    # ---
+    # Note: Have to special case empty strings because of python re matching ^$ problem
+    # Note: regex is false when: tcmd date ""
+    # Note: To get around using a regex I use
+    # stdout_searchObj = False
+    if also or match != 'all':
+        patterns = [stdout_regex] + list(also)
+        stdout_searchObj, matched = _search_patterns(cmd_stdout, patterns, match=match, backslash=backslash)
+        results['stdout'] = list(zip(patterns, matched))
+    elif not regex or regex == '^$' or regex == '\A\z': # Expecting an empty cmd_stdout
+        if isBlank(cmd_stdout):
+            stdout_searchObj = True
+        else:
+            stdout_searchObj = False
+    else:
+        stdout_searchObj  = compile_regex(stdout_regex, backslash=backslash, as_bytes=as_bytes).search(cmd_stdout)
+
+    # ---
+    # Have to do the same thing for stderr_regex for tcmd -n -d -v -r 127 -e "" dat "" to Pass
+    if also_error or error_match != 'all':
+        patterns = [stderr_regex] + list(also_error)
+        stderr_searchObj, matched = _search_patterns(cmd_stderr, patterns, match=error_match)
+        results['stderr'] = list(zip(patterns, matched))
+    elif not stderr_regex or stderr_regex == '^$' or stderr_regex == '\A\z': # Expecting an empty cmd_stdout
+        if isBlank(cmd_stderr):
+            stderr_searchObj = True
+        else:
+            stderr_searchObj = False
+    else:
+        stderr_searchObj  = compile_regex(stderr_regex, as_bytes=as_bytes).search(cmd_stderr)
+    return_code_searchObj = compile_regex(return_code_regex).search(cmd_return)
+
+    return (stdout_searchObj, stderr_searchObj, return_code_searchObj)
+
+
+def _percentile(values, percent):
+    """
+    Nearest rank percentile of values
+
+    :param values:  sorted list of numbers
+    :param percent: percentile from 0 to 100
+    :return:        The smallest value with percent of the values <= to it
+    """
+    import math
+
+    return values[max(int(math.ceil(percent / 100.0 * len(values))) - 1, 0)]
+
+
+def _runbench(cmd, repeat, warmup=0, passed=None, shell=None, timeout=None, decode=True, limits=None):
+    """
+    Run cmd warmup + repeat times with _runcmd() and measure the wall time and user/sys cpu of every
+    repeat run (--repeat, --warmup)
+
+    The runs stop at the first one that did not pass so it can be reported
+
+    :param cmd:     shell command to run
+    :param repeat:  number of measured runs
+    :param warmup:  number of runs before the measured ones that are not measured or tested
+    :param passed:  function(cmd_output) returning True if the output of a run passes
+    :param shell:   True to always run cmd with /bin/sh, else only if it needs a shell (see _popencmd())
+    :param timeout: seconds every run can take before it is killed and CmdTimeout is raised
+    :param decode:  decode stdout and stderr from utf-8 or leave them bytes (--bytes)
+    :param limits:  dict of the 'cpu', 'as', and 'output' limits of every run or None (see _rlimits())
+    :return:        tuple = (cmd_output, bench) where cmd_output is the CmdOutput of the last run and
+                    bench is the dict of the runs, warmup, and the min, median, p90, p95, p99, max
+                    statistics of the wall, user, and sys times of the measured runs in seconds
+    """
+    import statistics
+
+    for run in range(warmup):
+        _runcmd(cmd, shell=shell, dbg=False, timeout=timeout, decode=decode, limits=limits)
+
+    times = {'wall': [], 'user': [], 'sys': []}
+    for run in range(repeat):
+        cmd_output = _runcmd(cmd, shell=shell, dbg=False, timeout=timeout, decode=decode, limits=limits)
+        times['wall'].append(cmd_output.wall_time)
+        if cmd_output.rusage is not None:
+            times['user'].append(cmd_output.rusage.ru_utime)
+            times['sys'].append(cmd_output.rusage.ru_stime)
+        if passed and not passed(cmd_output):
+            break
+
+    bench = {'runs': len(times['wall']), 'warmup': warmup}
+    for name, values in times.items():
+        if not values:
+            continue
+        values.sort()
+        stats = {
+            'min': values[0], 'median': statistics.median(values), 'p90': _percentile(values, 90),
+            'p95': _percentile(values, 95), 'p99': _percentile(values, 99), 'max': values[-1],
+        }
+        bench[name] = {stat: round(value, 6) for stat, value in stats.items()}
+
+    if DBG: _dbg_cmd_output(*cmd_output)
+    return (cmd_output, bench)
+
+
+# ---
+# Wait between the --retry_until attempts: seconds before the first retry, factor it grows by after every
+# attempt, max seconds, and the fraction of it that is random
+RETRY_DELAY = 0.1
+RETRY_BACKOFF = 2.0
+RETRY_MAX_DELAY = 5.0
+RETRY_JITTER = 0.1
+
+
+class CheckResult(object):
+    """
+    The result of one check run by run_check(): its verdict and the cmd output and regex matches it is based on
+
+    Ex: result = run_check("ping -c 3 localhost", "3 packets received")
+        if not result:
+            print(result.verdict, result.failed, result.stdout)
+
+    Close the result of a check with file (or use it in a with statement) to unmap the file right away:
+
+        with run_check(":", "Server started", file="huge.log") as result:
+            print(result.verdict)
+
+    verdict:    'Pass', 'Fail', or 'Timeout'
+    failed:     the first of limit, stdout, stderr, return_code, usage, p95 that did not pass ('timeout'
+                for a Timeout, None for a Pass) in the same order as the Fail lines
+    searchObjs: dict of the 'stdout', 'stderr', 'return_code', and 'usage' regex matches (match object,
+                None, or True/False for a blank regex) where the stdout one is not negated
+    retry:      dict of the --retry_until attempts, wait (seconds slept between them), and elapsed seconds
+                until the last attempt finished or None (see _retrycheck())
+    phases:     dict of the seconds of every phase of the check: spawn (start the cmd), capture (drain its
+                pipes until it exited), decode (utf-8), stream (read, decode, and search with --stream),
+                map (--file), cache (--cache hit), search (all the regexes), check (all of run_check()),
+                and report (print the Pass/Fail line added by _print_check())
+    """
+    retry = None
+
+    def __init__(self, cmd, patterns, cmd_output, stdout, stderr, searchObjs, negate=False, backslash=False,
+                 comment=None, timed_out=None, results=None, match='all', error_match='all', limits=None,
+                 bench=None, max_p95=None, phases=None):
+        """
+        :param cmd:         cmd of the check ('<stdin> :' or '<file path> :' for the cmd substitutes)
+        :param patterns:    dict of the 'stdout', 'stderr', 'return_code' (and 'usage') regexes as given
+        :param cmd_output:  CmdOutput of the cmd with the measurements of its run
+        :param stdout:      stdout of the cmd searched (only the window of it with --stream)
+        :param stderr:      stderr of the cmd searched
+        :param searchObjs:  dict of the regex match of every channel
+        :param negate:      the stdout regex must not match (--negate)
+        :param backslash:   all the regex metachars of the stdout regex were backslashed (--backslash)
+        :param comment:     comment of the check
+        :param timed_out:   CmdTimeout if the cmd was killed by its timeout else None
+        :param results:     dict of the 'stdout' and 'stderr' lists of (regex, matched) of --also and --also_error
+        :param match:       'all', 'any', or 'none' of the stdout regexes have to match
+        :param error_match: 'all', 'any', or 'none' of the stderr regexes have to match
+        :param limits:      dict of the 'cpu', 'as', and 'output' limits of the cmd or None
+        :param bench:       dict of the --repeat wall and cpu time statistics (see _runbench()) or None
+        :param max_p95:     Fail if the p95 wall time of the repeat runs is over max_p95 seconds
+        :param phases:      dict of the seconds of every phase of the check (see --phases)
+        """
+        self.cmd = cmd
+        self.patterns = patterns
+        self.cmd_output = cmd_output
+        self.stdout = stdout
+        self.stderr = stderr
+        self.searchObjs = searchObjs
+        self.negate = negate
+        self.backslash = backslash
+        self.comment = comment
+        self.timed_out = timed_out
+        self.results = results or {}
+        self.match = match
+        self.error_match = error_match
+        self.limits = limits
+        self.bench = bench
+        self.max_p95 = max_p95
+        self.phases = phases or {}
+        self.limit = cmd_output.limit
+        self.usage_text = cmd_output.usage()
+        self.bench_slow = bool(bench and max_p95 is not None and 'wall' in bench and bench['wall']['p95'] > max_p95)
+
+        # ---
+        # The first channel that did not pass in the order of the Fail lines
+        passes = (('limit', not self.limit), ('stdout', bool(searchObjs['stdout']) != negate),
+                  ('stderr', bool(searchObjs['stderr'])), ('return_code', bool(searchObjs['return_code'])),
+                  ('usage', bool(searchObjs['usage'])), ('p95', not self.bench_slow))
+        self.failed = next((channel for channel, passed in passes if not passed), None)
+        if timed_out:
+            self.verdict, self.failed = 'Timeout', 'timeout'
+        else:
+            self.verdict = 'Fail' if self.failed else 'Pass'
+
+    @property
+    def passed(self):
+        """ True if the check passed """
+        return self.verdict == 'Pass'
+
+    @property
+    def exit_status(self):
+        """ tcmd exit status of the check: 0 on Pass, 1 on Fail, TIMEOUT_RETURN on Timeout """
+        return {'Pass': 0, 'Fail': 1, 'Timeout': TIMEOUT_RETURN}[self.verdict]
+
+    @property
+    def cmd_return(self):
+        """ The return status of the cmd as a str like '0' """
+        return self.cmd_output[2]
+
+    def __bool__(self):
+        return self.passed
+
+    def __repr__(self):
+        return "<CheckResult %s cmd [%s]%s>" % (self.verdict, self.cmd, " failed [%s]" % self.failed if self.failed else "")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+    def close(self):
+        """
+        Unmap the --file the check searched and close its file descriptor (stdout and the stdout match
+        cannot be read after this, the verdict and record() still can)
+        """
+        if hasattr(self.stdout, 'close'):
+            self.stdout.close()
+
+    def record(self):
+        """
+        The result record of the check printed by --format jsonl or junit (see _format_record())
+        """
+        cmd_return = self.cmd_return
+        record = {
+            'verdict': self.verdict, 'failed': self.failed, 'cmd': self.cmd, 'comment': self.comment,
+            'patterns': dict(self.patterns), 'negate': self.negate,
+            'exit_code': int(cmd_return) if cmd_return.lstrip('-').isdigit() else None,
+            'wall_time': round(self.cmd_output.wall_time, 6),
+            'cpu_time': None if self.cmd_output.cpu_time is None else round(self.cmd_output.cpu_time, 6),
+            'bytes': self.cmd_output.nbytes,
+            'timeout': self.timed_out.timeout if self.timed_out else None,
+            'usage': self.usage_text or None,
+            'limit': self.limit,
+        }
+        if self.results:
+            record['matches'] = {channel: [{'regex': pattern, 'matched': matched} for pattern, matched in patterns]
+                                 for channel, patterns in self.results.items()}
+            record['match'] = {'stdout': self.match, 'stderr': self.error_match}
+        if self.bench:
+            record['bench'] = self.bench
+            record['max_p95'] = self.max_p95
+        if self.retry:
+            record['retry'] = self.retry
+        return record
+
+
+class CheckOptions(object):
+    """
+    The options of one check by their run_check() param names, built once from the tcmd command line, a
+    --suite spec line, or the keyword args of run_check() and handed to run_check() and _testcmd_check()
+
+    Ex: options = CheckOptions(timeout=10, also=('UTC',))
+        result = run_check("date", "2026", options)
+        result = run_check("date", "Tue", options.replace(negate=True))
+
+    The options that do not work together raise ValueError when the options are built (see validate()).
+
+    error:       regular expression to test the stderr of cmd
+    return_code: regular expression to test the return code of cmd
+    negate:      negate the stdout regex test like grep -v
+    stdin:       use stdin as the stdout of cmd (searched as it arrives like --stream)
+    comment:     comment of the check
+    backslash:   backslash all the regex metachars in regex
+    stream:      search the output of cmd as it arrives keeping only a window of it (--stream)
+    until_match: Pass as soon as stdout matches regex and kill cmd without testing its return code
+    timeout:     seconds to wait for cmd before killing it and reporting Timeout (--timeout)
+    repeat:      run cmd repeat times testing every run and report the wall and cpu time statistics
+    warmup:      runs of cmd before the repeat runs that are not measured or tested
+    max_p95:     Fail if the p95 wall time of the repeat runs is over max_p95 seconds
+    also:        more regular expressions to test the stdout of cmd in the same scan (not with stream)
+    also_error:  more regular expressions to test the stderr of cmd in the same scan (not with stream)
+    match:       'all', 'any', or 'none' of the stdout regexes have to match
+    error_match: 'all', 'any', or 'none' of the stderr regexes have to match
+    cmd_cache:   dict of the 'ttl', 'env' vars, and 'watch' files of the --cache output of cmd to reuse
+                 or None to always run cmd (see _cachedcmd())
+    shell:       True to always run cmd with /bin/sh, else only if it needs a shell (see _popencmd())
+    as_bytes:    search the stdout and stderr bytes of cmd with bytes regexes without decoding them
+    file:        search the memory mapped bytes of this file as the stdout of cmd (cmd is ':')
+                 close() the CheckResult to unmap it
+    usage:       regular expression to test the resource usage of cmd (see CmdOutput.usage()) or None
+    limits:      dict of the 'cpu' seconds, 'as' bytes, and 'output' bytes limits of cmd or None
+                 (Fail if cmd goes over its cpu or output limit, see _rlimits())
+    retry_until: run the check again until it passes or retry_until seconds passed (see _retrycheck())
+    retry_delay: seconds to wait before the first retry
+    retry_backoff: the wait is multiplied by retry_backoff after every retry
+    retry_jitter: every wait is randomized by +/- retry_jitter of it
+    verbose:     print actual vs expected details on Pass
+    timer:       print the elapsed time of the check
+    min:         print only the one line Pass or Fail
+    format:      print the Pass/Fail lines as 'text' or one result record per check as 'jsonl' or 'junit'
+    phases:      print the seconds of every phase of the check (--phases)
+    profile:     'cprofile' or 'tracemalloc' to profile the check and print the report to stderr or None
+    """
+    DEFAULTS = collections.OrderedDict([
+        # The check (see run_check())
+        ('error', '^$'), ('return_code', '0'), ('negate', False), ('stdin', False), ('comment', None),
+        ('backslash', False), ('stream', False), ('until_match', False), ('timeout', None), ('repeat', None),
+        ('warmup', 0), ('max_p95', None), ('also', ()), ('also_error', ()), ('match', 'all'),
+        ('error_match', 'all'), ('cmd_cache', None), ('shell', None), ('as_bytes', False), ('file', None),
+        ('usage', None), ('limits', None), ('retry_until', None), ('retry_delay', RETRY_DELAY),
+        ('retry_backoff', RETRY_BACKOFF), ('retry_jitter', RETRY_JITTER),
+        # The Pass/Fail line of the check (see _testcmd_check())
+        ('verbose', False), ('timer', False), ('min', False), ('format', 'text'), ('phases', False),
+        ('profile', None),
+    ])
+
+    def __init__(self, **options):
+        """
+        :param options: the options that are not their DEFAULTS
+        :raises TypeError:  if an option is not one of the DEFAULTS
+        :raises ValueError: if options do not work together
+        """
+        unknown = set(options) - set(self.DEFAULTS)
+        if unknown:
+            raise TypeError("unknown check options [%s]" % ', '.join(sorted(unknown)))
+        for name, default in self.DEFAULTS.items():
+            setattr(self, name, options.get(name, default))
+        self.validate()
+
+    @classmethod
+    def from_params(cls, params, **changes):
+        """
+        The options of the testcmd() params of a tcmd command line or a spec line (see parse_spec())
+
+        :param params:  dict of the option values by their testcmd() param names
+        :param changes: options that replace the ones of params (like the cmd_cache of --cache)
+        :return:        CheckOptions
+        """
+        options = dict((name, params[name]) for name in cls.DEFAULTS if name in params)
+        options['limits'] = _cmdlimits(params['max_cpu'], params['max_as'], params['max_output'])
+        options.update(changes)
+        return cls(**options)
+
+    def replace(self, **changes):
+        """ A copy of these options with changes """
+        return CheckOptions(**dict(self.items(), **changes))
+
+    def items(self):
+        """ The (name, value) of every option """
+        return [(name, getattr(self, name)) for name in self.DEFAULTS]
+
+    def validate(self):
+        """
+        :raises ValueError: if the options do not work together
+        """
+        if (self.stream or self.until_match) and (self.also or self.also_error):
+            raise ValueError("--also and --also_error do not work with --stream or --until_match")
+        if self.stdin and self.retry_until is not None:
+            raise ValueError("--retry_until does not work with --stdin")
+
+    def __repr__(self):
+        return "<CheckOptions %s>" % ' '.join("%s=%r" % (name, value) for name, value in self.items()
+                                              if value != self.DEFAULTS[name])
+
+
+def run_check(cmd, regex, options=None, cmd_output=None, **kwargs):
+    """
+    Run one check: execute cmd and test its stdout, stderr, and return code against the regexes without
+    printing its Pass/Fail line or exiting (the in-process API of tcmd, see _testcmd_check() for the printing)
+
+    Ex: import tcmd
+        result = tcmd.run_check("ping -c 3 localhost", "3 packets received", timeout=10)
+        assert result, result.failed
+
+    :param cmd:         shell command to run (or ':' with stdin=True)
+    :param regex:       regular expression to test the stdout of cmd
+    :param options:     CheckOptions of the check or None for the kwargs
+    :param cmd_output:  (cmd_stdout, cmd_stderr, cmd_return) of cmd already run by _runcmd() (--jobs)
+    :param kwargs:      options that replace the ones of options (see CheckOptions)
+    :return:            CheckResult of the check
+    :raises ValueError: if the options do not work together (see CheckOptions.validate())
+    """
+    # ---
+    # Run the check again until it passes (the cmd output is never reused from the --cache)
+    options = options.replace(**kwargs) if options is not None else CheckOptions(**kwargs)
+    if options.retry_until is not None:
+        def attempt():
+            return run_check(cmd, regex, options.replace(retry_until=None, cmd_cache=None))
+        return _retrycheck(attempt, options.retry_until, delay=options.retry_delay, backoff=options.retry_backoff,
+                           jitter=options.retry_jitter)
+
+    # ---
+    # Escape the regex metachars so people do not have backslash them on command line
+    stdout_regex = regex
+    if options.backslash:
+        # src: https://stackoverflow.com/questions/4202538/escape-regex-special-characters-in-a-python-string
+        # regex = re.escape(regex)  ## This works better but regex is ugly in -v output
+        # Fails: regex = re.sub(r'([\.\\\+\*\?\[\^\]\$\(\)\{\}\!\<\>\|\:\-])', r'\1', regex)
+        regex = escape_regex(regex)
+
+    # ---
+    # Set defaults for options -e and -r
+    stderr_regex      = str(options.error)
+    return_code_regex = str(options.return_code)
+
+    # ---
+    # Print some debugging info on the cmd line options
+    if DBG: pindent("DBG:       regex: [%s]" % regex)
+    if DBG: pindent("DBG:         cmd: [%s]" % cmd)
+    if DBG: pindent("---")
+
+    # ---
+    # Run the command
+    start_time = monotonic()
+    timed_out = None
+    bench = None
+    stdout_search = stderr_search = None
+    try:
+        if options.stdin:
+            # Overwrite stdout with stdin pipe (the ':' cmd substitute is not run)
+            stdin_start_time = monotonic()
+            if cmd.strip() in ('', ':'):
+                cmd_stderr, cmd_return = (b'' if options.as_bytes else ''), '0'
+            else:
+                cmd_stdout, cmd_stderr, cmd_return = _runcmd(cmd, shell=options.shell, decode=not options.as_bytes)
+            if options.also or options.also_error or options.match != 'all' or options.error_match != 'all':
+                # The --also regexes need all of stdin
+                data = sys.stdin.buffer.read()
+                cmd_stdout = data if options.as_bytes else data.decode('utf-8', errors='replace')
+                stdin_time = monotonic() - stdin_start_time
+                cmd_output = CmdOutput(cmd_stdout, cmd_stderr, cmd_return, stdin_time, nbytes=len(data),
+                                       phases={'capture': stdin_time})
+            else:
+                # Search stdin as it arrives keeping only a window of it in memory
+                stdout_search = StreamSearch(stdout_regex, backslash=options.backslash, as_bytes=options.as_bytes)
+                stderr_search = StreamSearch(stderr_regex, as_bytes=options.as_bytes)
+                stderr_search.feed(cmd_stderr)
+                cmd_output = _streamstdin(stdout_search, cmd_stderr, cmd_return, until_match=options.until_match,
+                                          decode=not options.as_bytes)
+                cmd_stdout = cmd_output[0]
+            cmd_stdout = cmd_stdout.rstrip(b'\n' if options.as_bytes else '\n')
+            cmd = "<stdin> " + cmd
+            if DBG: pindent("DBG: stdin->cmd_stdout: [%s]" % _preview(cmd_stdout))
+        elif options.file:
+            # Search the memory mapped file as the stdout of cmd
+            cmd_output = _mapfile(options.file)
+            cmd_stdout, cmd_stderr, cmd_return = cmd_output
+            cmd = "<file %s> " % options.file + cmd
+            if DBG: pindent("DBG: file->cmd_stdout: [%s] (%s bytes mapped)" % (options.file, cmd_output.nbytes))
+        elif options.stream or options.until_match:
+            # Search stdout and stderr as they arrive without reading all the output into memory
+            stdout_search = StreamSearch(stdout_regex, backslash=options.backslash, as_bytes=options.as_bytes)
+            stderr_search = StreamSearch(stderr_regex, as_bytes=options.as_bytes)
+            cmd_output = _streamcmd(cmd, stdout_search, stderr_search, until_match=options.until_match,
+                                    shell=options.shell, timeout=options.timeout, decode=not options.as_bytes,
+                                    limits=options.limits)
+            cmd_stdout, cmd_stderr, cmd_return = cmd_output
+        elif options.repeat:
+            # Run the cmd repeat times stopping at the first run that does not pass
+            def passed(cmd_output):
+                searchObjs = _search_output(cmd_output, regex, stderr_regex, return_code_regex,
+                                            stdout_regex=stdout_regex, backslash=options.backslash,
+                                            also=options.also, also_error=options.also_error, match=options.match,
+                                            error_match=options.error_match)
+                return (bool(searchObjs[0]) != options.negate and all(searchObjs[1:]) and not cmd_output.limit
+                        and (options.usage is None or compile_regex(options.usage).search(cmd_output.usage())))
+            cmd_output, bench = _runbench(cmd, options.repeat, warmup=options.warmup, passed=passed,
+                                          shell=options.shell, timeout=options.timeout,
+                                          decode=not options.as_bytes, limits=options.limits)
+            cmd_stdout, cmd_stderr, cmd_return = cmd_output
+        elif cmd_output is not None:
+            # The cmd was already run in a --jobs worker thread
+            if isinstance(cmd_output, CmdTimeout):
+                raise cmd_output
+            cmd_stdout, cmd_stderr, cmd_return = cmd_output
+            _dbg_cmd_output(cmd_stdout, cmd_stderr, cmd_return)
+        else:
+            cmd_output = _cachedcmd(cmd, cmd_cache=options.cmd_cache, shell=options.shell, timeout=options.timeout,
+                                    decode=not options.as_bytes, limits=options.limits)
+            cmd_stdout, cmd_stderr, cmd_return = cmd_output
+            # New python 3 problem conversions
+            # cmd_stdout = cmd_stdout.decode('utf-8')
+            # cmd_stderr = cmd_stderr.decode('utf-8')
+    except CmdTimeout as err:
+        # Test the output captured before the cmd was killed but report Timeout
+        timed_out = err
+        cmd_output = err.cmd_output
+        cmd_stdout, cmd_stderr, cmd_return = cmd_output
+
+    # ---
+    # Hand the output to the post_capture hooks (see add_hook())
+    for hook in HOOKS['post_capture']:
+        hook(cmd, cmd_output)
+
+    search_start_time = monotonic()
+    results = {} # (regex, matched) of every --also and --also_error regex
+    if stdout_search is not None:
+        # The StreamSearch's already searched stdout and stderr
+        stdout_searchObj = stdout_search.result()
+        stderr_searchObj = stderr_search.result()
+        return_code_searchObj = compile_regex(return_code_regex).search(cmd_return)
+    else:
+        stdout_searchObj, stderr_searchObj, return_code_searchObj = _search_output(
+            (cmd_stdout, cmd_stderr, cmd_return), regex, stderr_regex, return_code_regex,
+            stdout_regex=stdout_regex, backslash=options.backslash, also=options.also, also_error=options.also_error,
+            match=options.match, error_match=options.error_match, results=results)
+
+    # ---
+    # Test the resource usage of the cmd like its return code (--usage)
+    usage_text = cmd_output.usage()
+    usage_searchObj = True if options.usage is None else compile_regex(options.usage).search(usage_text)
+    if DBG: pindent("DBG: usage: [%s] limit: [%s]" % (usage_text, cmd_output.limit))
+    search_time = monotonic() - search_start_time
+
+    # ---
+    # The cmd was killed by --until_match as soon as stdout matched so it has no return code to test
+    if options.until_match and not options.stdin and stdout_search.matched():
+        return_code_searchObj = True
+
+    # ---
+    # Print the types of the search (boolean or regex.search)
+    if DBG: pindent("DBG: type(stdout_searchObj):      %s" % type(stdout_searchObj))
+    if DBG: pindent("DBG: type(stderr_searchObj):      %s" % type(stderr_searchObj))
+    if DBG: pindent("DBG: type(return_code_searchObj): %s" % type(return_code_searchObj))
+
+    # ---
+    # Print out stdout regex test search result
+    if DBG and not isinstance(stdout_searchObj, bool) and stdout_searchObj:
+        pindent("DBG:      stdout_searchObj : [%s]" % _preview(stdout_searchObj.group()))
+    elif DBG and isinstance(stdout_searchObj, bool):
+        pindent("DBG:      stdout_searchObj : [%s] (boolean)" % stdout_searchObj)
+
+    # ---
+    # Print out stderr regex test search result
+    if DBG and not isinstance(stderr_searchObj, bool) and stderr_searchObj:
+        pindent("DBG:      stderr_searchObj : [%s]" % _preview(stderr_searchObj.group()))
+    elif DBG and isinstance(stderr_searchObj, bool):
+        pindent("DBG:      stderr_searchObj : [%s] (boolean)" % stderr_searchObj)
+
+    # if DBG and stderr_searchObj:      pindent("DBG:      stderr_searchObj : [%s]" % _preview(stderr_searchObj.group()))
+
+    # ---
+    # Print out return_code result
+    if DBG and not isinstance(return_code_searchObj, bool) and return_code_searchObj:
+        pindent("DBG: return_code_searchObj : [%s]" % return_code_searchObj.group())
+    elif DBG and isinstance(return_code_searchObj, bool):
+        pindent("DBG: return_code_searchObj : [%s] (boolean)" % return_code_searchObj)
+    if DBG: pindent("DBG: regex cache: hits [%(hits)s] misses [%(misses)s] loaded [%(loaded)s]" % regex_cache_stats)
+    if DBG and cmd_cache_file:
+        pindent("DBG: cmd cache: hits [%(hits)s] misses [%(misses)s] expired [%(expired)s] evicted [%(evicted)s] "
+                "loaded [%(loaded)s]" % cmd_cache_stats)
+    if DBG: pindent("---")
+
+    # ---
+    # The opposite boolean of the stdout_searchObj is the verdict of the --negate option
+    if DBG and options.negate: pindent("DBG: stdout_searchObj: %s" % (not stdout_searchObj))
+
+    # ---
+    # The verdict of the check (see CheckResult)
+    patterns = {'stdout': stdout_regex, 'stderr': stderr_regex, 'return_code': return_code_regex}
+    if options.usage is not None:
+        patterns['usage'] = options.usage
+    searchObjs = {'stdout': stdout_searchObj, 'stderr': stderr_searchObj, 'return_code': return_code_searchObj,
+                  'usage': usage_searchObj}
+    phases = dict(cmd_output.phases or {}, search=search_time, check=monotonic() - start_time)
+    result = CheckResult(cmd, patterns, cmd_output, cmd_stdout, cmd_stderr, searchObjs, negate=options.negate,
+                         backslash=options.backslash, comment=options.comment, timed_out=timed_out, results=results,
+                         match=options.match, error_match=options.error_match, limits=options.limits, bench=bench,
+                         max_p95=options.max_p95, phases=phases)
+
+    # ---
+    # Hand the result to the post_match hooks (see add_hook())
+    for hook in HOOKS['post_match']:
+        hook(result)
+    return result
+
+
+def _retrycheck(attempt, retry_until, delay=RETRY_DELAY, backoff=RETRY_BACKOFF, jitter=RETRY_JITTER):
+    """
+    Run the attempts of a check until one passes or retry_until seconds passed waiting between the attempts
+    with exponential backoff and jitter (--retry_until)
+
+    The attempts run in this process so the regexes are compiled once.  The wait starts at delay seconds
+    and is multiplied by backoff after every attempt up to RETRY_MAX_DELAY.  The last attempt starts when
+    retry_until is over and every attempt runs until it finishes or its timeout.
+
+    :param attempt:     function() running the check once and returning its CheckResult
+    :param retry_until: seconds the attempts have to pass in
+    :param delay:       seconds to wait before the second attempt
+    :param backoff:     factor the wait is multiplied by after every attempt
+    :param jitter:      fraction of the wait it is randomized by (+/-) so checks do not retry in lockstep
+    :return:            CheckResult of the last attempt with its retry dict of the attempts, wait, and elapsed
+    """
+    import random
+
+    start_time = monotonic()
+    deadline = start_time + retry_until
+    attempts = 0
+    wait = 0.0
+    while True:
+        attempts += 1
+        result = attempt()
+        remaining = deadline - monotonic()
+        if result.passed or remaining <= 0:
+            break
+        result.close()
+        pause = min(delay * (1 + jitter * random.uniform(-1, 1)), remaining)
+        if DBG: pindent("DBG: retry: attempt [%s] failed [%s], waiting [%.3f] seconds" % (attempts, result.failed, pause))
+        sleep(pause)
+        wait += pause
+        delay = min(delay * backoff, RETRY_MAX_DELAY)
+
+    result.retry = {'attempts': attempts, 'wait': round(wait, 6), 'elapsed': round(monotonic() - start_time, 6),
+                    'until': retry_until}
+    return result
+
+
+def _testcmd_check(cmd, regex, options=None, cmd_str=None, cmd_output=None, **kwargs):
+    """
+    Run one check with run_check() and print the Pass, Fail, or Timeout line
+
+    :param options:     CheckOptions of the check (with its verbose, timer, min, format, phases, and profile
+                        options of the Pass/Fail line) or None for the kwargs
+    :param cmd_str:     the tcmd command line reported in verbose output
+    :param kwargs:      options that replace the ones of options (see CheckOptions)
+    :return:            tcmd exit status of the check: 0 on Pass, 1 on Fail, TIMEOUT_RETURN on Timeout
+
+    The other params are the ones of run_check()
+    """
+    options = options.replace(**kwargs) if options is not None else CheckOptions(**kwargs)
+    if options.timer:
+        from datetime import datetime
+        start_time = datetime.now()
+        if DBG: pindent("Start_time: %s" % start_time)
+
+    profiler = _startprofile(options.profile) if options.profile else None
+    result = run_check(cmd, regex, options, cmd_output=cmd_output)
+
+    elapsed_time = None
+    if options.timer and not options.min:
+        elapsed_time = datetime.now() - start_time
+    with result:
+        check_return = _print_check(result, verbose=options.verbose, min=options.min, cmd_str=cmd_str,
+                                    format=options.format, elapsed_time=elapsed_time, phases=options.phases)
+    if options.profile:
+        _stopprofile(options.profile, profiler)
+    return check_return
+
+
+# ---
+# Lines of the --profile report: the functions with the most cumulative time or the lines that allocated the most
+PROFILE_LINES = 20
+
+
+def _startprofile(profile):
+    """
+    Start profiling a check in this process (--profile)
+
+    :param profile: 'cprofile' for the time of every function or 'tracemalloc' for the memory allocated by every line
+    :return:        The enabled cProfile.Profile or None for tracemalloc
+    """
+    if profile == 'cprofile':
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    import tracemalloc
+
+    tracemalloc.start()
+    return None
+
+
+def _stopprofile(profile, profiler=None):
+    """
+    Stop profiling a check and print the report to stderr so it does not mix with the Pass/Fail lines or records
+
+    :param profile:  'cprofile' or 'tracemalloc'
+    :param profiler: The cProfile.Profile returned by _startprofile()
+    """
+    if profile == 'cprofile':
+        profiler.disable()
+        import pstats
+
+        print("Profile: cprofile top %s functions by cumulative time" % PROFILE_LINES, file=sys.stderr)
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(PROFILE_LINES)
+        return
+    import tracemalloc
+
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("Profile: tracemalloc peak [%d] KB still allocated [%d] KB, top %s lines:" % (peak // 1024, current // 1024,
+          PROFILE_LINES), file=sys.stderr)
+    for stat in snapshot.statistics('lineno')[:PROFILE_LINES]:
+        print("      %s" % stat, file=sys.stderr)
+
+
+def _print_check(result, verbose=False, min=False, cmd_str=None, format='text', elapsed_time=None, phases=False):
+    """
+    Print the Pass, Fail, or Timeout line of the CheckResult of one check (or its --format record)
+
+    :param result:       CheckResult of the check
+    :param verbose:      print actual vs expected details on Pass
+    :param min:          print only the one line Pass or Fail
+    :param cmd_str:      the tcmd command line reported in verbose output
+    :param format:       print the Pass/Fail lines as 'text' or one result record per check as 'jsonl' or 'junit'
+    :param elapsed_time: elapsed time of the check to print (--timer) or None
+    :param phases:       print the seconds of every phase of the check (--phases)
+    :return:             tcmd exit status of the check: 0 on Pass, 1 on Fail, TIMEOUT_RETURN on Timeout
+    """
+    report_start_time = monotonic()
+    cmd = result.cmd
+    cmd_return = result.cmd_return
+    limits = result.limits
+    usage = result.patterns.get('usage')
+    usage_text = result.usage_text
+    results = result.results
+    bench = result.bench
+    regex = escape_regex(result.patterns['stdout']) if result.backslash else result.patterns['stdout']
+    stderr_regex = result.patterns['stderr']
+    return_code_regex = result.patterns['return_code']
+
+    # ---
+    # Keep only the parts of the output the reports print: the first and last chars and the chars around the match
+    # (and decode only these parts of a --bytes output, the first chars of a --stream output go in front)
+    heads = result.cmd_output.heads or (None, None)
+    cmd_stdout = _preview(result.stdout, result.searchObjs['stdout'], head=heads[0])
+    cmd_stderr = _preview(result.stderr, result.searchObjs['stderr'], head=heads[1])
+
+    # ---
+    # Show all the stdout and stderr regexes with how they have to match in the Pass/Fail lines
+    if 'stdout' in results:
+        regex = "<%s> %s" % (result.match, " | ".join(pattern for pattern, matched in results['stdout']))
+    if 'stderr' in results:
+        stderr_regex = "<%s> %s" % (result.error_match, " | ".join(pattern for pattern, matched in results['stderr']))
+    if result.negate:
+        regex = "<negate> "+regex
+
+    # ---
+    # Indent multiline stdout lines so Pass and Fail are easily visible
+    # multiline_stdout = re.search( "\n.*\n", cmd_stdout, re.M|re.I)
+    # if multiline_stdout:
+    #     cmd_stdout = re.sub( '^',' '*6, cmd_stdout , flags=re.MULTILINE )
+    #     cmd_stdout = cmd_stdout.lstrip()
+
+    if result.comment:
+        add_comment = " # "+result.comment
+    else:
+        add_comment = ""
+
+    def print_verbose():
+        """ Prints out detailed info on actual vs expected for stdout, stderr, and return value"""
+        pindent("")
+        pindent("          cmd: [%s]" % cmd_str)
+        pindent("")
+        pindent("actual_return: [%s] expect_return: [%s]"  % (cmd_return, return_code_regex))
+        if usage_text or usage is not None:
+            pindent(" actual_usage: [%s] expect_usage: [%s]" % (usage_text, "" if usage is None else usage))
+        if limits:
+            pindent("       limits: [max_cpu=%s max_as=%s max_output=%s]" % (limits['cpu'],
+                    None if limits['as'] is None else limits['as'] // (1024 * 1024), limits['output']))
+        pindent("actual_stderr: [%s]  expect_stderr: [%s]" % (cmd_stderr, stderr_regex))
+        # print ("dbg: cmd_stderr: ", type(cmd_stderr))
+        if cmd_stderr.count('\n') == 1 or cmd_stderr.count('\n') == 0:
+            pindent("actual_stderr: [%s]  expect_stderr: [%s]" % (cmd_stderr, stderr_regex))
+        else:
+            pindent("")
+            pindent("expect_stderr: [%s]" % stderr_regex)
+            pindent("actual_stderr: ")
+            print (indent("["+cmd_stderr+"]", nspaces=10))
+        for pattern, matched in results.get('stderr', []):
+            pindent("     %8s stderr regex [%s]" % ("matched" if matched else "no match", pattern))
+        pindent("")
+        pindent("expect_stdout: [%s]" % regex)
+        for pattern, matched in results.get('stdout', []):
+            pindent("     %8s stdout regex [%s]" % ("matched" if matched else "no match", pattern))
+        if cmd_stdout.count('\n') == 1 or cmd_stdout.count('\n') == 0:
+            pindent("actual_stdout: [%s]" % cmd_stdout)
+        else:
+            pindent("actual_stdout: ")
+            print (indent("["+cmd_stdout+"]", nspaces=10))
+
+    def print_bench():
+        """ Prints out the wall and cpu time statistics of the --repeat runs """
+        pindent("---")
+        pindent("Repeat: %s runs (%s warmup)" % (bench['runs'], bench['warmup']))
+        pindent("%-6s %12s %12s %12s %12s %12s %12s" % ('secs', 'min', 'median', 'p90', 'p95', 'p99', 'max'))
+        for name in ('wall', 'user', 'sys'):
+            if name in bench:
+                stats = bench[name]
+                pindent("%-6s %12.6f %12.6f %12.6f %12.6f %12.6f %12.6f" % (name, stats['min'], stats['median'],
+                        stats['p90'], stats['p95'], stats['p99'], stats['max']))
+
+    def print_phases():
+        """ Prints out the seconds of every phase of the check with the report up to here """
+        result.phases['report'] = monotonic() - report_start_time
+        pindent("---")
+        pindent("Phases: " + ", ".join("%s %.6f" % (name, seconds) for name, seconds in result.phases.items()))
+
+    def print_retry():
+        """ Prints out the attempts, the wait between them, and the time to pass of --retry_until """
+        pindent("---")
+        pindent("Retry: %s attempts, waited %.3f seconds, %s after %.3f seconds" % (result.retry['attempts'],
+                result.retry['wait'], "passed" if result.passed else "gave up", result.retry['elapsed']))
+
+    # ---
+    # Print one result record of the check instead of the Pass/Fail lines (--format jsonl or junit)
+    if format != 'text':
+        record = result.record()
+        if phases:
+            result.phases['report'] = monotonic() - report_start_time
+            record['phases'] = {name: round(seconds, 6) for name, seconds in result.phases.items()}
+        print(_format_record(format, record, cmd_stdout, cmd_stderr), flush=True)
+        return result.exit_status
+
+    # ---
+    # Test times out if the cmd was killed by --timeout no matter what the regexes matched
+    elif result.timed_out:
+        print("Timeout: cmd [%s] did *NOT* finish in %g seconds" % (cmd, result.timed_out.timeout)+add_comment)
+
+        if not min:
+            print_verbose()
+            if result.retry:
+                print_retry()
+            if phases:
+                print_phases()
+            if elapsed_time is not None:
+                pindent("---")
+                pindent("Elapsed Time: %s" % elapsed_time)
+        return TIMEOUT_RETURN
+
+    # ---
+    # Test passes if all 3 regex (and --usage) matched
+    elif result.passed:
+
+        print("Pass: cmd [%s]; regex [%s]" % (cmd, regex)+add_comment)
+
+        if not min:
+            if verbose:
+                print_verbose()
+            if bench:
+                print_bench()
+            if result.retry:
+                print_retry()
+            if phases:
+                print_phases()
+            if elapsed_time is not None:
+                pindent("---")
+                pindent("Elapsed Time: %s" % elapsed_time)
+        return 0
+
+    else:
+        # ---
+        # Test Fails
+        # Set verbose=True so that details of failure are printed for debugging
+        verbose=True
+
+        # ---
+        # Print out the limit the cmd was stopped for or the first searchObj that failed starting with stdout vs regex
+        if result.failed == 'limit':
+            print("Fail: cmd [%s] went over --max_%s [%s]" % (cmd, result.limit, limits[result.limit])+add_comment)
+        elif result.failed == 'stdout':
+            print("Fail: cmd [%s] stdout does *NOT* match regEx [%s]" % (cmd, regex)+add_comment)
+        elif result.failed == 'stderr':
+            print("Fail: cmd [%s] stderr does *NOT* match regEx [%s]" % (cmd, stderr_regex)+add_comment)
+        elif result.failed == 'return_code':
+            print("Fail: cmd [%s] return code does *NOT* match regEx [%s]" % (cmd, return_code_regex)+add_comment)
+        elif result.failed == 'usage':
+            print("Fail: cmd [%s] usage [%s] does *NOT* match regEx [%s]" % (cmd, usage_text, usage)+add_comment)
+        elif result.failed == 'p95':
+            print("Fail: cmd [%s] p95 wall time [%.6f] is over --max_p95 [%g] seconds"
+                  % (cmd, bench['wall']['p95'], result.max_p95)+add_comment)
+        else:
+            print("Fail: cmd [%s] did *NOT* match for some reason" % (cmd)+add_comment)
+
+        if not min:
+            if verbose:
+                print_verbose()
+            if bench:
+                print_bench()
+            if result.retry:
+                print_retry()
+            if phases:
+                print_phases()
+            if elapsed_time is not None:
+                pindent("---")
+                pindent("Elapsed Time: %s" % elapsed_time)
+        return 1
+
+
+def parse_spec(line):
+    """
+    Parse one check spec line of a --suite file: the same options and cmd regEx arguments as a tcmd command line
+
+    Ex: spec = parse_spec('-c "date test" date 2026')
+
+    :param line: The check spec line
+    :return:     dict of the option and argument values of the line by their testcmd() param names
+                 (see CheckOptions.from_params() for the options of its check)
+    :raises ValueError: if the line is not a check spec (with the reason as its message)
+    """
+    import click
+    import shlex
+
+    try:
+        spec = _spec_command().make_context('tcmd', shlex.split(line), help_option_names=[]).params
+    except click.ClickException as err:
+        raise ValueError(str(err))
+    except (click.exceptions.Exit, click.exceptions.Abort):
+        raise ValueError("stopped parsing the line")
+    if spec['cmd'] is None or spec['regex'] is None or spec['suite']:
+        raise ValueError("needs a cmd and regEx")
+    CheckOptions.from_params(spec) # raises ValueError if its options do not work together
+    return spec
+
+
+@functools.lru_cache(maxsize=None)
+def _spec_command():
+    """
+    Build the click command that parses a check spec line: testcmd_command() without its -h/--help option
+
+    A -h or --help in a spec line would print the usage and exit the whole --suite (skipping the rest of
+    its checks), so it is an unknown option of a spec line instead
+
+    :return: The click command of a spec line
+    """
+    import copy
+
+    spec_command = copy.copy(testcmd_command())
+    spec_command.params = [param for param in spec_command.params if param.name != 'help']
+    return spec_command
+
+
+def run_spec(line):
+    """
+    Run the check of one spec line (see parse_spec()) in this process and return its CheckResult
+
+    Ex: import tcmd
+        result = tcmd.run_spec('--timeout 10 -c "health" "curl -s localhost:8080/health" ok')
+
+    The suite options of the line (like --suite, --jobs, --cache, --incremental) are ignored.
+
+    :param line: The check spec line
+    :return:     CheckResult of the check
+    :raises ValueError: if the line is not a check spec
+    """
+    spec = parse_spec(line)
+    return run_check(spec['cmd'], spec['regex'], CheckOptions.from_params(spec))
+
+
+def _runsuite(suite_file, options, jobs=1, incremental=False, force=False, inputs=(), shard=None):
+    """
+    Run every check spec in suite_file inside this one tcmd process and print its Pass, Fail, or Timeout line
+
+    Each spec line holds the same options and cmd regEx arguments as a tcmd command line.
+    Blank lines and lines starting with '#' are skipped.
+
+    With jobs > 1 the cmds of the checks run concurrently in a pool of jobs threads but the
+    Pass/Fail lines are still printed in spec order.  Checks with --serial, --stdin, --stream,
+    --until_match, --repeat, --file or --retry_until run alone.
+
+    A --timeout in a spec line is the timeout of that check and the timeout of the suite is the
+    deadline of all the checks: once it passed every check left reports Timeout.
+
+    With incremental a check that passed in an earlier run with the same fingerprint (see
+    _check_fingerprint()) is not run again and its Pass line is printed with <cached>.  Checks with
+    --stdin always run.
+
+    With shard only the checks of that shard run, balanced by the seconds in suite_timings (see
+    _shardlines()).  The seconds every check took are kept in suite_timings_ran for the next runs.
+
+    Ex: tcmd --suite tests/checks.txt
+        tcmd --suite tests/checks.txt --jobs 8 --timeout 600
+        tcmd --suite tests/checks.txt --shard 2/4 --timings .tcmd.timings
+
+    :param suite_file: file of check spec lines or '-' to read them from stdin
+    :param options:    CheckOptions of the suite command line: its verbose, min, timer, phases, and profile
+                       are turned on for every check, its format prints every check, its timeout is the
+                       seconds all the checks of the suite have to finish in, its cmd_cache is the --cache
+                       of every check, its shell and as_bytes apply to every check, and a spec line
+                       --max_cpu, --max_as, or --max_output replaces that one of its limits
+    :param jobs:       max number of check cmds running at the same time
+    :param incremental: skip the checks that passed in an earlier run saved in suite_state (--incremental)
+    :param force:      run every check even with incremental and save its verdict (--force)
+    :param inputs:     files every check depends on, a check runs again if one of them changed (--input)
+    :param shard:      tuple of i and N to run only the checks of the i-th of N shards or None (--shard)
+    :return:           0 if every check passed, else the max tcmd exit status of the checks (1 or TIMEOUT_RETURN)
+    """
+    import click
+    import json
+
+    dbg = DBG
+    suite_return = 0
+    deadline = None if options.timeout is None else monotonic() + options.timeout
+    if jobs > 1:
+        import concurrent.futures
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=jobs)
+    else:
+        pool = None
+    pending = [] # (spec, cmd_str, future) of the running checks in spec order
+    suite_options = (options.shell, options.as_bytes, tuple(sorted(options.limits.items())) if options.limits else None,
+                     tuple(_file_stamp(input_file) for input_file in inputs))
+
+    def check_timeout(spec):
+        """ Seconds the cmd of spec can run: its --timeout cut short by the suite deadline """
+        if deadline is None:
+            return spec['timeout']
+        remaining = max(deadline - monotonic(), 0)
+        if spec['timeout'] is not None and spec['timeout'] < remaining:
+            return spec['timeout']
+        return remaining
+
+    def check_retry_until(spec):
+        """ Seconds the --retry_until attempts of spec can take: cut short by the suite deadline like check_timeout """
+        if deadline is None or spec['retry_until'] is None:
+            return spec['retry_until']
+        return min(spec['retry_until'], max(deadline - monotonic(), 0))
+
+    def check_cache(spec):
+        """ The --cache of spec: its --cache_ttl, --cache_env, --cache_watch added to the ones of the suite """
+        cmd_cache = options.cmd_cache
+        if cmd_cache is None or spec['no_cache']:
+            return None
+        return {'ttl': cmd_cache['ttl'] if spec['cache_ttl'] is None else spec['cache_ttl'],
+                'env': cmd_cache['env'] + spec['cache_env'], 'watch': cmd_cache['watch'] + spec['cache_watch']}
+
+    def check_limits(spec):
+        """ The limits of spec: its --max_cpu, --max_as, --max_output or else the ones of the suite """
+        spec_limits = _cmdlimits(spec['max_cpu'], spec['max_as'], spec['max_output'])
+        limits = options.limits
+        if not limits:
+            return spec_limits
+        if not spec_limits:
+            return limits
+        return {name: limits[name] if value is None else value for name, value in spec_limits.items()}
+
+    def run(spec):
+        """ Run the cmd of spec in a --jobs worker thread, return its output or CmdTimeout """
+        start = monotonic()
+        try:
+            return _cachedcmd(spec['cmd'], cmd_cache=check_cache(spec), shell=options.shell or spec['shell'],
+                              dbg=False, timeout=check_timeout(spec), decode=not (options.as_bytes or spec['as_bytes']),
+                              limits=check_limits(spec))
+        except (CmdTimeout, OSError, ValueError) as err:
+            return err
+        finally:
+            spec['run_time'] = monotonic() - start
+
+    def report(spec, cmd_str, cmd_output=None):
+        """ Test and print the Pass, Fail, or Timeout line of one spec, return its tcmd exit status """
+        global DBG
+        if spec.get('cached'):
+            return report_cached(spec)
+        DBG = 1 if dbg or spec['dbg'] else 0
+        start = monotonic()
+        try:
+            if isinstance(cmd_output, Exception) and not isinstance(cmd_output, CmdTimeout):
+                raise cmd_output
+            check_options = CheckOptions.from_params(
+                spec, verbose=options.verbose or spec['verbose'], timer=options.timer or spec['timer'],
+                min=options.min or spec['min'], format=options.format, timeout=check_timeout(spec),
+                cmd_cache=check_cache(spec), shell=options.shell or spec['shell'],
+                as_bytes=options.as_bytes or spec['as_bytes'], limits=check_limits(spec),
+                retry_until=check_retry_until(spec), phases=options.phases or spec['phases'],
+                profile=options.profile or spec['profile'])
+            check_return = _testcmd_check(spec['cmd'], spec['regex'], check_options, cmd_str=cmd_str,
+                                          cmd_output=cmd_output)
+        except (re.error, OSError, ValueError) as err:
+            # A bad regex or cmd of one spec line Fails that line and the suite goes on
+            return report_error(spec['line_num'], spec['line'], str(err))
+        finally:
+            DBG = dbg
+        suite_timings_ran[spec['line']] = (spec.get('run_time', 0.0) + monotonic() - start, timetime())
+
+        # ---
+        # Save the fingerprint and spec of a check that passed, forget them if the check does not pass anymore
+        fingerprint = spec.get('fingerprint')
+        if fingerprint:
+            suite_state_stats['ran'] += 1
+            if check_return == 0:
+                suite_state[fingerprint] = timetime()
+                suite_state.move_to_end(fingerprint)
+                suite_specs[spec['line']] = {name: value for name, value in spec.items()
+                                            if name not in ('fingerprint', 'run_time', 'line_num')}
+                suite_specs.move_to_end(spec['line'])
+                suite_state_stats['changed'] += 1
+                while len(suite_state) > SUITE_STATE_SIZE:
+                    suite_state.popitem(last=False)
+                while len(suite_specs) > SUITE_STATE_SIZE:
+                    suite_specs.popitem(last=False)
+            elif suite_state.pop(fingerprint, None) is not None:
+                suite_specs.pop(spec['line'], None)
+                suite_state_stats['changed'] += 1
+        return check_return
+
+    def report_cached(spec):
+        """ Print the Pass line of a spec that passed with the same fingerprint in an earlier run """
+        suite_state_stats['skipped'] += 1
+        regex = ("<negate> " if spec['negate'] else "") + spec['regex']
+        if options.format == 'text':
+            print("Pass: cmd [%s]; regex [%s] <cached>" % (spec['cmd'], regex)
+                  + (" # " + spec['comment'] if spec['comment'] else ""))
+        else:
+            record = {'verdict': 'Pass', 'failed': None, 'cmd': spec['cmd'], 'comment': spec['comment'],
+                      'patterns': {'stdout': spec['regex'], 'stderr': spec['error'], 'return_code': spec['return_code']},
+                      'negate': spec['negate'], 'exit_code': None, 'wall_time': 0.0, 'cpu_time': None,
+                      'bytes': 0, 'timeout': None, 'cached': True}
+            print(_format_record(options.format, record), flush=True)
+        return 0
+
+    def report_error(line_num, line, err_msg):
+        """ Print the Fail line of a spec line that is not a check spec or whose check could not run """
+        if options.format == 'text':
+            click.echo("Fail: suite line %s [%s] %s" % (line_num, line, err_msg))
+        else:
+            record = {'verdict': 'Fail', 'failed': 'spec', 'cmd': line,
+                      'comment': "suite line %s %s" % (line_num, err_msg), 'patterns': None,
+                      'negate': False, 'exit_code': None, 'wall_time': 0.0, 'cpu_time': None,
+                      'bytes': 0, 'timeout': None}
+            print(_format_record(options.format, record), flush=True)
+        return 1
+
+    def report_shard(shard, suite_size, line_nums):
+        """ Print the checks this --shard runs of the suite so --merge can tell if the shards ran every check once """
+        if options.format == 'text':
+            print("Shard: %s/%s ran [%s] of [%s] checks, lines [%s]"
+                  % (shard[0], shard[1], len(line_nums), suite_size, ' '.join(str(num) for num in line_nums)))
+        elif options.format == 'jsonl':
+            print(json.dumps({'shard': "%s/%s" % shard, 'checks': suite_size, 'lines': line_nums}), flush=True)
+
+    def report_pending(wait=True):
+        """ Report the running checks in spec order, stop at the first unfinished one unless wait """
+        pending_return = 0
+        while pending and (wait or pending[0][2].done()):
+            spec, cmd_str, future = pending.pop(0)
+            pending_return = max(pending_return, report(spec, cmd_str, future.result()))
+        return pending_return
+
+    with click.open_file(suite_file) as spec_file:
+        spec_lines = ((line_num, line.strip()) for line_num, line in enumerate(spec_file, 1))
+        if shard:
+            spec_lines = list(spec_lines)
+            suite_size = sum(1 for _, line in spec_lines if line and not line.startswith('#'))
+            spec_lines = _shardlines(spec_lines, shard, suite_timings)
+            report_shard(shard, suite_size, [line_num for line_num, _ in spec_lines])
+        for line_num, line in spec_lines:
+            if not line or line.startswith('#'):
+                continue
+
+            # ---
+            # A line that passed in an earlier --incremental run is fingerprinted without parsing it again
+            spec = suite_specs.get(line) if incremental and not force else None
+            if spec is not None and _check_fingerprint(line, spec, suite_options) in suite_state:
+                spec = dict(spec, cached=True)
+                if pool:
+                    # Its Pass line still waits for the running checks before it
+                    cached = concurrent.futures.Future()
+                    cached.set_result(None)
+                    pending.append((spec, "tcmd "+line, cached))
+                    suite_return = max(suite_return, report_pending(wait=False))
+                else:
+                    report_cached(spec)
+                continue
+
+            # ---
+            # Parse the spec line with the same options and arguments as the tcmd command line
+            try:
+                spec = parse_spec(line)
+            except ValueError as err:
+                spec = None
+                err_msg = str(err)
+            if spec is None:
+                suite_return = max(suite_return, report_pending(), report_error(line_num, line, err_msg))
+                continue
+
+            # ---
+            # Time the check by its spec line (--timings) and fingerprint it to save it if it passes (--incremental)
+            spec['line'] = line
+            spec['line_num'] = line_num
+            if incremental and not spec['stdin']:
+                spec['fingerprint'] = _check_fingerprint(line, spec, suite_options)
+
+            # ---
+            # Start the cmd in the pool or wait for the running checks and then run this check alone
+            if pool and not (spec['serial'] or spec['stdin'] or spec['stream'] or spec['until_match'] or spec['repeat']
+                             or spec['file'] or spec['retry_until'] is not None):
+                pending.append((spec, "tcmd "+line, pool.submit(run, spec)))
+                suite_return = max(suite_return, report_pending(wait=False))
+            else:
+                suite_return = max(suite_return, report_pending())
+                suite_return = max(suite_return, report(spec, "tcmd "+line))
+
+    suite_return = max(suite_return, report_pending())
+    if pool:
+        pool.shutdown()
+    if DBG and incremental:
+        pindent("DBG: suite state: skipped [%(skipped)s] ran [%(ran)s] loaded [%(loaded)s]" % suite_state_stats)
+
+    return suite_return
+
+
+def _mergeresults(result_files):
+    """
+    Combine the Pass/Fail output files of the --shard runs of a suite and print their totals like
+    print_test_counts of inc/test_utils.sh does for one output file
+
+    The Pass:, Fail:, and Timeout: lines (--format text) and the records of --format jsonl are counted.
+    The Shard: line (or record) of every shard run has to show that the shards together ran every check
+    of the suite once, else a Fail line says which shards or checks are missing or repeated.
+
+    Ex: tcmd --merge shard1.out --merge shard2.out
+
+    :param result_files: The output files of the shard runs
+    :return:             0 if every check passed, TIMEOUT_RETURN if a check timed out, else 1 if a check
+                         failed, a file does not exist, or the shards did not run every check once
+                         (the exit status of the suite run of all the shards)
+    """
+    import json
+
+    counts = {'Pass': 0, 'Fail': 0, 'Timeout': 0}
+    shards = [] # (result file, shard, suite size, line numbers) of every Shard: line or record
+    merge_return = 0
+    for result_file in result_files:
+        try:
+            with open(result_file, encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    for verdict in counts:
+                        if line.startswith(verdict + ':') or line.startswith('{"verdict": "%s"' % verdict):
+                            counts[verdict] += 1
+                    match = re.match(r'Shard: (\d+/\d+) ran \[\d+\] of \[(\d+)\] checks, lines \[([\d ]*)\]', line)
+                    if match:
+                        shards.append((result_file, match.group(1), int(match.group(2)),
+                                       [int(num) for num in match.group(3).split()]))
+                    elif line.startswith('{"shard": '):
+                        record = json.loads(line)
+                        shards.append((result_file, record['shard'], record['checks'], record['lines']))
+        except (OSError, ValueError, KeyError):
+            print("Warn: file [%s] does not exist.  Not counting its tests." % result_file)
+            merge_return = 1
+
+    # ---
+    # The shards have to be all of the i/N of one suite and run every check once
+    if shards:
+        shard_fails = []
+        shard_counts = set(int(shard.split('/')[1]) for _, shard, _, _ in shards)
+        suite_sizes = set(suite_size for _, _, suite_size, _ in shards)
+        ran = collections.Counter(num for _, _, _, line_nums in shards for num in line_nums)
+        unsharded = [result_file for result_file in result_files
+                     if result_file not in set(shard_file for shard_file, _, _, _ in shards)]
+        if unsharded:
+            shard_fails.append("files [%s] have no Shard: line" % ' '.join(unsharded))
+        if len(shard_counts) > 1 or len(suite_sizes) > 1:
+            shard_fails.append("shards [%s] are not of one suite" % ' '.join(
+                "%s:%s" % (shard, suite_size) for _, shard, suite_size, _ in shards))
+        else:
+            shard_count = shard_counts.pop()
+            shard_nums = sorted(int(shard.split('/')[0]) for _, shard, _, _ in shards)
+            if shard_nums != list(range(1, shard_count + 1)):
+                shard_fails.append("shards [%s] are not each of 1 to %s once"
+                                   % (' '.join(str(num) for num in shard_nums), shard_count))
+            repeated = sorted(num for num, times in ran.items() if times > 1)
+            if repeated:
+                shard_fails.append("lines [%s] ran in more than one shard" % ' '.join(str(num) for num in repeated))
+            suite_size = suite_sizes.pop()
+            if len(ran) != suite_size:
+                shard_fails.append("ran [%s] of the [%s] suite checks (did the shards load different --timings?)"
+                                   % (len(ran), suite_size))
+        for shard_fail in shard_fails:
+            print("Fail: --merge %s" % shard_fail)
+        counts['Fail'] += len(shard_fails)
+
+    if counts['Fail']:
+        merge_return = 1
+    if counts['Timeout']:
+        merge_return = TIMEOUT_RETURN
+
+    print("---")
+    print("Test Summary: %s" % ' '.join(os.path.basename(result_file) for result_file in result_files))
+    print("---")
+    print("Passes: %s" % counts['Pass'])
+    print(" Fails: %s" % counts['Fail'])
+    if counts['Timeout']: print("Timeouts: %s" % counts['Timeout'])
+    print(" Total: %s" % sum(counts.values()))
+    print("---")
+    return merge_return
+
+
+def _mergetimings(timings_files):
+    """
+    Combine the --timings files of the --shard runs of a suite into the --timings file of the next runs
+    (saved at exit by save_suite_timings(), the newest timing of a check wins)
+
+    Ex: tcmd --merge shard1.out --merge shard2.out --timings .tcmd.timings --merge_timings shard1.timings
+
+    :param timings_files: The --timings files of the shard runs
+    :return:              0, or 1 if a file does not exist
+    """
+    merge_return = 0
+    for timings_file in timings_files:
+        try:
+            timings = _readtimings(timings_file)
+        except OSError:
+            print("Warn: file [%s] does not exist.  Not merging its timings." % timings_file)
+            merge_return = 1
+            continue
+        for line, timing in timings.items():
+            if line not in suite_timings_ran or suite_timings_ran[line][1] <= timing[1]:
+                suite_timings_ran[line] = timing
+    return merge_return
+
+
+def _runserver(socket_file):
+    """
+    Serve the tcmd runs of thin clients (export TCMD_SERVER=<socket>) from this one warm tcmd process
+
+    Every client run is served by a fork of this process that already imported all of the modules
+    and compiled the regexes of --regex_cache so it only pays for the cmd it tests.  A fork compiles
+    new regexes into its own copy of the cache and saves them in --regex_cache when it is done, so the
+    server loads that file again before the next fork when it changed.  Only you can connect to the
+    socket (mode 0600).  Stop the server with kill (SIGTERM) or Ctrl-C.
+
+    Ex: tcmd --server /tmp/tcmd.sock &
+        export TCMD_SERVER=/tmp/tcmd.sock
+        tcmd date 2018   ... served by the tcmd --server
+
+    :param socket_file: The unix socket file to listen on
+    :return:            0 when the server is stopped, 1 if it could not listen on socket_file
+    """
+    import socket
+
+    # ---
+    # Import everything up front so the forks serving the clients do not have to (the modules the checks
+    # import in their functions are only imported here for the forks, not used by the server itself)
+    import importlib
+    import traceback
+
+    testcmd_command()
+    for module_name in ('json', 'pickle', 'marshal', 'shlex', 'concurrent.futures', 'datetime', 'tempfile'):
+        importlib.import_module(module_name)
+
+    # ---
+    # Remove the socket file of a server that is not running anymore
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        if probe.connect_ex(socket_file) == 0:
+            print("Fail: a tcmd server is already listening on [%s]" % socket_file)
+            return 1
+    if os.path.exists(socket_file):
+        os.unlink(socket_file)
+
+    # ---
+    # Only you can connect to the socket: a client hands the server its fds, cwd, env, and cmd to run
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server_pid = os.getpid()
+    old_umask = os.umask(0o177)
+    try:
+        server.bind(socket_file)
+    finally:
+        os.umask(old_umask)
+    os.chmod(socket_file, 0o600)
+    server.listen(128)
+    server.settimeout(1)
+    signal.signal(signal.SIGTERM, lambda signum, frame: exit(0))
+    print("Note: tcmd server listening on [%s] (pid %s)" % (socket_file, os.getpid()))
+    sys.stdout.flush()
+    regex_cache_stamp = _file_stamp(regex_cache_file) if regex_cache_file else None
+
+    try:
+        while True:
+            # ---
+            # Reap the finished forks
+            try:
+                while os.waitpid(-1, os.WNOHANG)[0]:
+                    pass
+            except ChildProcessError:
+                pass
+
+            try:
+                conn, address = server.accept()
+            except socket.timeout:
+                continue
+
+            # ---
+            # Load the regexes the earlier forks compiled and saved so this fork starts with them too
+            if regex_cache_file and _file_stamp(regex_cache_file) != regex_cache_stamp:
+                regex_cache_stamp = _file_stamp(regex_cache_file)
+                load_regex_cache(regex_cache_file)
+            if os.fork() == 0:
+                # The fork never returns into the server loop, whatever the client sent
+                client_return = 1
+                try:
+                    server.close()
+                    client_return = _serve_client(conn)
+                except BaseException:
+                    traceback.print_exc()
+                finally:
+                    os._exit(client_return)
+            conn.close()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if os.getpid() == server_pid:
+            os.unlink(socket_file)
+    return 0
+
+
+def _serve_client(conn):
+    """
+    Run one tcmd run of a thin client inside a fork of the tcmd --server
+
+    :param conn: The socket connected to the client
+    :return:     The tcmd exit status of the run, which is also sent back to the client
+    """
+    import socket
+    import json
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # Count only the regexes of this run so it saves --regex_cache only if it compiled a new one
+    regex_cache_stats.update(hits=0, misses=0)
+    msg, fds, flags, address = socket.recv_fds(conn, 4, 3)
+    request = b''
+    while True:
+        data = conn.recv(64*1024)
+        if not data:
+            break
+        request += data
+    request = json.loads(request.decode('utf-8'))
+
+    # ---
+    # Take over the stdin, stdout, stderr, cwd, environment, and argv of the client run
+    for fd, client_fd in enumerate(fds):
+        os.dup2(client_fd, fd)
+        os.close(client_fd)
+    os.chdir(request['cwd'])
+    os.environ.clear()
+    os.environ.update(request['env'])
+    sys.argv = request['argv']
+
+    try:
+        _tcmd_main()
+        server_return = 0
+    except SystemExit as err:
+        server_return = err.code if isinstance(err.code, int) else 0 if err.code is None else 1
+    _flush_state()
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    conn.sendall(str(server_return).encode('utf-8'))
+    conn.close()
+    return server_return
+
+
+def get_help_msg(command):
+    """
+    Print full help message of click def <function>
+
+    Ex: print_help_msg(testcmd_command())
+
+    :param command: function that has the click command decorator and help option
+    :return: a string containting the @click.command() <function> help message
+    """
+    import click
+
+    with click.Context(command) as ctx:
+        # click.echo(command.get_help(ctx))
+        return command.get_help(ctx)
+
+
+def testcmd(**params):
+    """\b
+tcmd - test a commands output against a regular expression
+
+\b
+ Desc: tcmd [Options] cmd regEx
+         ====================================================================
+         cmd      ........... cmd to execute and test stdout, stderr, exit status
+         regEx    ........... regular expression to test the expected stdout of
+                              the command
+         ====================================================================
+\b
+Examples:
+  tcmd date 2018          ... same as: date | grep -i 2018
+\b
+  tcmd -c "date test" date 2018
+                          ... date | grep -i 2018 with a comment added to Pass/Fail lines
+\b
+  date | tcmd -s -c "cmd=date via --stdin" : 2018
+                          ... same as line above only using stdin and not testing return_code and stderr
+\b
+  tcmd --file huge.log : "Server started"
+                          ... same as: grep -i "Server started" huge.log searching the memory mapped bytes of
+                          ... huge.log without running a cmd or reading huge.log into memory
+\b
+  tcmd -n date 2016       ... date | grep -v 2016 (negate regEx test=Pass)
+\b
+  tcmd -d 'cat /etc/hosts' '#|localhost'
+                          ... cat /etc/hosts | egrep -i "#|localhost"
+\b
+  tcmd -d -v date 2018    ... turn on debug and verbose output and check date cmd against regex 2018
+\b
+  tcmd -v --report_kb 16 "make test" "0 failed"
+                          ... the verbose output of make test only prints its first and last 16KB and the 16KB
+                          ... around the match (--report_kb 0 prints all of it)
+\b
+  tcmd -v "touch myfile; test -f myfile && rm -f myfile"  ""
+                          ... sting multiple commands together with ';' or && or ||
+\b
+  OUT=$(cat /etc/hosts)
+  echo "$OUT" | tcmd --stdin -v -c "bash variable test" : localhost
+                          ... echo "$OUT" | grep -i localhost (uses a bash variable w/--stdin)
+\b
+  OUT=$(tcmd ping -c 2 localhost); RET=$?
+  if [ $RET -eq 0 ] && echo "tcmd returned 0" || echo "tcmd did not return 0"
+                          ... how to run tcmd and capturing just PASS (0) or FAil (1) return code without
+                          ... printing tcmd output to stdout
+\b
+  tcmd --suite checks.txt ... run every "[Options] cmd regEx" line of checks.txt in one tcmd process
+\b
+  tcmd --suite checks.txt --jobs 8
+                          ... same as above running up to 8 check cmds at the same time
+\b
+  tcmd --suite checks.txt --incremental ~/.cache/tcmd/checks.state --input config.yaml
+                          ... skip the checks that passed in an earlier run unless their spec line, the
+                          ... programs they run, or config.yaml changed (--force to run them all)
+\b
+  tcmd --suite checks.txt --shard 2/4 --timings .tcmd.timings > shard2.out
+  tcmd --merge shard1.out --merge shard2.out --merge shard3.out --merge shard4.out
+                          ... run the second quarter of the checks on this CI worker balanced by the seconds
+                          ... the checks took in earlier runs and print the Pass/Fail totals of all 4 workers
+                          ... (--merge fails if the workers did not run every check once, add --timings
+                          ... .tcmd.timings --merge_timings <a worker's .tcmd.timings> for the next runs)
+\b
+  tcmd --stream "cat huge.log" "Server started"
+                          ... same as: cat huge.log | grep -i "Server started" without reading all of huge.log
+                          ... into memory (regEx can match across the lines of the last 64KB searched)
+\b
+  tcmd --until_match "tail -f app.log" "Server started"
+                          ... Pass as soon as "Server started" is in app.log and then kill tail -f
+                          ... (the return code of the killed cmd is not tested)
+\b
+  tcmd --timeout 10 "curl -s localhost:8080/health" ok
+                          ... kill curl and print "Timeout:" with exit status 124 if it runs over 10 seconds
+\b
+  tcmd --also Tue --also UTC date 2026
+                          ... run date once and test its stdout matches all of 2026, Tue, and UTC
+                          ... in one scan of the output (--match any or none for the other tests)
+\b
+  export TCMD_CACHE=~/.cache/tcmd/cmd.cache
+  tcmd --cache_watch /etc/hosts "cat /etc/hosts" localhost
+  tcmd --cache_watch /etc/hosts "cat /etc/hosts" 127.0.0.1
+                          ... the second tcmd reuses the output of the first cat for 60 seconds
+                          ... (--cache_ttl) unless /etc/hosts changed (--no-cache to run cat again)
+\b
+  tcmd --bytes "gzip -c big.log" "^\\x1f\\x8b"
+                          ... search the bytes of a binary output without decoding it (only the bytes
+                          ... around the match are decoded to print them)
+\b
+  tcmd --max_cpu 10 --max_as 512 --max_output 1000000 --usage "max_rss_kb=\\d{1,5} " "make test" Passed
+                          ... Fail if make test uses over 10 cpu seconds or writes over 1MB of output,
+                          ... cap its address space at 512MB, and test its max RSS is under 100MB
+\b
+  tcmd --repeat 100 --warmup 5 --max_p95 0.05 "curl -s localhost:8080/health" ok
+                          ... run curl 105 times, test every one of the last 100 runs, print the min, median,
+                          ... p90, p95, p99, max wall and user/sys cpu times and Fail if the p95 is over 50ms
+\b
+  tcmd --retry_until 60 --timeout 5 "curl -s localhost:8080/health" ok
+                          ... wait up to 60 seconds for the service to be healthy running curl again 0.1, 0.2,
+                          ... 0.4, ... (max 5) seconds after every Fail and report the attempts and time to pass
+\b
+  tcmd --phases --profile cprofile "find /usr -name '*.h'" stdio.h
+                          ... print the seconds find took to spawn, capture (drain its pipes), decode, search,
+                          ... and report and the cProfile of tcmd to stderr (--format jsonl for a phases record)
+\b
+  tcmd --hooks metrics.py --suite checks.txt
+                          ... call the tcmd_pre_spawn(cmd), tcmd_post_capture(cmd, cmd_output), and
+                          ... tcmd_post_match(result) functions of metrics.py for every check
+\b
+  tcmd --suite checks.txt --format jsonl > results.jsonl
+                          ... one JSON line per check as it finishes with its verdict, failed channel, cmd,
+                          ... regexes, exit code, wall and cpu time, and bytes of output
+\b
+  tcmd --suite checks.txt --format junit > results.xml
+                          ... same as above as a JUnit XML <testsuite> for CI servers
+\b
+  PYTHONPATH=bin python -c 'import tcmd; print(tcmd.run_check("date", "2026").verdict)'
+                          ... run a check in-process from python: run_check() and run_spec() return a
+                          ... CheckResult (verdict, failed, stdout, stderr, record()) and do not print or exit
+\b
+  PYTHONPATH=bin python -m pytest -p tcmd tests/
+                          ... run every spec line of the tests/*.tcmd files as a pytest test in-process
+                          ... (add -n 8 with pytest-xdist to run them in parallel)
+\b
+  tcmd --server /tmp/tcmd.sock &
+  export TCMD_SERVER=/tmp/tcmd.sock
+                          ... every tcmd run after this is served by the warm tcmd server process
+                          ... (tcmd runs by itself again if the server is not running)
+\b
+  tcmd -h                 ... this help message
+\b
+Notes:
+\b
+  1. You can specify regEx as "", "^$", or "\A\z" for the empty string
+  2. regex matches re.MULTILINE and re.DOTALL (matches across multilines with ".")
+  3. This program only tested on python 2.7
+  4. This program requires textwrap and click python modules to be installed
+     Run: 'pip install -r inc/requirements.txt' to install these two modules
+  5. See tests/test_tcmd.sh for more examples of syntax
+  6. A cmd without shell metachars (| ; & < > ( ) $ ` \\ * ? [ ] # ~ { }) or shell builtins is exec'd
+     directly without forking /bin/sh (--shell to always use /bin/sh)
+  7. The output is first scanned for the longest literal a regex requires (like "timeout" in
+     "error:.*timeout") and the regex is only searched if the literal is there
+  8. The max_rss_kb of --usage includes the memory tcmd had when it started the cmd (the kernel
+     counts the fork before it exec'd the cmd) so it only measures a cmd using more than tcmd (~20MB)
+  9. The --cache, --incremental, and --regex_cache files are saved only readable by you (in a new
+     0700 dir) and not loaded if someone else owns them or they are writable by others
+\b
+Warning:
+  1. You have to backslash regular expression meta chars on command line if you want them
+     to be interpreted as literal characters in the regex
+     (tcmd does not escape the metachars for you unless you use the --backslash option)
+     For example, use:
+       tcmd -v 'echo "add x+y"' "add x\+y"
+                                     (^ backslashed the '+' regex metachar)
+         instead of
+       tcmd -v 'echo "add x+y"' "add x+y"
+     Python regex metachars:
+       \       Escape special char or start a sequence.
+       .       Match any char except newline, see re.DOTALL
+       ^       Match start of the string, see re.MULTILINE
+       $       Match end of the string, see re.MULTILINE
+       []      Enclose a set of matchable chars
+       R|S     Match either regex R or regex S.
+       ()      Create capture group, & indicate precedence
+       *       0 or more. Same as {,}
+       +       1 or more. Same as {1,}
+       ?       0 or 1. Same as {,1}
+"""
+    global DBG, REPORT_SIZE
+
+    if params['dbg']: DBG=1
+    if params['report_kb'] is not None: REPORT_SIZE = params['report_kb'] * 1024
+    if DBG: pindent("DBG: len(sys.argv): %s" % len(sys.argv))
+
+    # ---
+    # Generate pydoc if given on command line
+    if params['pydoc']:
+        create_pydocs()
+        exit(0)
+
+    # ---
+    # Print some debugging info on the cmd line options
+    if DBG:
+        for name, value in params.items():
+            if name not in ('cmd', 'regex'):
+                pindent("DBG: %11s: [%s]" % (name, ', '.join(value) if isinstance(value, tuple) else value))
+        pindent("---")
+
+    # ---
+    # Add the hook functions of the --hooks modules
+    for module_name in params['hooks']:
+        load_hooks(module_name)
+
+    # ---
+    # Load the compiled regexes of earlier tcmd runs
+    if params['regex_cache']:
+        load_regex_cache(params['regex_cache'])
+
+    # ---
+    # Load the cmd outputs of earlier tcmd runs to reuse them
+    cmd_cache = None
+    if params['cache'] and not params['no_cache']:
+        load_cmd_cache(params['cache'])
+        cmd_cache = {'ttl': CMD_CACHE_TTL if params['cache_ttl'] is None else params['cache_ttl'],
+                     'env': params['cache_env'], 'watch': params['cache_watch']}
+
+    # ---
+    # Load the fingerprints of the suite checks that passed in earlier runs to skip them
+    suite = params['suite']
+    if params['incremental'] and suite:
+        load_suite_state(params['incremental'])
+
+    # ---
+    # Load the seconds the suite checks took in earlier runs to balance the shards and save them for the next runs
+    if params['timings'] and suite:
+        load_suite_timings(params['timings'])
+
+    # ---
+    # Serve the tcmd runs of the thin clients until killed
+    if params['server']:
+        exit(_runserver(params['server']))
+
+    # ---
+    # Print the totals of the output files of the --shard runs and combine their timings for the next runs
+    if params['merge']:
+        if params['merge_timings'] and not params['timings']:
+            print("Fail: --merge_timings only works with --timings")
+            exit(1)
+        merge_return = _mergeresults(params['merge'])
+        if params['merge_timings']:
+            load_suite_timings(params['timings'])
+            merge_return = max(merge_return, _mergetimings(params['merge_timings']))
+        exit(merge_return)
+
+    # ---
+    # Make sure we have cmd and regex from cmd line args
+    cmd, regex = params['cmd'], params['regex']
+    if not suite and (len(sys.argv) <= 2 or cmd is None or regex is None): # first arg is always the name of the program, fyi, need at least 3 here
+        print(get_help_msg(testcmd_command()))
+        exit(1)
+
+    # ---
+    # The options of the check (or of every check of the suite) with the setrlimit() limits of the cmd
+    try:
+        options = CheckOptions.from_params(params, cmd_cache=cmd_cache)
+    except ValueError as err:
+        print("Fail: %s" % err)
+        exit(1)
+    shard = params['shard']
+    if shard is not None:
+        try:
+            shard = parse_shard(shard)
+        except ValueError as err:
+            print("Fail: %s" % err)
+            exit(1)
+        if not suite:
+            print("Fail: --shard only works with --suite")
+            exit(1)
+
+    # ---
+    # The <testcase> records of --format junit are printed as the checks finish inside one <testsuite>
+    if options.format == 'junit':
+        print('<?xml version="1.0" encoding="UTF-8"?>')
+        print('<testsuite name="tcmd">', flush=True)
+
+    # ---
+    # Run every check spec of the suite file in this one process
+    if suite:
+        tcmd_return = _runsuite(suite, options, jobs=params['jobs'], incremental=bool(params['incremental']),
+                                 force=params['force'], inputs=params['input'], shard=shard)
+        if options.format == 'junit': print('</testsuite>')
+        exit(tcmd_return)
+
+    # ---
+    # Get the command that is being run for debug and verbose reporting
+    cmd_str = ""
+    if [ 'tcmd' in sys.argv[0] ]:
+        cmd_str += "tcmd "
+    cmd_str += ' '.join(sys.argv[1:])
+
+    tcmd_return = _testcmd_check(cmd, regex, options, cmd_str=cmd_str)
+    if options.format == 'junit': print('</testsuite>')
+    exit(tcmd_return)
+
+
+
+# ---
+# Define command line options and parameters
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+
+
+@functools.lru_cache(maxsize=None)
+def testcmd_command():
+    """
+    Build the click command that parses the tcmd command line options and parameters and calls testcmd()
+
+    Note: click is imported here and not at the top of tcmd so the 'tcmd cmd regEx' fast path
+          (see _testcmd_fastpath()) does not pay for importing click and running its decorators
+
+    :return: The click command of testcmd()
+    """
+    import click
+
+    # @click.command(cls=CatchAllExceptions, context_settings=CONTEXT_SETTINGS, options_metavar='[options]')
+    @click.command(context_settings=CONTEXT_SETTINGS, options_metavar='[options]')
+    # @click.command()
+    @click.option('--dbg',         '-d', is_flag=True, default=False, help='Turn debug output on', metavar='<text>')
+    @click.option('--error',       '-e', is_flag=False,default='^$',  help='Stderr compared to regex', metavar='<text>')
+    @click.option('--negate',      '-n', is_flag=True, default=False, help='Opposite (negate) regex operator like grep -v', metavar='<text>')
+    @click.option('--comment',     '-c', is_flag=False,default=None,  help='Add a comment to Pass/Fail lines', metavar='<text>')
+    @click.option('--stdin',       '-s', is_flag=True, default=False, help='Pipe stdin as cmd substitute with : (searched as it arrives, --until_match stops reading it)', metavar='<text>')
+    @click.option('--file',              is_flag=False,default=None,  help='Search the memory mapped bytes of <path> as cmd substitute with :', metavar='<path>', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--return_code', '-r', is_flag=False,default='0',   help='The return status compared to regex', metavar='<text>')
+    @click.option('--usage',             is_flag=False,default=None,  help='The cmd resource usage "max_rss_kb=<n> user=<secs> sys=<secs> nvcsw=<n> nivcsw=<n>" compared to regex', metavar='<text>')
+    @click.option('--max_cpu',           is_flag=False,default=None,  help='Fail if cmd uses more than <int> cpu seconds (setrlimit RLIMIT_CPU)', metavar='<int>', type=click.IntRange(min=1))
+    @click.option('--max_as',            is_flag=False,default=None,  help='Limit the address space of cmd to <int> MB (setrlimit RLIMIT_AS)', metavar='<int>', type=click.IntRange(min=1))
+    @click.option('--max_output',        is_flag=False,default=None,  help='Fail if cmd writes more than <int> bytes of output (setrlimit RLIMIT_FSIZE for files)', metavar='<int>', type=click.IntRange(min=0))
+    @click.option('--verbose',     '-v', is_flag=True, default=False, help='Turn verbose output on', metavar='<text>')
+    @click.option('--report_kb',         is_flag=False,default=None,  help='Print only the first and last <int> KB of the cmd output and <int> KB around the match with -v or -d (default 4, 0 prints all of it)', metavar='<int>', type=click.IntRange(min=0))
+    @click.option('--pydoc',       '-p', is_flag=True, default=False, help='Generate pydoc')
+    @click.option('--timer',       '-t', is_flag=True, default=False, help='Report Execution time in seconds')
+    @click.option('--phases',            is_flag=True, default=False, help='Report the seconds of every phase of the check (spawn, capture, decode, search, report)')
+    @click.option('--profile',           is_flag=False,default=None,  help='Print the cProfile functions or tracemalloc lines of the check to stderr', type=click.Choice(['cprofile', 'tracemalloc']))
+    @click.option('--hooks',             multiple=True,               help='Python module or .py file whose tcmd_pre_spawn, tcmd_post_capture, tcmd_post_match functions are called for every check (or export TCMD_HOOKS, repeat for more)', metavar='<module>', envvar='TCMD_HOOKS')
+    @click.option('--backslash',   '-b', is_flag=True, default=False, help='Backslash all regex meta chars')
+    @click.option('--min',         '-m', is_flag=True, default=False, help='Print only minimum one line Pass or Fail except if --dbg')
+    @click.option('--suite',             is_flag=False,default=None,  help='Run every check spec line of a file (- for stdin) in one process', metavar='<file>')
+    @click.option('--jobs',              is_flag=False,default=1,     help='Run up to <int> --suite check cmds at the same time', metavar='<int>', type=click.IntRange(min=1))
+    @click.option('--serial',            is_flag=True, default=False, help='Run this --suite check alone even with --jobs')
+    @click.option('--incremental',       is_flag=False,default=None,  help='Skip the --suite checks that passed with the same spec, programs, and --input files saved in <file>', metavar='<file>')
+    @click.option('--force',             is_flag=True, default=False, help='Run every --suite check even with --incremental')
+    @click.option('--shard',             is_flag=False,default=None,  help='Run only the i-th of N --suite shards balanced by the --timings of the checks', metavar='<i/N>')
+    @click.option('--timings',           is_flag=False,default=None,  help='Load and save the seconds every --suite check took in <file> to balance the --shard runs (or export TCMD_TIMINGS)', metavar='<file>', envvar='TCMD_TIMINGS')
+    @click.option('--merge',             multiple=True,               help='Print the Pass/Fail totals of the output files of the --shard runs (repeat for more)', metavar='<file>')
+    @click.option('--merge_timings',     multiple=True,               help='Combine the --timings <file> of a --shard run into --timings with --merge (repeat for more)', metavar='<file>')
+    @click.option('--input',             multiple=True,               help='File the check depends on, --incremental runs it again if it changed (repeat for more)', metavar='<file>')
+    @click.option('--stream',            is_flag=True, default=False, help='Search the cmd output as it arrives keeping only a window of it in memory')
+    @click.option('--until_match',       is_flag=True, default=False, help='Pass as soon as stdout matches regEx and kill cmd (implies --stream)')
+    @click.option('--timeout',           is_flag=False,default=None,  help='Kill cmd and report Timeout after <seconds> (with --suite: for all the checks)', metavar='<seconds>', type=click.FloatRange(min=0))
+    @click.option('--also',              multiple=True,               help='One more regex stdout is compared to (repeat for more)', metavar='<regex>')
+    @click.option('--also_error',        multiple=True,               help='One more regex stderr is compared to (repeat for more)', metavar='<regex>')
+    @click.option('--match',             is_flag=False,default='all', help='All, any, or none of the stdout regexes have to match', type=click.Choice(['all', 'any', 'none']))
+    @click.option('--error_match',       is_flag=False,default='all', help='All, any, or none of the stderr regexes have to match', type=click.Choice(['all', 'any', 'none']))
+    @click.option('--bytes', 'as_bytes', is_flag=True, default=False, help='Search the stdout and stderr bytes without decoding them from utf-8')
+    @click.option('--shell',             is_flag=True, default=False, help='Always run cmd with /bin/sh even if it needs no shell')
+    @click.option('--cache',             is_flag=False,default=None,  help='Reuse the output of the same cmd run in the last --cache_ttl seconds saved in <file> (or export TCMD_CACHE)', metavar='<file>', envvar='TCMD_CACHE')
+    @click.option('--cache_ttl',         is_flag=False,default=None,  help='Seconds a --cache cmd output is reused for (default 60)', metavar='<seconds>', type=click.FloatRange(min=0))
+    @click.option('--cache_env',         multiple=True,               help='Env var whose value has to be the same to reuse a --cache cmd output (repeat for more)', metavar='<var>')
+    @click.option('--cache_watch',       multiple=True,               help='File whose mtime and size have to be the same to reuse a --cache cmd output (repeat for more)', metavar='<file>')
+    @click.option('--no_cache', '--no-cache', is_flag=True, default=False, help='Always run cmd even with --cache or TCMD_CACHE')
+    @click.option('--repeat',            is_flag=False,default=None,  help='Run cmd <int> times testing every run and report wall and cpu time statistics', metavar='<int>', type=click.IntRange(min=1))
+    @click.option('--warmup',            is_flag=False,default=0,     help='Run cmd <int> times before the --repeat runs without measuring them', metavar='<int>', type=click.IntRange(min=0))
+    @click.option('--max_p95',           is_flag=False,default=None,  help='Fail if the p95 wall time of the --repeat runs is over <seconds>', metavar='<seconds>', type=click.FloatRange(min=0))
+    @click.option('--retry_until',       is_flag=False,default=None,  help='Run cmd again until it passes or <seconds> passed waiting longer between the runs (--timeout to kill a run)', metavar='<seconds>', type=click.FloatRange(min=0))
+    @click.option('--retry_delay',       is_flag=False,default=RETRY_DELAY, help='Seconds to wait before the first retry (default 0.1)', metavar='<seconds>', type=click.FloatRange(min=0))
+    @click.option('--retry_backoff',     is_flag=False,default=RETRY_BACKOFF, help='Multiply the --retry_until wait by <float> after every run (default 2, max 5 seconds)', metavar='<float>', type=click.FloatRange(min=1))
+    @click.option('--retry_jitter',      is_flag=False,default=RETRY_JITTER, help='Randomize every --retry_until wait by +/- <float> of it (default 0.1)', metavar='<float>', type=click.FloatRange(min=0, max=1))
+    @click.option('--format',            is_flag=False,default='text',help='Print Pass/Fail lines (text) or one result record per check (jsonl, junit)', type=click.Choice(['text', 'jsonl', 'junit']))
+    @click.option('--server',            is_flag=False,default=None,  help='Serve the tcmd runs of export TCMD_SERVER=<socket> from this one process', metavar='<socket>')
+    @click.option('--regex_cache',       is_flag=False,default=None,  help='Save compiled regexes in <file> for the next tcmd run (or export TCMD_REGEX_CACHE)', metavar='<file>', envvar='TCMD_REGEX_CACHE')
+    @click.help_option('--help',   '-h', help="This usage message")
+    @click.argument('cmd',   required=False)
+    @click.argument('regex', required=False)
+    @functools.wraps(testcmd)
+    def command(**params):
+        return testcmd(**params)
+
+    return command
+
+
+def _testcmd_fastpath(args):
+    """
+    Run the common 'tcmd cmd regEx' command line without importing click
+
+    :param args: The command line args after the program name (sys.argv[1:])
+    :return:     The tcmd exit status of the check or None if args need the click command line parser
+    """
+    if len(args) != 2 or args[0].startswith('-') or args[1].startswith('-'):
+        return None
+
+    if os.environ.get('TCMD_REGEX_CACHE'):
+        load_regex_cache(os.environ['TCMD_REGEX_CACHE'])
+    cmd_cache = None
+    if os.environ.get('TCMD_CACHE'):
+        load_cmd_cache(os.environ['TCMD_CACHE'])
+        cmd_cache = {'ttl': CMD_CACHE_TTL, 'env': (), 'watch': ()}
+    for module_name in os.environ.get('TCMD_HOOKS', '').split():
+        load_hooks(module_name)
+    cmd, regex = args
+    return _testcmd_check(cmd, regex, cmd_str="tcmd "+' '.join(args), cmd_cache=cmd_cache)
+
+
+# ---
+# pytest plugin: every check spec line of a tcmd spec file (*.tcmd) is a pytest test item run in-process
+#   Ex: PYTHONPATH=bin python -m pytest -p tcmd tests/            (add -n 8 with pytest-xdist)
+#   The spec file globs are set by the tcmd_files ini option of pytest.ini (default *.tcmd)
+def pytest_addoption(parser):
+    """ Add the tcmd_files ini option of the pytest plugin """
+    parser.addini('tcmd_files', type='args', default=['*.tcmd'], help="glob patterns of the tcmd spec files to collect")
+
+
+def pytest_collect_file(file_path, parent):
+    """ Collect the tcmd spec files matching the tcmd_files globs """
+    import fnmatch
+
+    if any(fnmatch.fnmatch(file_path.name, pattern) for pattern in parent.config.getini('tcmd_files')):
+        return _pytest_nodes()[0].from_parent(parent, path=file_path)
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def _pytest_nodes():
+    """
+    Build the pytest collector and item classes of the tcmd spec files
+
+    Note: pytest is imported here and not at the top of tcmd so tcmd does not need pytest to run
+
+    :return: tuple = (TcmdFile, TcmdItem) pytest node classes
+    """
+    import pytest
+    import io
+    import contextlib
+
+    class TcmdCheckFailed(Exception):
+        """ The check of a spec line did not Pass """
+
+    class TcmdFile(pytest.File):
+        """ A tcmd spec file: blank lines and lines starting with '#' are skipped like --suite """
+
+        def collect(self):
+            for line_num, line in enumerate(self.path.read_text().splitlines(), 1):
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    yield TcmdItem.from_parent(self, name="line%s" % line_num, line=line, line_num=line_num)
+
+    class TcmdItem(pytest.Item):
+        """ The check of one spec line run with run_spec() """
+
+        def __init__(self, *, line, line_num, **kwargs):
+            super().__init__(**kwargs)
+            self.line = line
+            self.line_num = line_num
+            self.result = None
+
+        def runtest(self):
+            self.result = run_spec(self.line)
+            if not self.result:
+                raise TcmdCheckFailed()
+
+        def repr_failure(self, excinfo):
+            if isinstance(excinfo.value, ValueError):
+                return "Fail: suite line %s [%s] %s" % (self.line_num, self.line, excinfo.value)
+            if isinstance(excinfo.value, TcmdCheckFailed):
+                # The same Fail or Timeout line and verbose details tcmd prints
+                report = io.StringIO()
+                with contextlib.redirect_stdout(report):
+                    _print_check(self.result, verbose=True, cmd_str="tcmd "+self.line)
+                return report.getvalue().rstrip()
+            return super().repr_failure(excinfo)
+
+        def teardown(self):
+            if self.result is not None:
+                self.result.close()
+
+        def reportinfo(self):
+            return self.path, self.line_num - 1, "tcmd %s" % self.line
+
+    return TcmdFile, TcmdItem
+
+
+def _tcmd_main():
+    """
+    Run tcmd with the sys.argv command line and exit with the tcmd exit status
+    """
+    try:
+        fastpath_return = _testcmd_fastpath(sys.argv[1:])
+        if fastpath_return is not None:
+            exit(fastpath_return)
+        testcmd_command()()
+    except (Exception):
+    # except (Exception, err):
+        # click.echo("Fail: There was an error during execution of tcmd:")
+        print("Fail: There was an error during execution of tcmd:")
+        import traceback
+        exc_type, exc_value, exc_tb = sys.exc_info()
+        for line in traceback.format_exception(exc_type, exc_value, exc_tb):
+            pindent(line)
+        exit(1)
+
@@ -25,7 +25,8 @@ function print_header()
 }
 
 # ---
-# print_test_counts() - Count the Pass and Fails of a test output file generated using tcmd
+# print_test_counts() - Count the Pass, Fail, and Timeouts of a test output file generated using tcmd
+#   Counts the Pass:/Fail:/Timeout: lines and the records of tcmd --format jsonl in one pass
 # ---
 function print_test_counts()
 {
@@ -37,17 +38,19 @@ function print_test_counts()
 
     # ----
     # Count the passes and failures
-    PASSES=$(grep "^Pass:" $OUT_FILE 2>/dev/null)
-    FAILS=$( grep "^Fail:" $OUT_FILE 2>/dev/null)
-    PCNT=$(  echo "$PASSES" | grep -c . 2>/dev/null | xargs echo)
-    FCNT=$(  echo "$FAILS"  | grep -c . 2>/dev/null | xargs echo)
-    TOTAL=$(($PCNT+$FCNT))
+    read PCNT FCNT TCNT < <(awk '
+        /^Pass:/    || /^\{"verdict": "Pass"/    {p++}
+        /^Fail:/    || /^\{"verdict": "Fail"/    {f++}
+        /^Timeout:/ || /^\{"verdict": "Timeout"/ {t++}
+        END {print p+0, f+0, t+0}' "$TEST_OUTPUT_FILE")
+    TOTAL=$(($PCNT+$FCNT+$TCNT))
     TEST_PRG_NAME=$(basename $TEST_OUTPUT_FILE)
     echo "---"
     echo "Test Summary: $TEST_PRG_NAME"
     echo "---"
     echo "Passes: $PCNT"
     echo " Fails: $FCNT"
+    if [ $TCNT -ne 0 ]; then echo "Timeouts: $TCNT"; fi
     echo " Total: $TOTAL"
     echo "---"
 }
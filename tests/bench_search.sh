@@ -0,0 +1,82 @@
+#!/bin/bash
+# ---
+# bench_search.sh - shell program which micro-benchmarks the regex search of ../bin/tcmd
+#   Times compile_regex() (with the literal prefilter) vs a plain regex search of the same patterns
+#   over representative cmd outputs (ping, ls -l, a log) where the patterns match and do not match
+#   Note: export BENCH_REPEAT=<int> to change the number of timed searches per pattern
+# ---
+    PRG="tcmd"
+   TPRG=$(basename $0) # bench_search.sh
+    CWD=$(pwd)         # ../tests or ./tests
+ SUB_DIR=$(find . -name bench_search.sh -exec dirname {} \;) # usually '.' dir or './tests'
+ cd $SUB_DIR    # Now we are inside bench_search.sh dir
+ SRC_DIR=$(pwd) # /../tests absolute path dir containing file bench_search.sh
+OUT_FILE=/tmp/${TPRG}_$$
+teardown(){
+  if [ -f "$OUT_FILE" ]; then rm -rf "$OUT_FILE"; echo "Note: rm -rf $OUT_FILE"; fi
+  exit
+}
+trap "TRAP=TRUE; teardown; exit 1" 1 2 3 15
+
+TCMD_DIR=${SRC_DIR}/../bin
+    TCMD=${TCMD_DIR}/tcmd.py
+BENCH_REPEAT=${BENCH_REPEAT:-20}
+
+# ----
+# Source in the utility functions
+source $SRC_DIR/../inc/test_utils.sh
+
+# ----
+# print out a header with the name of the program
+print_header "$TPRG"
+
+# ----
+# Execute benchmarks
+(
+  # ---
+  # Print one line per output and pattern: before (plain regex) and after (compile_regex) in microseconds
+  BENCH_OUT=$(BENCH_REPEAT=$BENCH_REPEAT python - "$TCMD_DIR" <<'EOF'
+import os, sys, timeit
+sys.path.insert(0, sys.argv[1])
+import tcmd
+re = tcmd.re
+
+outputs = {
+    'ping': "64 bytes from localhost (127.0.0.1): icmp_seq=1 ttl=64 time=0.040 ms\n" * 20000
+            + "3 packets transmitted, 3 received, 0% packet loss, time 2003ms\n",
+    'ls':   "-rw-r--r-- 1 root root  12345 Oct 17 02:24 file_name_%s.txt\n" * 20000,
+    'log':  "2026-10-17 02:24:00,123 INFO worker-7 request handled in 12 ms\n" * 20000
+            + "2026-10-17 02:24:01,456 ERROR worker-3 connection refused: retry 3\n",
+}
+patterns = ['3 packets received', r'\d+ packets transmitted', r'error.*connection refused', r'(warn|error) .*timeout',
+            r'^total \d+', '99999', r'retry \d+$', 'localhost']
+repeat = int(os.environ['BENCH_REPEAT'])
+for name, output in outputs.items():
+    for pattern in patterns:
+        before_regex = re.compile(pattern, tcmd.SEARCH_FLAGS)
+        after_regex = tcmd.compile_regex(pattern)
+        before = timeit.timeit(lambda: before_regex.search(output), number=repeat) / repeat
+        after = timeit.timeit(lambda: after_regex.search(output), number=repeat) / repeat
+        print("%-4s %-5s %8d %8d %s" % (name, bool(before_regex.search(output)), before * 1e6, after * 1e6, pattern))
+EOF
+)
+  echo "out  match  before_us after_us regex"
+  echo "$BENCH_OUT"
+
+  # Test the prefilter is faster over all the searches and is not slower when the patterns match
+  BEFORE_US=$(echo "$BENCH_OUT" | awk '{us += $3} END {print us}')
+  AFTER_US=$(echo "$BENCH_OUT"  | awk '{us += $4} END {print us}')
+  $TCMD -c "all searches ${AFTER_US}us with the prefilter vs ${BEFORE_US}us without" "test $AFTER_US -lt $BEFORE_US" ""
+  MATCH_BEFORE_US=$(echo "$BENCH_OUT" | awk '$2 == "True" {us += $3} END {print us}')
+  MATCH_AFTER_US=$(echo "$BENCH_OUT"  | awk '$2 == "True" {us += $4} END {print us}')
+  $TCMD -c "matching searches ${MATCH_AFTER_US}us with the prefilter vs ${MATCH_BEFORE_US}us without" "test $MATCH_AFTER_US -le $((MATCH_BEFORE_US * 5 / 4))" ""
+
+) | tee $OUT_FILE 2>&1
+
+# ----
+# Count the passes and failures
+print_test_counts "$OUT_FILE"
+
+# ----
+# Do some cleanup like removing $OUT_FILE
+teardown
@@ -0,0 +1,55 @@
+#!/bin/bash
+# ---
+# bench_spawn.sh - shell program which benchmarks the per check spawn cost of ../bin/tcmd
+#   Uses tcmd --repeat to time a cmd that needs no shell exec'd directly vs run with /bin/sh (--shell)
+#   Note: export BENCH_REPEAT=<int> to change the number of measured runs
+# ---
+    PRG="tcmd"
+   TPRG=$(basename $0) # bench_spawn.sh
+    CWD=$(pwd)         # ../tests or ./tests
+ SUB_DIR=$(find . -name bench_spawn.sh -exec dirname {} \;) # usually '.' dir or './tests'
+ cd $SUB_DIR    # Now we are inside bench_spawn.sh dir
+ SRC_DIR=$(pwd) # /../tests absolute path dir containing file bench_spawn.sh
+OUT_FILE=/tmp/${TPRG}_$$
+teardown(){
+  if [ -f "$OUT_FILE" ]; then rm -rf "$OUT_FILE"; echo "Note: rm -rf $OUT_FILE"; fi
+  exit
+}
+trap "TRAP=TRUE; teardown; exit 1" 1 2 3 15
+
+TCMD_DIR=${SRC_DIR}/../bin
+    TCMD=${TCMD_DIR}/tcmd.py
+BENCH_REPEAT=${BENCH_REPEAT:-200}
+
+# ----
+# Source in the utility functions
+source $SRC_DIR/../inc/test_utils.sh
+
+# ----
+# print out a header with the name of the program
+print_header "$TPRG"
+
+# ----
+# Execute benchmarks
+(
+  # ---
+  # Time the same check with /bin/sh -c date (before) and with date exec'd directly (after)
+  SHELL_OUT=$($TCMD --shell --repeat $BENCH_REPEAT --warmup 10 -c "spawn with /bin/sh" date "[0-9]")
+  echo "$SHELL_OUT"
+  DIRECT_OUT=$($TCMD --repeat $BENCH_REPEAT --warmup 10 -c "spawn without a shell" date "[0-9]")
+  echo "$DIRECT_OUT"
+
+  # Test exec'ing the cmd directly is faster than forking /bin/sh to exec it (median wall time)
+  SHELL_US=$(echo "$SHELL_OUT"   | awk '$1 == "wall" {printf "%d", $3 * 1000000}')
+  DIRECT_US=$(echo "$DIRECT_OUT" | awk '$1 == "wall" {printf "%d", $3 * 1000000}')
+  $TCMD -c "median spawn ${DIRECT_US}us without a shell vs ${SHELL_US}us with /bin/sh" "test $DIRECT_US -lt $SHELL_US" ""
+
+) | tee $OUT_FILE 2>&1
+
+# ----
+# Count the passes and failures
+print_test_counts "$OUT_FILE"
+
+# ----
+# Do some cleanup like removing $OUT_FILE
+teardown
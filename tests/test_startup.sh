@@ -0,0 +1,103 @@
+#!/bin/bash
+# ---
+# test_startup.sh - shell program which verifies ../bin/tcmd starts up fast
+#   Uses python -X importtime to verify the 'tcmd cmd regEx' fast path does not import the
+#   modules only needed by other options and that its imports stay under a time budget
+#   -X importtime cannot see the compile time of the main script (python never caches it), so the
+#   wall clock of a run over a bare python run and the compile time of bin/tcmd.py get budgets too
+#   Note: export STARTUP_BUDGET_US=<microseconds> to change the import time budget (it includes the
+#         import of tcmd_lib.py itself, which holds all of tcmd)
+#   Note: export STARTUP_WALL_BUDGET_MS=<milliseconds> to change the wall clock budget over bare python
+#   Note: export STARTUP_COMPILE_BUDGET_US=<microseconds> to change the compile budget of bin/tcmd.py
+# ---
+    PRG="tcmd"
+   TPRG=$(basename $0) # test_startup.sh
+    CWD=$(pwd)         # ../tests or ./tests
+ SUB_DIR=$(find . -name test_startup.sh -exec dirname {} \;) # usually '.' dir or './tests'
+ cd $SUB_DIR    # Now we are inside test_startup.sh dir
+ SRC_DIR=$(pwd) # /../tests absolute path dir containing file test_startup.sh
+OUT_FILE=/tmp/${TPRG}_$$
+teardown(){
+  if [ -f "$OUT_FILE" ]; then rm -rf "$OUT_FILE"; echo "Note: rm -rf $OUT_FILE"; fi
+  exit
+}
+trap "TRAP=TRUE; teardown; exit 1" 1 2 3 15
+
+TCMD_DIR=${SRC_DIR}/../bin
+    TCMD=${TCMD_DIR}/tcmd.py
+STARTUP_BUDGET_US=${STARTUP_BUDGET_US:-80000}
+STARTUP_WALL_BUDGET_MS=${STARTUP_WALL_BUDGET_MS:-80}
+STARTUP_COMPILE_BUDGET_US=${STARTUP_COMPILE_BUDGET_US:-5000}
+STARTUP_RUNS=${STARTUP_RUNS:-9}
+
+# ----
+# Source in the utility functions
+source $SRC_DIR/../inc/test_utils.sh
+
+# ----
+# print out a header with the name of the program
+print_header "$TPRG"
+
+# ----
+# Execute functional tests
+(
+  # ---
+  # The import times of the fast path (python -X importtime writes them to stderr) with the bytecode of
+  # tcmd_lib.py cached like in a normal tcmd run (the first run writes it)
+  export PYTHONDONTWRITEBYTECODE=
+  python $TCMD true "" > /dev/null
+  IMPORTS=$(python -X importtime $TCMD true "" 2>&1 >/dev/null)
+
+  # Test the fast path does not import the modules of the other options
+  for MOD in click pydoc traceback textwrap datetime pickle shlex concurrent.futures; do
+    echo "$IMPORTS" | $TCMD -n -c "fast path does not import $MOD" --stdin : "\| $MOD$"
+  done
+
+  # Test the click command line parser is still imported when an option is given
+  OUT=$(python -X importtime $TCMD -m true "" 2>&1 >/dev/null)
+  echo "$OUT" | $TCMD -c "options import click" --stdin : "\| click$"
+
+  # ---
+  # Test the total import time of the fast path is under budget (sum of the top level imports)
+  IMPORT_US=$(echo "$IMPORTS" | awk -F'|' '/^import time:/ && $3 !~ /^  / {us += $2} END {print us}')
+  $TCMD -c "fast path imports take ${IMPORT_US}us, budget ${STARTUP_BUDGET_US}us" "test $IMPORT_US -le $STARTUP_BUDGET_US" ""
+
+  # Print the slowest top level imports
+  echo "Slowest imports (cumulative us):"
+  echo "$IMPORTS" | awk -F'|' '/^import time:/ && $3 !~ /^  / {print $2 "|" $3}' | sort -n | tail -5 | indent
+
+  # ---
+  # Test the wall clock of 'tcmd true ""' over a bare 'python -c pass' (medians of $STARTUP_RUNS runs)
+  WALL_MS=$(python -c "
+import subprocess, sys, time, statistics
+def median_ms(argv):
+    times = []
+    for _ in range($STARTUP_RUNS):
+        start = time.perf_counter()
+        subprocess.run(argv, stdout=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+print(round(median_ms([sys.executable, '$TCMD', 'true', '']) - median_ms([sys.executable, '-c', 'pass'])))
+")
+  $TCMD -c "tcmd run takes ${WALL_MS}ms over bare python, budget ${STARTUP_WALL_BUDGET_MS}ms" "test $WALL_MS -le $STARTUP_WALL_BUDGET_MS" ""
+
+  # Test the compile time of bin/tcmd.py (the main script is compiled on every run) is under budget
+  # (all of tcmd in the main script compiles in about 50ms; the launcher is a few ms)
+  COMPILE_US=$(python -c "
+import time
+source = open('$TCMD').read()
+start = time.perf_counter()
+compile(source, '$TCMD', 'exec')
+print(round((time.perf_counter() - start) * 1000000))
+")
+  $TCMD -c "tcmd.py compiles in ${COMPILE_US}us, budget ${STARTUP_COMPILE_BUDGET_US}us" "test $COMPILE_US -le $STARTUP_COMPILE_BUDGET_US" ""
+
+) | tee $OUT_FILE 2>&1
+
+# ----
+# Count the passes and failures
+print_test_counts "$OUT_FILE"
+
+# ----
+# Do some cleanup like removing $OUT_FILE
+teardown
@@ -118,6 +118,292 @@ EXP_DATE=$(date +%Y) # Get current year like 2018 for positive test cases to pas
   echo "$OUT" | $TCMD -c "P1: test multiline stderr empty string" --stdin : "^Fail:.*stderr does .NOT. match regEx"
   echo "$RET" | $TCMD -c "P2: test multiline stderr empty string" --stdin : "1"
 
+  # Test --suite runs many check spec lines inside one tcmd process
+  printf '%s\n' "# suite comment line" "-c 'suite check 1' date $EXP_DATE" "-n -c 'suite check 2' date 2016" | $TCMD --suite -
+
+  # Test --suite returns 1 when one of its checks fails
+  OUT=$(printf '%s\n' "date $EXP_DATE" "date 'this should fail'" | $TCMD --suite -); RET=$?
+  echo "$RET" | $TCMD -c "suite fail return code" --stdin : "1"
+
+  # Test a --suite check with a bad regex Fails its line and the checks after it still run (also with --jobs)
+  OUT=$(printf '%s\n' "date '('" "'echo after' after" | $TCMD --suite -)
+  echo "$OUT" | $TCMD -c "suite bad regex" --stdin : "^Fail: suite line 1 \[date '\('\] missing \).*\n^Pass: cmd .echo after."
+  OUT=$(printf '%s\n' "date '('" "'echo after' after" | $TCMD --suite - --jobs 2)
+  echo "$OUT" | $TCMD -c "suite --jobs bad regex" --stdin : "^Fail: suite line 1 .*\n^Pass: cmd .echo after."
+
+  # Test a --suite line with -h or --help Fails its line and does not print the usage or stop the suite
+  OUT=$(printf '%s\n' "'echo before' nomatch" "-h" "--help" "'echo after' after" | $TCMD --suite -); RET=$?
+  echo "$OUT" | $TCMD -c "suite -h line" --stdin : "^Fail: suite line 2 \[-h\] No such option '-h'"
+  echo "$OUT" | $TCMD -c "suite --help line" --stdin : "^Fail: suite line 3 \[--help\] No such option '--help'.*\n^Pass: cmd .echo after."
+  echo "$OUT" | $TCMD -n -c "suite --help line prints no usage" --stdin : "^Usage:"
+  echo "$RET" | $TCMD -c "suite --help line return code" --stdin : "^1$"
+
+  # Test --suite --jobs runs the check cmds at the same time but prints Pass/Fail lines in spec order
+  OUT=$(printf '%s\n' "'sleep 1; echo first' first" "'echo second' second" "--serial 'echo third' third" | $TCMD --suite - --jobs 2)
+  echo "$OUT" | $TCMD -c "suite --jobs spec order" --stdin : "^Pass:.*first.*\n^Pass:.*second.*\n^Pass:.*third"
+
+  # Test --regex_cache saves the compiled regexes for the next tcmd run
+  OUT=$($TCMD --regex_cache ${OUT_FILE}.regex_cache date $EXP_DATE)
+  $TCMD -d --regex_cache ${OUT_FILE}.regex_cache date $EXP_DATE | $TCMD -c "--regex_cache loaded" -s : "regex cache: hits .2. misses .0. loaded .2."
+  rm -f ${OUT_FILE}.regex_cache
+
+  # Test --regex_cache drops a cache saved by another cache version of tcmd
+  python -c "import os, pickle, regex; os.umask(0o077); open('${OUT_FILE}.regex_cache', 'wb').write(pickle.dumps((0, regex.__version__, {})))"
+  $TCMD -d --regex_cache ${OUT_FILE}.regex_cache date $EXP_DATE | $TCMD -c "--regex_cache of another tcmd dropped" -s : "regex cache: .* is from tcmd cache version 0 "
+  rm -f ${OUT_FILE}.regex_cache
+
+  # Test --stream searches the output as it arrives with a regex across lines of the window
+  $TCMD --stream -c "--stream multiline" 'printf "hello world a\nhello world b\n"' "world a.*world b"
+  $TCMD --stream -c "--stream large output" "seq 1 2000000" "^1999999$"
+  $TCMD --stream -c "--stream match across two reads" "printf 'ab'; sleep 0.2; printf 'cd\n'" "^abcd$"
+  $TCMD --stream -c "--stream match across chunks" "seq 1 2000000" "^99999\n100000\n"
+
+  # Test --until_match passes as soon as stdout matches and kills the rest of the cmd
+  $TCMD --until_match -t -c "--until_match kills sleep 30" "echo starting; echo ready; sleep 30" "ready"
+  $TCMD -r 1 -c "--until_match left no sleep 30 running" "ps -eo args | grep '^sleep 3[0]$'" ""
+
+  # Test --timeout kills the cmd and reports Timeout with exit status 124
+  OUT=$($TCMD --timeout 1 "echo partial; sleep 30" "partial"); RET=$?
+  echo "$OUT" | $TCMD -c "--timeout reports Timeout" --stdin : "^Timeout:.*did .NOT. finish in 1 seconds.*actual_stdout: .partial"
+  echo "$RET" | $TCMD -c "--timeout exit status" --stdin : "^124$"
+
+  # Test --timeout of a --suite is the deadline of all its checks
+  OUT=$(printf '%s\n' "'sleep 30' ''" "'echo late' late" | $TCMD -m --suite - --timeout 1)
+  echo "$OUT" | $TCMD -c "--suite --timeout deadline" --stdin : "^Timeout: cmd .sleep 30.*\n^Timeout: cmd .echo late"
+
+  # Test --format jsonl prints one result record per check with the failed channel and timing fields
+  OUT=$(printf '%s\n' "date $EXP_DATE" "'echo oops >&2' ''" | $TCMD --suite - --format jsonl)
+  echo "$OUT" | $TCMD -c "--format jsonl Pass record" --stdin : '^\{"verdict": "Pass", "failed": null, "cmd": "date".*"exit_code": 0, "wall_time": [0-9.]+, "cpu_time": [0-9.]+, "bytes": [1-9]'
+  echo "$OUT" | $TCMD -c "--format jsonl Fail record" --stdin : '^\{"verdict": "Fail", "failed": "stderr", "cmd": "echo oops >&2"'
+
+  # Test --format junit prints a <testsuite> of <testcase> elements
+  OUT=$($TCMD --format junit -c "a<b" 'echo x' 'y')
+  echo "$OUT" | $TCMD -c "--format junit" --stdin : '^<testsuite name="tcmd">\n  <testcase classname="tcmd" name="cmd \[echo x\] # a&lt;b".*<failure type="stdout".*^</testsuite>$'
+
+  # Test --also tests more stdout regexes in the same scan of the output of one cmd run
+  $TCMD -c "--also all match" --also "world b" --also "^hello" 'printf "hello world a\nhello world b\n"' "world a"
+  $TCMD -c "--also overlapping regexes" --also "hello world" "echo hello world" "hello"
+  $TCMD -c "--match any" --match any --also "world" "echo hello world" "world a"
+  $TCMD -c "--match none" --match none --also "world b" "echo hello world" "world a"
+  $TCMD -c "--also_error" -e "warn" --also_error "disk" "echo warn: disk full >&2" ""
+  OUT=$($TCMD -v --also "world b" "echo hello world" "hello")
+  echo "$OUT" | $TCMD -c "--also reports every regex" --stdin : "^Fail:.*regEx .<all> hello | world b.*matched stdout regex .hello.\n.*no match stdout regex .world b."
+
+  # Test --cache reuses the output of the same cmd until a watched file changes
+  touch ${OUT_FILE}.watch
+  OUT1=$($TCMD -v --cache ${OUT_FILE}.cache --cache_watch ${OUT_FILE}.watch 'date +%N' .)
+  OUT2=$($TCMD -v --cache ${OUT_FILE}.cache --cache_watch ${OUT_FILE}.watch 'date +%N' .)
+  $TCMD -c "--cache reuses cmd output" "test '$OUT1' = '$OUT2'" ""
+  OUT2=$($TCMD -v --cache ${OUT_FILE}.cache --cache_watch ${OUT_FILE}.watch --no-cache 'date +%N' .)
+  $TCMD -c "--no-cache runs cmd" "test '$OUT1' != '$OUT2'" ""
+  OUT2=$($TCMD -v --cache ${OUT_FILE}.cache --cache_watch ${OUT_FILE}.watch --shell 'date +%N' .)
+  $TCMD -c "--cache does not reuse a cmd output for --shell" "test '$OUT1' != '$OUT2'" ""
+  sleep 0.01; touch ${OUT_FILE}.watch
+  $TCMD -d --cache ${OUT_FILE}.cache --cache_watch ${OUT_FILE}.watch 'date +%N' . | $TCMD -c "--cache_watch file changed" --stdin : "cmd cache: hits .0. misses .1."
+  $TCMD -c "--cache file only readable by you" "stat -c %a ${OUT_FILE}.cache" "^600$"
+  chmod g+w ${OUT_FILE}.cache
+  $TCMD -d --cache ${OUT_FILE}.cache --cache_watch ${OUT_FILE}.watch 'date +%N' . | $TCMD -c "--cache writable by others not loaded" --stdin : "writable by others, not loaded"
+  rm -f ${OUT_FILE}.cache ${OUT_FILE}.watch
+  $TCMD --cache ${OUT_FILE}.dir/cmd.cache true ""
+  $TCMD -c "--cache dir created" "stat -c %a ${OUT_FILE}.dir" "^700$"
+  rm -rf ${OUT_FILE}.dir
+
+  # Test a cmd that needs no shell is exec'd directly and one that does (or --shell) runs with /bin/sh
+  $TCMD -d "ls -d '/tmp'" "^/tmp$" | $TCMD -c "exec without a shell" --stdin : "exec without a shell: .'ls', '-d', '/tmp'."
+  $TCMD -d "ls -d /tmp | cat" "^/tmp$" | $TCMD -n -c "pipe runs with /bin/sh" --stdin : "exec without a shell"
+  $TCMD -d --shell "ls -d /tmp" "^/tmp$" | $TCMD -n -c "--shell runs with /bin/sh" --stdin : "exec without a shell"
+
+  # Test --bytes searches binary output with bytes regexes and prints only the bytes around the match decoded
+  $TCMD --bytes -c "--bytes binary output" "printf 'PK\003\004\377\376'" "^PK\x03\x04\xff"
+  $TCMD -c "invalid utf-8 output" "printf 'ok\377\376'" "^ok"
+  OUT=$($TCMD --bytes -v "seq 1 100000" "^99999$")
+  echo "$OUT" | $TCMD -c "--bytes prints the bytes around the match" --stdin : "actual_stdout: .*<[0-9]+ bytes> \.\.\..*^ +99999$"
+
+  # Test --bytes searches the bytearray the output was read into (not a joined copy of it)
+  OUT=$(cd $TCMD_DIR && python -c 'import tcmd; r = tcmd.run_check("head -c 1000000 /dev/zero", "^\\x00", as_bytes=True); print(r.verdict, type(r.stdout).__name__, len(r.stdout))')
+  echo "$OUT" | $TCMD -c "--bytes searches the bytearray read" --stdin : "^Pass bytearray 1000000$"
+
+  # Test -v prints only the first and last chars of a huge output and the chars around the match (--report_kb 0 all)
+  OUT=$($TCMD -v "seq 1 1000000" "^500000$")
+  echo "$OUT" | $TCMD -c "-v prints the head, match, and tail" --stdin : "^ +\[1$.*<[0-9]+ chars> \.\.\..*^ +500000$.*<[0-9]+ chars> \.\.\..*^ +1000000$"
+  echo "$OUT" | wc -l | $TCMD -c "-v report of a huge output is bounded" --stdin : "^[0-9]{1,4}$"
+  OUT=$($TCMD -v --report_kb 0 "seq 1 100000" "^50000$")
+  echo "$OUT" | $TCMD -n -c "--report_kb 0 prints all of the output" --stdin : "chars> \.\.\."
+
+  # Test -v --stream prints the first chars of the output kept in front of the window searched
+  OUT=$($TCMD -v --stream "seq 1 3000000" "^2999999$")
+  echo "$OUT" | $TCMD -c "-v --stream prints the head and the window" --stdin : "^ +\[1$.*<[0-9]+ chars> \.\.\..*^ +2999999$"
+
+  # Test the in-process python API returns a CheckResult instead of printing and exiting
+  OUT=$(cd $TCMD_DIR && python -c 'import tcmd; r = tcmd.run_check("echo hello world", "world b"); print(r.verdict, r.failed, r.exit_status, repr(r.stdout))')
+  echo "$OUT" | $TCMD -c "run_check() returns the verdict" --stdin : "^Fail stdout 1 'hello world\\\\n'$"
+  OUT=$(cd $TCMD_DIR && python -c 'import tcmd; print(tcmd.run_spec("-n -c negate date 1999").record())')
+  echo "$OUT" | $TCMD -c "run_spec() returns the record" --stdin : "'verdict': 'Pass'.*'comment': 'negate'.*'negate': True"
+  OUT=$(cd $TCMD_DIR && python -c 'import tcmd; o = tcmd.CheckOptions(also=("UTC",)); print(tcmd.run_check("date", "2", o).verdict, tcmd.run_check("date", "2", o.replace(negate=True)).verdict)')
+  echo "$OUT" | $TCMD -c "run_check() with CheckOptions" --stdin : "^Pass Fail$"
+  OUT=$(cd $TCMD_DIR && python -c 'import tcmd; tcmd.run_check(":", ".", stdin=True, retry_until=1)' 2>&1)
+  echo "$OUT" | $TCMD -c "run_check() refuses --retry_until with --stdin" --stdin : "ValueError: --retry_until does not work with --stdin"
+  OUT=$(cd $TCMD_DIR && python -c 'import os, tcmd
+results = []
+for i in range(2000):
+    with tcmd.run_check(":", "^import", file="tcmd.py") as r: results.append(r)
+print(r.verdict, len(os.listdir("/proc/self/fd")) < 100)')
+  echo "$OUT" | $TCMD -c "run_check() --file results close their mmap" --stdin : "^Pass True$"
+
+  # Test the pytest plugin runs every spec line of a *.tcmd file as a test
+  printf '%s\n' "# comment" "-c hello 'echo hello world' hello" "-n date 1999" "'echo oops' nomatch" "--bogus date ." > ${OUT_FILE}.tcmd
+  OUT=$(PYTHONPATH=$TCMD_DIR python -m pytest -p tcmd -p no:cacheprovider -q ${OUT_FILE}.tcmd 2>&1)
+  echo "$OUT" | $TCMD -c "pytest plugin collects spec lines" --stdin : "^2 failed, 2 passed"
+  echo "$OUT" | $TCMD -c "pytest plugin reports the Fail line" --stdin : "^Fail: cmd .echo oops. stdout does .NOT. match regEx .nomatch.*^Fail: suite line 5"
+  rm -f ${OUT_FILE}.tcmd
+
+  # Test --file searches the memory mapped file without running a cmd (with the same blank file special case)
+  seq 1 100000 > ${OUT_FILE}.file
+  $TCMD -c "--file" --file ${OUT_FILE}.file : "^99999$"
+  $TCMD -n -c "--file not blank" --file ${OUT_FILE}.file : ""
+  printf ' \n\n' > ${OUT_FILE}.file
+  $TCMD -c "--file blank" --file ${OUT_FILE}.file : ""
+  rm -f ${OUT_FILE}.file
+
+  # Test regexes with a required literal (prefiltered) still match like the full regex search
+  $TCMD -c "prefilter match" "echo error: connection timed out" "(warn|error):.*TIMED out"
+  $TCMD -n -c "prefilter no literal" "echo error: connection refused" "(warn|error):.*timed out"
+  $TCMD -c "prefilter --backslash" --backslash "echo 127.0.0.1:8080" "0.1:8080"
+  $TCMD -n -c "prefilter --backslash no match" --backslash "echo 127x0x0x1:8080" "0.1:8080"
+
+  # Test --usage regexes the rusage of the cmd and --max_cpu, --max_output Fail the cmds that go over them
+  $TCMD -c "--usage" --usage "^max_rss_kb=[0-9]+ user=[0-9.]+ sys=[0-9.]+ nvcsw=[0-9]+ nivcsw=[0-9]+$" date $EXP_DATE
+  $TCMD -m -c "--usage no match" --usage "max_rss_kb=0 " date $EXP_DATE | $TCMD -s -c "--usage Fail line" : "^Fail: cmd .date. usage .max_rss_kb="
+  $TCMD -m --max_output 100 "seq 1 100000" 1 | $TCMD -s -c "--max_output Fail" : "^Fail: cmd .seq 1 100000. went over --max_output .100.$"
+  $TCMD -c "--max_output under" --max_output 100 "seq 1 10" "^10$"
+  $TCMD -m --max_cpu 1 "python3 -c 'while 1: pass'" "" | $TCMD -s -c "--max_cpu Fail" : "^Fail: cmd .*went over --max_cpu .1.$"
+  $TCMD -m --max_as 64 "python3 -c 'bytearray(256*1024*1024)'" "" | $TCMD -s -c "--max_as Fail" : "^Fail: .*stderr"
+  $TCMD --format jsonl --max_output 10 "seq 1 100" 1 | $TCMD -s -c "--max_output jsonl" : '"failed": "limit".*"limit": "output"'
+  OUT=$(printf '%s\n' "--max_as 64 \"python3 -c 'bytearray(256*1024*1024)'\" ''" "--max_as 64 \"python3 -c 'bytearray(256*1024*1024)'\" ''" | $TCMD -m --suite - --jobs 2)
+  echo "$OUT" | $TCMD -s -c "--max_as in --jobs threads" : "^Fail: .*stderr.*\n^Fail: .*stderr"
+
+  # Test --incremental skips the suite checks that passed before until their --input file changes (or --force)
+  echo one > ${OUT_FILE}.input
+  printf '%s\n' "--input ${OUT_FILE}.input 'cat ${OUT_FILE}.input' one" "'echo fails' nope" > ${OUT_FILE}.suite
+  $TCMD --suite ${OUT_FILE}.suite --incremental ${OUT_FILE}.state > /dev/null
+  OUT=$($TCMD --suite ${OUT_FILE}.suite --incremental ${OUT_FILE}.state)
+  echo "$OUT" | $TCMD -c "--incremental cached" -s : "^Pass: cmd .cat .*\] <cached>$\n^Fail: cmd .echo fails."
+  echo two > ${OUT_FILE}.input
+  OUT=$($TCMD --suite ${OUT_FILE}.suite --incremental ${OUT_FILE}.state)
+  echo "$OUT" | $TCMD -c "--incremental --input changed" -s : "^Fail: cmd .cat "
+  echo one > ${OUT_FILE}.input
+  $TCMD --suite ${OUT_FILE}.suite --incremental ${OUT_FILE}.state > /dev/null
+  OUT=$($TCMD --suite ${OUT_FILE}.suite --incremental ${OUT_FILE}.state --force)
+  echo "$OUT" | $TCMD -n -c "--incremental --force" -s : "<cached>"
+  rm -f ${OUT_FILE}.input ${OUT_FILE}.suite ${OUT_FILE}.state
+
+  # Test --shard splits the suite checks round robin, then balanced by the --timings of the last runs, and --merge totals them
+  # (and fails if the shards did not run every check once) and combines their timings
+  printf '%s\n' "'sleep 0.4' ''" "date $EXP_DATE" "'sleep 0.3' ''" "'echo one' one" "'echo two' two" > ${OUT_FILE}.suite
+  OUT=$($TCMD --suite ${OUT_FILE}.suite --shard 1/2 --timings ${OUT_FILE}.timings)
+  echo "$OUT" | $TCMD -c "--shard round robin" -s : "^Pass: cmd .sleep 0.4.*^Pass: cmd .sleep 0.3"
+  $TCMD --suite ${OUT_FILE}.suite --shard 2/2 --timings ${OUT_FILE}.timings > /dev/null
+  $TCMD -c "--timings saved" "cat ${OUT_FILE}.timings" "^0\.4[0-9]*\t[0-9.]+\t'sleep 0\.4' ''$"
+  cp ${OUT_FILE}.timings ${OUT_FILE}.timings2
+  $TCMD --suite ${OUT_FILE}.suite --shard 1/2 --timings ${OUT_FILE}.timings > ${OUT_FILE}.shard1
+  $TCMD --suite ${OUT_FILE}.suite --shard 2/2 --timings ${OUT_FILE}.timings2 --format jsonl > ${OUT_FILE}.shard2
+  $TCMD -c "--shard balanced 1/2" "cat ${OUT_FILE}.shard1" "^Pass: cmd .sleep 0.4"
+  $TCMD -n -c "--shard balanced 1/2 not 0.3" "cat ${OUT_FILE}.shard1" "sleep 0.3"
+  $TCMD -c "--shard balanced 2/2" "cat ${OUT_FILE}.shard2" '^\{"verdict": "Pass", "failed": null, "cmd": "sleep 0.3"'
+  OUT=$($TCMD --merge ${OUT_FILE}.shard1 --merge ${OUT_FILE}.shard2)
+  echo "$OUT" | $TCMD -c "--merge totals" -s : "^Passes: 5\n Fails: 0\n Total: 5$"
+  echo "Fail: cmd [false]" > ${OUT_FILE}.shard3
+  OUT=$($TCMD --merge ${OUT_FILE}.shard3); RET=$?
+  echo "$OUT $RET" | $TCMD -c "--merge Fail exit status" -s : "^ Fails: 1\n Total: [0-9]+\n---\s+1$"
+  $TCMD -m --suite ${OUT_FILE}.suite --shard 3/2 | $TCMD -s -c "--shard out of range" : "^Fail: --shard \[3/2\] is not"
+  $TCMD -c "--shard line" "cat ${OUT_FILE}.shard1" "^Shard: 1/2 ran .2. of .5. checks, lines .1 [0-9]\]$"
+  OUT=$($TCMD --merge ${OUT_FILE}.shard1 --merge ${OUT_FILE}.shard1); RET=$?
+  echo "$OUT $RET" | $TCMD -c "--merge repeated shard" -s : "^Fail: --merge shards .1 1. are not each of 1 to 2 once\n^Fail: --merge lines .1 .*\n^Fail: --merge ran .2. of the .5. suite checks.* 1$"
+  printf '%s\n' "'sleep 0.4' ''" "date $EXP_DATE" "'echo three' three" "'sleep 0.3' ''" "'echo one' one" "'echo two' two" > ${OUT_FILE}.suite
+  rm -f ${OUT_FILE}.timings2
+  $TCMD --suite ${OUT_FILE}.suite --shard 1/2 --timings ${OUT_FILE}.timings > ${OUT_FILE}.shard1
+  $TCMD --suite ${OUT_FILE}.suite --shard 2/2 --timings ${OUT_FILE}.timings2 > ${OUT_FILE}.shard2
+  OUT=$($TCMD --merge ${OUT_FILE}.shard1 --merge ${OUT_FILE}.shard2); RET=$?
+  echo "$OUT $RET" | $TCMD -c "--merge shards of different --timings" -s : "^Fail: --merge .* suite checks .did the shards load different --timings.*\s+1$"
+  $TCMD --merge ${OUT_FILE}.shard1 --merge ${OUT_FILE}.shard2 --timings ${OUT_FILE}.timings3 --merge_timings ${OUT_FILE}.timings --merge_timings ${OUT_FILE}.timings2 > /dev/null
+  $TCMD -c "--merge_timings" "cat ${OUT_FILE}.timings3" "^[0-9.]+\t[0-9.]+\t'echo three' three$"
+  $TCMD -c "--merge_timings newest wins" "grep -c sleep ${OUT_FILE}.timings3" "^2$"
+  rm -f ${OUT_FILE}.suite ${OUT_FILE}.timings ${OUT_FILE}.timings2 ${OUT_FILE}.timings3 ${OUT_FILE}.shard1 ${OUT_FILE}.shard2 ${OUT_FILE}.shard3
+
+  # Test --stdin searches a large stdin as it arrives, stops reading it with --until_match, and prints only the Pass line
+  seq 1 500000 | $TCMD -c "--stdin large" -s : "^499999$"
+  yes | $TCMD -c "--stdin --until_match" -s --until_match : "^y$"
+  printf 'foo\n' | $TCMD -c "--stdin trailing newline is not searched" -s : 'foo\Z'
+  (printf 'foo\n'; sleep 0.2; printf 'bar\n') | $TCMD -c "--stdin newline between reads is searched" -s : '^foo\nbar\Z'
+  (head -c 3000000 /dev/zero | tr '\0' '\n'; printf 'end\n') | $TCMD -c "--stdin many newlines before text are searched" -s : '\n\n\nend\Z'
+  OUT=$(echo hello | $TCMD -s : hello)
+  echo "$OUT" | $TCMD -c "--stdin prints one line" -s : "^Pass: cmd \[<stdin> :\]; regex \[hello\]$"
+
+  # Test --repeat runs the cmd every time and prints the wall and cpu time statistics
+  OUT=$($TCMD --repeat 5 --warmup 1 date $EXP_DATE)
+  echo "$OUT" | $TCMD -c "--repeat statistics" --stdin : "^Pass:.*\n.*Repeat: 5 runs .1 warmup.\n.*min +median +p90 +p95 +p99 +max\n.*wall( +[0-9.]+){6}\n.*user( +[0-9.]+){6}\n.*sys( +[0-9.]+){6}"
+  OUT=$($TCMD --repeat 5 -n "echo x" "^x$")
+  echo "$OUT" | $TCMD -c "--repeat stops at the first failed run" --stdin : "^Fail:.*Repeat: 1 runs"
+
+  # Test --max_p95 fails a check whose runs are too slow
+  $TCMD -m --repeat 3 --max_p95 0.01 "sleep 0.05" "" | $TCMD -c "--max_p95" --stdin : "^Fail: cmd .sleep 0.05. p95 wall time .0\.0[5-9][0-9]*. is over --max_p95 .0\.01. seconds"
+
+  # Test --retry_until runs the cmd again with backoff until it passes and reports the attempts and time to pass
+  rm -f ${OUT_FILE}.ready; (sleep 0.5; touch ${OUT_FILE}.ready) &
+  OUT=$($TCMD --retry_until 5 "ls ${OUT_FILE}.ready" "ready")
+  echo "$OUT" | $TCMD -c "--retry_until passes" --stdin : "^Pass: .*^ +Retry: [2-9] attempts, waited [0-9]\.[0-9]+ seconds, passed after [0-9]\.[0-9]+ seconds"
+  rm -f ${OUT_FILE}.ready
+  OUT=$($TCMD --retry_until 0.5 --retry_delay 0.2 --retry_backoff 1 --retry_jitter 0 "ls ${OUT_FILE}.ready" "ready")
+  echo "$OUT" | $TCMD -c "--retry_until gives up" --stdin : "^Fail: .*^ +Retry: 4 attempts, waited 0\.[45][0-9]* seconds, gave up after 0\.5"
+  $TCMD --retry_until 0.2 --format jsonl "ls ${OUT_FILE}.ready" "ready" | $TCMD -c "--retry_until jsonl" --stdin : '"retry": \{"attempts": [0-9]+, "wait": '
+  echo | $TCMD -s --retry_until 1 : "" | $TCMD -c "--retry_until not with --stdin" --stdin : "^Fail: --retry_until does not work with --stdin"
+
+  # Test --phases reports the seconds of every phase of the check (as text or in the --format record)
+  $TCMD --phases "seq 1 1000" "^500$" | $TCMD -c "--phases" --stdin : "^ +Phases: spawn [0-9.]+, capture [0-9.]+, decode [0-9.]+, search [0-9.]+, check [0-9.]+, report [0-9.]+$"
+  $TCMD --phases --stream --format jsonl "seq 1 1000" "^500$" | $TCMD -c "--phases jsonl" --stdin : '"phases": \{"spawn": [0-9.e-]+, "stream": '
+
+  # Test --profile prints the cProfile or tracemalloc report of the check to stderr
+  $TCMD -m --profile cprofile date . 2>&1 >/dev/null | $TCMD -c "--profile cprofile" --stdin : "^Profile: cprofile.*function calls.*run_check"
+  $TCMD -m --profile tracemalloc date . 2>&1 >/dev/null | $TCMD -c "--profile tracemalloc" --stdin : "^Profile: tracemalloc peak \[[0-9]+\] KB"
+
+  # Test --hooks calls the tcmd_pre_spawn, tcmd_post_capture, and tcmd_post_match functions of a module
+  printf '%s\n' "def tcmd_pre_spawn(cmd): print('pre_spawn', cmd)" "def tcmd_post_capture(cmd, cmd_output): print('post_capture', cmd, cmd_output.nbytes)" \
+                 "def tcmd_post_match(result): print('post_match', result.verdict, sorted(result.phases))" > ${OUT_FILE}_hooks.py
+  OUT=$($TCMD --hooks ${OUT_FILE}_hooks.py "echo hi" hi)
+  echo "$OUT" | $TCMD -c "--hooks" --stdin : "^pre_spawn echo hi\npost_capture echo hi 3\npost_match Pass \['capture', 'check', 'decode', 'search', 'spawn'\]\nPass:"
+  OUT=$(TCMD_HOOKS=${OUT_FILE}_hooks.py $TCMD "echo hi" hi)
+  echo "$OUT" | $TCMD -c "TCMD_HOOKS fast path" --stdin : "^pre_spawn echo hi.*^Pass:"
+  rm -f ${OUT_FILE}_hooks.py
+
+  # Test --server serves the tcmd runs of export TCMD_SERVER=<socket> with their stdin, cwd, env and exit status
+  $TCMD --server ${OUT_FILE}.sock --regex_cache ${OUT_FILE}.server_regex_cache > /dev/null 2> ${OUT_FILE}.server_err &
+  SERVER_PID=$!
+  sleep 1
+  OUT=$(TCMD_SERVER=${OUT_FILE}.sock FOO=served $TCMD 'echo $FOO; pwd' "^served\n^$(pwd)$")
+  echo "$OUT" | $TCMD -c "--server run" --stdin : "^Pass:"
+  OUT=$(echo "from stdin" | TCMD_SERVER=${OUT_FILE}.sock $TCMD --stdin : "from stdin")
+  echo "$OUT" | $TCMD -c "--server stdin" --stdin : "^Pass:"
+  OUT=$(TCMD_SERVER=${OUT_FILE}.sock $TCMD date 'this should fail'); RET=$?
+  echo "$RET" | $TCMD -c "--server exit status" --stdin : "^1$"
+  echo "'echo served' served" > ${OUT_FILE}.suite
+  TCMD_SERVER=${OUT_FILE}.sock $TCMD --cache ${OUT_FILE}.cache 'date +%N' . > /dev/null
+  TCMD_SERVER=${OUT_FILE}.sock $TCMD --suite ${OUT_FILE}.suite --incremental ${OUT_FILE}.state > /dev/null
+  $TCMD -c "--server saves --cache and --incremental" "ls ${OUT_FILE}.cache ${OUT_FILE}.state" "cache\n.*state$"
+  rm -f ${OUT_FILE}.suite ${OUT_FILE}.cache ${OUT_FILE}.state
+  $TCMD -c "--server socket only for you" "stat -c %a ${OUT_FILE}.sock" "^600$"
+  TCMD_SERVER=${OUT_FILE}.sock $TCMD -m 'echo warm' 'only served warm' > /dev/null
+  OUT=$(TCMD_SERVER=${OUT_FILE}.sock $TCMD -d 'echo warm' 'only served warm')
+  echo "$OUT" | $TCMD -c "--server loads the regexes its forks compiled" --stdin : "regex cache: hits .[0-9]+. misses .0."
+  rm -f ${OUT_FILE}.server_regex_cache
+  python -c "import socket; s = socket.socket(socket.AF_UNIX); s.connect('${OUT_FILE}.sock'); s.close()"
+  python -c "import socket; s = socket.socket(socket.AF_UNIX); s.connect('${OUT_FILE}.sock'); socket.send_fds(s, [b'tcmd'], [0, 1, 2]); s.sendall(b'not json'); s.close()" 2>/dev/null
+  sleep 0.5
+  $TCMD -c "--server keeps its socket after a bad client" "test -S ${OUT_FILE}.sock" ""
+  $TCMD -c "--server reports a bad client" "cat ${OUT_FILE}.server_err" "JSONDecodeError"
+  kill $SERVER_PID; wait $SERVER_PID
+  rm -f ${OUT_FILE}.server_err
+  $TCMD -c "--server removed its socket" "test -e ${OUT_FILE}.sock" "" -r 1
+
 ) | tee $OUT_FILE 2>&1
 
 # ----